@@ -0,0 +1,154 @@
+"""Minimal asyncio http client used by the default backend when the spider
+runs on the asyncio engine.
+
+Only GET requests are supported. Redirects are followed and error status codes
+raise the same HTTPError exception as urllib so that both engines behave the
+same. This module requires Python 3.5+ and is only imported by the asyncio
+engine.
+"""
+
+import asyncio
+from email.parser import Parser
+from http.client import HTTPMessage
+import ssl
+from urllib.error import HTTPError
+from urllib.parse import urlsplit, urljoin
+
+from arackpy.backends.connectionpool import USER_AGENT, REDIRECT_CODES
+from arackpy.backends.encoding import (ACCEPT_ENCODING, Decompressor,
+                                       decode_html)
+
+
+# number of bytes read from the socket at a time
+CHUNK_SIZE = 65536
+
+
+async def _read_headers(reader):
+    lines = []
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        lines.append(line.decode("iso-8859-1"))
+
+    return Parser(_class=HTTPMessage).parsestr("".join(lines))
+
+
+async def _read_body(reader, headers, decompressor):
+    """Read the body, decompressing it chunk by chunk as it arrives"""
+    chunks = []
+    if headers.get("Transfer-Encoding", "").lower() == "chunked":
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                await _read_headers(reader)     # trailers
+                break
+            while size:
+                chunk = await reader.readexactly(min(size, CHUNK_SIZE))
+                chunks.append(decompressor.decompress(chunk))
+                size -= len(chunk)
+            await reader.readline()
+    elif headers.get("Content-Length") is not None:
+        size = int(headers.get("Content-Length"))
+        while size:
+            chunk = await reader.readexactly(min(size, CHUNK_SIZE))
+            chunks.append(decompressor.decompress(chunk))
+            size -= len(chunk)
+    else:
+        while True:
+            chunk = await reader.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            chunks.append(decompressor.decompress(chunk))
+
+    chunks.append(decompressor.flush())
+    return b"".join(chunks)
+
+
+async def _get(url, headers, accept_encoding):
+    parts = urlsplit(url)
+    https = parts.scheme == "https"
+    port = parts.port or (443 if https else 80)
+    context = ssl.create_default_context() if https else None
+
+    reader, writer = await asyncio.open_connection(parts.hostname, port,
+                                                   ssl=context)
+    try:
+        path = parts.path or "/"
+        if parts.query:
+            path = "%s?%s" % (path, parts.query)
+
+        lines = ["GET %s HTTP/1.1" % path,
+                 "Host: %s" % parts.netloc,
+                 "User-Agent: %s" % USER_AGENT,
+                 "Connection: close"]
+        if accept_encoding:
+            lines.append("Accept-Encoding: %s" % accept_encoding)
+        lines.extend("%s: %s" % item for item in headers.items())
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("iso-8859-1"))
+
+        status_line = (await reader.readline()).decode("iso-8859-1")
+        try:
+            version, status, reason = status_line.split(None, 2)
+        except ValueError:
+            version, status = status_line.split(None, 1)
+            reason = ""
+        status = int(status)
+
+        response_headers = await _read_headers(reader)
+
+        # the bodies of redirects and errors are discarded undecoded
+        encoding = None
+        if status < 300:
+            encoding = response_headers.get("Content-Encoding")
+        body = await _read_body(reader, response_headers,
+                                Decompressor(encoding))
+
+        return status, reason.strip(), response_headers, body
+    finally:
+        writer.close()
+
+
+async def urlopen(url, timeout, headers=None, max_redirects=5,
+                  accept_encoding=ACCEPT_ENCODING):
+    """Read the url and return the status code, the response headers and the
+    decompressed body. The timeout applies to the whole request including
+    redirects. Compression is disabled if accept_encoding is None.
+    """
+    headers = headers or {}
+
+    async def _open(url):
+        for _ in range(max_redirects + 1):
+            status, reason, response_headers, body = await _get(
+                url, headers, accept_encoding)
+
+            location = response_headers.get("Location")
+            if status in REDIRECT_CODES and location:
+                url = urljoin(url, location)
+                continue
+
+            if status >= 400:
+                raise HTTPError(url, status, reason, response_headers, None)
+
+            return status, response_headers, body
+
+        raise HTTPError(url, status, "too many redirects", response_headers,
+                        None)
+
+    return await asyncio.wait_for(_open(url), timeout)
+
+
+async def urlread(url, timeout, metrics=None,
+                  accept_encoding=ACCEPT_ENCODING):
+    """Return the html of the url decoded using the charset of the response,
+    of the meta tag or of the byte order mark, utf-8 or cp1252 otherwise. The
+    size of the body and the decode time are recorded in the metrics, if any.
+    """
+    status, headers, body = await urlopen(url, timeout,
+                                          accept_encoding=accept_encoding)
+    if metrics is None:
+        return decode_html(body, headers.get_content_charset())
+
+    metrics.count("downloaded_bytes_total", len(body))
+    with metrics.time("decode"):
+        return decode_html(body, headers.get_content_charset())
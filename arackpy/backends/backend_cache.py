@@ -0,0 +1,95 @@
+"""Conditional requests backed by an on-disk http cache."""
+
+from __future__ import absolute_import
+
+import threading
+
+from arackpy.backends.backend_default import Backend
+from arackpy.httpcache import CacheEntry, HttpCache, digest
+
+
+class Backend_Cache(Backend):
+    """Wraps another backend with an on-disk http cache.
+
+    Backends with a fetch method, like the default backend, send the ETag and
+    Last-Modified validators of the cached url and the html of a 304 Not
+    Modified response is read from the cache. Other backends read the whole
+    html every time, the cache then only detects unchanged pages from the
+    digest of their html.
+
+    Urls read unchanged are reported by the not_modified method so that the
+    spider can skip parsing them, see Spider.unchanged.
+
+    :Parameters:
+        `backend` : Backend
+            The wrapped backend reading and parsing the urls.
+
+        `path` : str
+            The cache directory.
+
+        `maxsize` : int
+            The maximum size of the cache in bytes.
+    """
+
+    def __init__(self, spider, backend, path, maxsize=100 * 2 ** 20):
+        super(Backend_Cache, self).__init__(spider)
+        self.backend = backend
+        self.cache = HttpCache(path, maxsize)
+
+        # urls read unchanged and not parsed yet
+        self.unchanged = set()
+        self.lock = threading.Lock()
+
+    @property
+    def name(self):
+        return "%s(%s)" % (self.__class__.__name__, self.backend.name)
+
+    def urlread(self, url, timeout):
+        entry = self.cache.get(url)
+
+        fetch = getattr(self.backend, "fetch", None)
+        if fetch is None:
+            html = self.backend.urlread(url, timeout)
+            etag = last_modified = None
+        else:
+            headers = entry.validators if entry is not None else None
+            response = fetch(url, timeout, headers)
+
+            if response.status == 304 and entry is not None:
+                self.mark(url)
+                return entry.html
+
+            html = response.text
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+
+        html_digest = digest(html)
+        if entry is not None and entry.digest == html_digest:
+            self.mark(url)
+            if (etag, last_modified) == (entry.etag, entry.last_modified):
+                return html
+
+        # only keep the html when it can be served from a 304 response
+        self.cache.put(CacheEntry(url, etag, last_modified, html_digest,
+                                  html if etag or last_modified else ""))
+        return html
+
+    def close(self):
+        self.backend.close()
+
+    def urlparse(self, html):
+        return self.backend.urlparse(html)
+
+    def mark(self, url):
+        with self.lock:
+            self.unchanged.add(url)
+
+    def not_modified(self, url):
+        """Return True, once, if the url was read unchanged from the last
+        crawl.
+        """
+        with self.lock:
+            if url in self.unchanged:
+                self.unchanged.discard(url)
+                return True
+            return False
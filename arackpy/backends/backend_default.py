@@ -4,15 +4,69 @@
 from __future__ import print_function
 
 from abc import abstractmethod
+import threading
 
 try:
-    import urllib2
+    import asyncio
 except ImportError:
-    import urllib.request
-    import urllib.error
-    import urllib.parse
+    # py27, the asyncio engine is unavailable
+    asyncio = None
+
+try:
+    from urllib2 import HTTPError
+    from urlparse import urljoin
+except ImportError:
+    from urllib.error import HTTPError
+    from urllib.parse import urljoin
+
+from arackpy.backends.connectionpool import ConnectionPool, REDIRECT_CODES
+from arackpy.backends.encoding import (ACCEPT_ENCODING, Decompressor,
+                                       HtmlDecoder, decode_html)
+from arackpy.utils import get_link_extractor, get_link_parser
+
+
+class Response(object):
+    """The response of a read url.
+
+    :Parameters:
+        `url` : str
+            The url read, after any redirects.
+
+        `status` : int
+            The http status code.
+
+        `headers` : Message
+            The response headers.
+
+        `body` : bytes
+            The response body, decompressed.
+    """
+
+    def __init__(self, url, status, headers, body):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    @property
+    def charset(self):
+        """The charset of the Content-Type header or None"""
+        return header_charset(self.headers)
+
+    @property
+    def text(self):
+        """The body decoded using the charset of the response, of the meta
+        tag or of the byte order mark, utf-8 or cp1252 otherwise.
+        """
+        return decode_html(self.body, self.charset)
 
-from arackpy.utils import AnchorTagParser
+
+def header_charset(headers):
+    try:
+        return headers.get_content_charset()
+    except AttributeError:
+        # py27
+        return headers.getparam("charset")
 
 
 class Backend(object):
@@ -25,9 +79,14 @@ class Backend(object):
     def name(self):
         return self.__class__.__name__
 
+    @property
+    def metrics(self):
+        """The metrics of the spider, None without a spider"""
+        return getattr(self.spider, "metrics", None)
+
     @abstractmethod
     def urlread(self, url, timeout):
-        """Return the raw html data"""
+        """Return the raw html"""
         pass
 
     @abstractmethod
@@ -35,24 +94,216 @@ class Backend(object):
         """Return a set of urls"""
         pass
 
+    def not_modified(self, url):
+        """Return True if the url was read unchanged since the last crawl,
+        only known to backends with an http cache.
+        """
+        return False
+
+    def close(self):
+        """Release the connections of the backend, called once the spider
+        stops crawling
+        """
+        pass
+
+    def aurlread(self, url, timeout):
+        """Return an awaitable of the raw html used by the asyncio engine.
+
+        By default the blocking urlread method runs in the executor of the
+        event loop. Backends that can read urls natively using asyncio should
+        override this method.
+        """
+        loop = asyncio.get_event_loop()
+        return loop.run_in_executor(None, self.urlread, url, timeout)
+
+    def aurlparse(self, html):
+        """Return an awaitable of the set of urls used by the asyncio engine.
+
+        By default the urlparse method runs in the executor of the event loop
+        so that large pages do not block it.
+        """
+        loop = asyncio.get_event_loop()
+        return loop.run_in_executor(None, self.urlparse, html)
+
 
 class Backend_Default(Backend):
-    """The default backend uses urllib2 to download html and the native Python
-    html parser to extract all anchor tags. This method can be slow and may not
-    extract urls for all links with success.
+    """The default backend uses keep-alive http connections to download gzip
+    or deflate compressed html and lxml, if installed, or the native Python
+    html parser to extract all anchor tags. The native parser can be slow and
+    may not extract urls for all links with success.
+
+    In streaming mode, the html is read in chunks and each chunk is fed to an
+    incremental link parser as it arrives, so urls are extracted while the
+    page downloads instead of after. If the html is not kept, the memory used
+    per url is bounded by the chunk size no matter how large the page is.
+
+    :Parameters:
+        `link_extractor` : str
+            The strategy used to extract urls, 'html' for the native parser,
+            'regex' for the faster but less accurate regular expressions,
+            'lxml' or 'auto' to use lxml when it is installed.
+
+        `pool_size` : int
+            The maximum number of idle connections kept alive per host.
+
+        `idle_timeout` : int
+            Time in seconds after which an idle connection is closed.
+
+        `max_redirects` : int
+            The maximum number of redirects followed per url.
+
+        `stream` : bool
+            If set to True, urls are extracted incrementally while the html is
+            downloaded.
+
+        `chunk_size` : int
+            The number of bytes read at a time in streaming mode.
+
+        `keep_html` : bool
+            Only applies to streaming mode. If set to False, the html is not
+            kept and the parse method receives an empty string, for spiders
+            that only follow links.
+
+        `accept_encoding` : str
+            The Accept-Encoding request header, set to None to disable
+            compression.
     """
 
-    def __init__(self, spider):
+    def __init__(self, spider, link_extractor="auto", pool_size=4,
+                 idle_timeout=30, max_redirects=5, stream=False,
+                 chunk_size=65536, keep_html=True,
+                 accept_encoding=ACCEPT_ENCODING):
         super(Backend_Default, self).__init__(spider)
-        self.parser = AnchorTagParser()
+        self.link_extractor = link_extractor
+        self.extract_links = get_link_extractor(link_extractor)
+        self.pool = ConnectionPool(pool_size, idle_timeout)
+        self.max_redirects = max_redirects
 
-    def urlread(self, url, timeout):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.keep_html = keep_html
+        self.accept_encoding = accept_encoding
+
+        # urls extracted while streaming, per reader thread
+        self.local = threading.local()
+
+    def open(self, url, timeout, headers=None):
+        """Make a request, following redirects, and return the url, the
+        connection and the response whose body is not read yet. Raises
+        HTTPError for error status codes like urlopen.
+        """
+        headers = dict(headers or {})
+        if self.accept_encoding:
+            headers.setdefault("Accept-Encoding", self.accept_encoding)
+
+        for _ in range(self.max_redirects + 1):
+            conn, response = self.pool.request(url, timeout, headers)
+
+            location = response.getheader("Location")
+            if response.status in REDIRECT_CODES and location:
+                response.read()
+                self.pool.release(url, conn, response)
+                url = urljoin(url, location)
+                continue
+
+            if response.status >= 400:
+                conn.close()
+                raise HTTPError(url, response.status, response.reason,
+                                response.msg, None)
+
+            return url, conn, response
+
+        conn.close()
+        raise HTTPError(url, response.status, "too many redirects",
+                        response.msg, None)
+
+    def fetch(self, url, timeout, headers=None):
+        """Read the url and return the Response"""
+        url, conn, response = self.open(url, timeout, headers)
+        decompressor = Decompressor(response.getheader("Content-Encoding"))
+
+        chunks = []
+        nbytes = 0
         try:
-            return urllib2.urlopen(url, timeout=timeout).read().decode("utf-8")
-        except NameError:
-            # py3
-            response = urllib.request.urlopen(url, timeout=timeout)
-            return response.read().decode("utf-8")
+            while True:
+                chunk = response.read(self.chunk_size)
+                if not chunk:
+                    break
+                nbytes += len(chunk)
+                chunks.append(decompressor.decompress(chunk))
+            chunks.append(decompressor.flush())
+        except Exception:
+            conn.close()
+            raise
+
+        self.pool.release(url, conn, response)
+
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.count("downloaded_bytes_total", nbytes)
+
+        return Response(url, response.status, response.msg, b"".join(chunks))
+
+    def stream_read(self, url, timeout):
+        """Read the url in chunks, extracting urls as they arrive, and return
+        the html if it is kept
+        """
+        url, conn, response = self.open(url, timeout)
+
+        decoder = HtmlDecoder(response.getheader("Content-Encoding"),
+                              header_charset(response.msg))
+        parser = get_link_parser(self.link_extractor)
+
+        chunks = []
+        nbytes = 0
+        try:
+            while True:
+                chunk = response.read(self.chunk_size)
+                nbytes += len(chunk)
+                text = decoder.decode(chunk, final=not chunk)
+                parser.feed(text)
+                if self.keep_html:
+                    chunks.append(text)
+                if not chunk:
+                    break
+        except Exception:
+            conn.close()
+            raise
+
+        self.pool.release(url, conn, response)
+
+        parser.close()
+        self.local.links = parser.links()
+
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.count("downloaded_bytes_total", nbytes)
+
+        return "".join(chunks)
+
+    def urlread(self, url, timeout):
+        self.local.links = None
+        if self.stream:
+            return self.stream_read(url, timeout)
+
+        response = self.fetch(url, timeout)
+        metrics = self.metrics
+        if metrics is None:
+            return response.text
+        with metrics.time("decode"):
+            return response.text
+
+    def close(self):
+        self.pool.clear()
+
+    def aurlread(self, url, timeout):
+        # py3 only
+        from arackpy.backends.asynchttp import urlread
+        return urlread(url, timeout, self.metrics, self.accept_encoding)
 
     def urlparse(self, html):
-        return self.parser.parse(html)
+        # urls already extracted while streaming the html
+        links, self.local.links = getattr(self.local, "links", None), None
+        if links is not None:
+            return links
+        return self.extract_links(html)
@@ -7,11 +7,14 @@ risky, so use at your own risk. Free proxies may die out pretty quickly so the
 list of proxies should be continually refreshed. Using header spoofing and
 rotation will ensure better overall success.
 
-Each thread uses a different proxy to read each url from the group. If the url
-cannot be read, either the proxy is dead or the server is not responding. If
-the proxy is not working it is removed from the queue. If the proxy queue ever
-becomes empty the spider will stop crawling and terminate. If the timer is
-reached, the queue is refreshed with new free proxies.
+Each url is read using a proxy picked from a pool by health, see
+arackpy.proxypool. A proxy that fails cools down before it is used again and
+is evicted after several consecutive failures, only connection and tunnel
+errors count against a proxy. The url is then retried using another proxy, up
+to max_retries times, unless the server answered with an error status. Free
+proxies are validated in the background before they are used and the pool is
+refilled while the spider keeps crawling, when it runs low or when the update
+timer is reached.
 
 Using free proxies tends to be slow as the quality of the server is usually not
 the best.
@@ -19,16 +22,12 @@ the best.
 
 from __future__ import print_function
 import logging
-import threading
 import time
-import sys
 
 try:
-    import Queue as queue
-    from Queue import Queue
+    from urllib2 import HTTPError
 except ImportError:
-    import queue
-    from queue import Queue
+    from urllib.error import HTTPError
 
 import requests
 from lxml.html import fromstring
@@ -36,18 +35,19 @@ from lxml.html import fromstring
 from fake_useragent import UserAgent
 
 from arackpy.backends.backend_default import Backend
+from arackpy.backends.sessionpool import SessionPool, proxy_url
+from arackpy.proxypool import ProxyPool, ProxyError
+from arackpy.utils import extract_links_lxml
 
 
-class AnchorTagParser(object):
-
-    def parse(self, html):
-        parser = fromstring(html)
-        urls = parser.xpath("//a/@href")
-
-        return urls
+# errors connecting to the proxy or through its tunnel, the other errors are
+# not the fault of the proxy
+PROXY_ERRORS = (requests.exceptions.ProxyError,
+                requests.exceptions.ConnectTimeout)
 
 
 def get_free_proxies():
+    """Return the list of https proxies of free-proxy-list.net"""
     # https://www.scrapehero.com/how-to-rotate-proxies-and-ip-addresses-using-python-3/
     url = 'https://free-proxy-list.net/'
     response = requests.get(url)
@@ -61,11 +61,7 @@ def get_free_proxies():
                               i.xpath('.//td[2]/text()')[0]])
             proxies.add(proxy)
 
-    queue = Queue()
-    for proxy in proxies:
-        queue.put(proxy)
-
-    return queue
+    return list(proxies)
 
 
 class Backend_Proxy(Backend):
@@ -78,91 +74,115 @@ class Backend_Proxy(Backend):
             a colon.
 
         `update_timer` : int
-            Define the time in minutes after which the free proxy queue is
-            refreshed. Only applies to free proxies.
+            Define the time in minutes after which new proxies are requested
+            from the proxy source. Only applies when there is a source.
+
+        `proxy_source` : function
+            Called without arguments to get new candidate proxies when the
+            pool runs low. Defaults to get_free_proxies without user defined
+            proxies.
+
+        `max_retries` : int
+            The number of other proxies tried when an url cannot be read.
+
+        `test_url` : str
+            The url read to validate candidate proxies.
+
+        `pool_options` : dict
+            Keyword arguments of the ProxyPool, e.g. max_failures or cooldown.
+
+        `session_options` : dict
+            Keyword arguments of the SessionPool keeping the connections
+            through each proxy alive, e.g. maxsize or idle_timeout.
     """
-    def __init__(self, spider, proxies=None, update_timer=10):
+    def __init__(self, spider, proxies=None, update_timer=10,
+                 proxy_source=None, max_retries=3,
+                 test_url="https://www.google.com", pool_options=None,
+                 session_options=None):
         super(Backend_Proxy, self).__init__(spider)
 
-        if proxies:
-            self._user_proxies = True
-            self.proxies = Queue()
-            for proxy in proxies:
-                self.proxies.put(proxy)
-        else:
-            self._user_proxies = False
+        if not proxies and proxy_source is None:
             logging.warning("using free proxies from free-proxy-list.net")
-            self.proxies = get_free_proxies()
-            self.proxy_updater_thread = threading.Timer(update_timer*60,
-                                                        self.clear_proxies)
+            proxy_source = get_free_proxies
+
+        self.max_retries = max_retries
+        self.test_url = test_url
 
-        self.parser = AnchorTagParser()
+        options = {"refresh_interval": (update_timer * 60 if update_timer
+                                        else None)}
+        options.update(pool_options or {})
+        self.pool = ProxyPool(proxies, proxy_source, self._test_proxy,
+                              **options)
+        if not proxies:
+            self.pool.refill(force=True)
+
+        self.sessions = SessionPool(metrics=self.metrics,
+                                    **(session_options or {}))
+
+        if self.metrics is not None:
+            self.metrics.gauge("proxies", lambda: len(self.pool))
 
         self.ua = UserAgent()
 
-    def _test_proxy(self, url, proxy, timeout):
-        # is url bad or proxy bad
+    def _test_proxy(self, proxy, timeout=5):
+        """Return True if the test url can be read using the proxy"""
+        proxies = {"http": proxy_url(proxy), "https": proxy_url(proxy)}
         try:
-            # check if bad proxy - assuming google is good, wink
-            test_url = "https://www.google.com"
-            resp = requests.head(test_url, proxies=proxy, timeout=timeout)
-        except:     # bad proxy
-            logging.info("removing proxy %s" % proxy)
-        else:
-            logging.info("adding proxy %s back to queue" % proxy)
-            self.proxies.put(proxy)
-        finally:
-            # read using another proxy no matter what
-            self.urlread(url, timeout)
+            requests.head(self.test_url, proxies=proxies, timeout=timeout)
+        except Exception:     # bad proxy
+            return False
+        return True
 
     def _read(self, url, proxy, timeout):
-        proxies = {"http": proxy, "https": proxy}
         user_agent = self.ua.random
         headers = {"User-Agent": user_agent}
-        response = requests.get(url, timeout=timeout, proxies=proxies,
-                                headers=headers)
-        return response.text
+        with self.sessions.session(proxy) as session:
+            response = session.get(url, timeout=timeout, headers=headers)
+            html = response.text
+
+        if response.status_code >= 400:
+            raise HTTPError(url, response.status_code, response.reason,
+                            response.headers, None)
+        return html
 
     def urlread(self, url, timeout):
-        try:
-            # grab from queue
-            proxy = self.proxies.get(timeout=0.1)
-            # print("Reading %s using proxy %s" % (url, proxy))
+        error = None
+        for _ in range(self.max_retries + 1):
+            proxy = self.pool.acquire(timeout)
+            if proxy is None:
+                break
 
+            start = time.time()
             try:
                 html = self._read(url, proxy, timeout)
-                logging.info("adding proxy %s back into queue" % proxy)
-                self.proxies.put(proxy)
-
+            except HTTPError:
+                # the proxy works, the server answered with an error
+                self.pool.success(proxy, time.time() - start)
+                self.count_proxy_request("success")
+                raise
+            except Exception as e:     # bad proxy / bad server / etc
+                logging.info("Unable to read url %s using proxy %s" %
+                             (url, proxy))
+                if isinstance(e, PROXY_ERRORS) and self.pool.failure(proxy):
+                    self.sessions.discard(proxy)
+                self.count_proxy_request("failure")
+                error = e
+            else:
+                self.pool.success(proxy, time.time() - start)
+                self.count_proxy_request("success")
                 return html
-            except:     # bad proxy / bad server / etc
-                # print("testing proxy %s" % proxy)
-                # self._test_proxy(url, proxy, timeout)
-                return self.urlread(url, timeout)
-
-        except queue.Empty:
-            # wait for all threads to join when queue is empty
-            while threading.active_count() > 1:
-                time.sleep(0.1)
-
-            # refill queue if using free proxies
-            # if self._user_proxies:
-            logging.error("proxy list exhausted, spider stopped")
-            sys.exit()
-            # else:
-            #     self.proxies = get_free_proxies()
+
+        if error is None:
+            raise ProxyError("No proxy available to read url %s" % url)
+        raise error
+
+    def count_proxy_request(self, result):
+        if self.metrics is not None:
+            self.metrics.count("proxy_requests_total", 1, result)
+
+    def close(self):
+        self.sessions.clear()
+        self.pool.close()
 
     def urlparse(self, html):
-        return self.parser.parse(html)
-
-    def clear_proxies(self):
-        """Empty the proxy queue so that new proxies are loaded.
-
-        After the queue is emptied, the next call to urlread by a thread throws
-        an empty queue error. This occurs until the thread count drops to 1 and
-        only the main thread is active. At this point the queue is refilled.
-        """
-        logging.info("clearing the proxy queue")
-        # these queue methods are undocumented
-        with self.proxies.mutex:
-            self.proxies.queue.clear()
+        return extract_links_lxml(html)
@@ -0,0 +1,165 @@
+"""Persistent http connections for the default backend.
+
+urlopen opens a new connection, and for https urls performs a new tls
+handshake, for every url. Since the urls of a server are read one after the
+other, the connections are instead kept alive in a pool and reused by the next
+request to the same scheme, host and port. Connections idle for too long are
+closed since the server has most likely closed its end already.
+"""
+
+from __future__ import absolute_import
+
+from collections import OrderedDict
+import socket
+import ssl
+import threading
+import time
+
+try:
+    import httplib as http_client
+    from urlparse import urlsplit
+except ImportError:
+    import http.client as http_client
+    from urllib.parse import urlsplit
+
+
+USER_AGENT = "Python-urllib/arackpy"
+
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+
+class ConnectionPool(object):
+    """Thread safe pool of idle keep-alive connections.
+
+    A connection is used by one thread at a time, it is removed from the pool
+    while a request is made and put back once the response is read.
+
+    :Parameters:
+        `maxsize` : int
+            The maximum number of idle connections kept per host.
+
+        `idle_timeout` : int
+            Time in seconds after which an idle connection is closed.
+
+        `max_hosts` : int
+            The maximum number of hosts with idle connections. The connections
+            of the least recently used host are closed first.
+    """
+
+    def __init__(self, maxsize=4, idle_timeout=30, max_hosts=100):
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.max_hosts = max_hosts
+
+        # (scheme, netloc) -> list of (connection, last used time)
+        self.idle = OrderedDict()
+        self.lock = threading.Lock()
+
+        # number of requests made on new and reused connections
+        self.created = 0
+        self.reused = 0
+
+    def key(self, url):
+        parts = urlsplit(url)
+        return parts.scheme, parts.netloc
+
+    def connect(self, key, timeout):
+        scheme, netloc = key
+        if scheme == "https":
+            context = ssl.create_default_context()
+            return http_client.HTTPSConnection(netloc, timeout=timeout,
+                                               context=context)
+        return http_client.HTTPConnection(netloc, timeout=timeout)
+
+    def get(self, key, timeout):
+        """Return (connection, reused), an idle connection if available"""
+        now = time.time()
+        with self.lock:
+            connections = self.idle.get(key, [])
+            while connections:
+                conn, last_used = connections.pop()
+                if now - last_used < self.idle_timeout:
+                    self.reused += 1
+                    if conn.sock is not None:
+                        conn.sock.settimeout(timeout)
+                    return conn, True
+                conn.close()
+            self.created += 1
+
+        return self.connect(key, timeout), False
+
+    def put(self, key, conn):
+        """Return a connection to the pool once its response is read"""
+        with self.lock:
+            connections = self.idle.pop(key, [])
+            self.idle[key] = connections    # most recently used
+            if len(connections) < self.maxsize:
+                connections.append((conn, time.time()))
+                conn = None
+
+            while len(self.idle) > self.max_hosts:
+                _, evicted = self.idle.popitem(last=False)
+                for old, _ in evicted:
+                    old.close()
+
+        if conn is not None:
+            conn.close()
+
+    def request(self, url, timeout, headers=None):
+        """Make a GET request and return (connection, response) without
+        reading the body. Call release once the body is read. A request on a
+        reused connection that the server has closed in the meantime is
+        retried.
+        """
+        key = self.key(url)
+        parts = urlsplit(url)
+        path = parts.path or "/"
+        if parts.query:
+            path = "%s?%s" % (path, parts.query)
+
+        request_headers = {"User-Agent": USER_AGENT}
+        request_headers.update(headers or {})
+
+        while True:
+            conn, reused = self.get(key, timeout)
+            try:
+                conn.request("GET", path, headers=request_headers)
+                return conn, conn.getresponse()
+            except socket.timeout:
+                conn.close()
+                raise
+            except (http_client.HTTPException, socket.error):
+                conn.close()
+                if reused:
+                    continue
+                raise
+
+    def release(self, url, conn, response):
+        """Return the connection to the pool, or close it if the server asked
+        to or the body was not read completely.
+        """
+        if response.will_close or not response.isclosed():
+            conn.close()
+        else:
+            self.put(self.key(url), conn)
+
+    def urlopen(self, url, timeout, headers=None):
+        """Make a GET request and return the response with its body read"""
+        conn, response = self.request(url, timeout, headers)
+        try:
+            body = response.read()
+        except Exception:
+            conn.close()
+            raise
+
+        self.release(url, conn, response)
+        return response, body
+
+    def clear(self):
+        """Close all the idle connections"""
+        with self.lock:
+            idle, self.idle = self.idle, OrderedDict()
+
+        for connections in idle.values():
+            for conn, _ in connections:
+                conn.close()
@@ -0,0 +1,187 @@
+"""Content decoding for the default backend.
+
+Responses compressed with gzip or deflate are decompressed incrementally with
+zlib, chunk by chunk as they are read, so the compressed body is never
+buffered. The charset of the html is taken from the Content-Type header, then
+from a meta tag in the head of the document, then from a byte order mark.
+Pages without any declared charset are decoded as utf-8 if possible and as
+cp1252 otherwise, so a page is not thrown away because of a decode error once
+it has been downloaded.
+"""
+
+from __future__ import absolute_import
+
+import codecs
+import re
+import zlib
+
+
+# sent with every request of the default backend
+ACCEPT_ENCODING = "gzip, deflate"
+
+# number of bytes searched for a meta charset declaration
+SNIFF_SIZE = 2048
+
+FALLBACK_CHARSET = "cp1252"
+
+META_CHARSET_RE = re.compile(
+    br"""<meta[^>]+charset\s*=\s*["']?\s*([a-zA-Z0-9_:.+-]+)""",
+    re.IGNORECASE)
+
+BOMS = ((codecs.BOM_UTF8, "utf-8-sig"),
+        (codecs.BOM_UTF32_LE, "utf-32"),
+        (codecs.BOM_UTF32_BE, "utf-32"),
+        (codecs.BOM_UTF16_LE, "utf-16"),
+        (codecs.BOM_UTF16_BE, "utf-16"),
+        )
+
+
+class Decompressor(object):
+    """Incremental decompressor for a Content-Encoding header value.
+
+    Deflate is sent either zlib wrapped, as the standard requires, or raw by
+    some servers, the format is detected from the first chunk.
+
+    :Parameters:
+        `encoding` : str
+            The Content-Encoding header value, identity if empty or unknown.
+    """
+
+    def __init__(self, encoding=None):
+        self.encoding = (encoding or "identity").strip().lower()
+        if self.encoding in ("gzip", "x-gzip"):
+            self.zlib = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif self.encoding == "deflate":
+            self.zlib = zlib.decompressobj()
+        else:
+            self.zlib = None
+        self.started = False
+
+    def decompress(self, data):
+        if self.zlib is None or not data:
+            return data
+
+        if not self.started and self.encoding == "deflate":
+            self.started = True
+            try:
+                return self.zlib.decompress(data)
+            except zlib.error:
+                # raw deflate stream
+                self.zlib = zlib.decompressobj(-zlib.MAX_WBITS)
+
+        self.started = True
+        return self.zlib.decompress(data)
+
+    def flush(self):
+        if self.zlib is None:
+            return b""
+        return self.zlib.flush()
+
+
+def decompress(data, encoding):
+    """Return the data decompressed according to the Content-Encoding"""
+    decompressor = Decompressor(encoding)
+    return decompressor.decompress(data) + decompressor.flush()
+
+
+def lookup(charset):
+    """Return the normalized codec name or None if the charset is unknown"""
+    if not charset:
+        return None
+    if isinstance(charset, bytes):
+        charset = charset.decode("ascii", "ignore")
+    try:
+        return codecs.lookup(charset.strip()).name
+    except LookupError:
+        return None
+
+
+def detect_charset(header_charset, head):
+    """Return the charset of the html from the charset of the Content-Type
+    header, then from a meta tag, then from a byte order mark, or None if the
+    charset is not declared.
+
+    :Parameters:
+        `header_charset` : str
+            The charset of the Content-Type header or None.
+
+        `head` : bytes
+            The first bytes of the html.
+    """
+    charset = lookup(header_charset)
+    if charset:
+        return charset
+
+    match = META_CHARSET_RE.search(head[:SNIFF_SIZE])
+    if match:
+        charset = lookup(match.group(1))
+        if charset:
+            return charset
+
+    for bom, name in BOMS:
+        if head.startswith(bom):
+            return name
+
+    return None
+
+
+def guess_charset(head):
+    """Return utf-8 if the bytes decode as utf-8 and the fallback otherwise"""
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+    except UnicodeDecodeError:
+        return FALLBACK_CHARSET
+    return "utf-8"
+
+
+def decode_html(body, header_charset=None):
+    """Decode the html using the detected charset. Undeclared charsets fall
+    back to utf-8, then cp1252. Invalid bytes are replaced.
+    """
+    charset = detect_charset(header_charset, body)
+    if charset is None:
+        try:
+            return body.decode("utf-8")
+        except UnicodeDecodeError:
+            charset = FALLBACK_CHARSET
+
+    return body.decode(charset, "replace")
+
+
+class HtmlDecoder(object):
+    """Incremental decoder that decompresses and decodes chunks of html.
+
+    The charset is detected once enough bytes are received to search the
+    head of the document for a meta tag, until then the decoded text is
+    empty.
+
+    :Parameters:
+        `encoding` : str
+            The Content-Encoding header value.
+
+        `header_charset` : str
+            The charset of the Content-Type header or None.
+    """
+
+    def __init__(self, encoding=None, header_charset=None):
+        self.decompressor = Decompressor(encoding)
+        self.header_charset = header_charset
+        self.decoder = None
+        self.head = b""
+
+    def decode(self, data, final=False):
+        data = self.decompressor.decompress(data)
+        if final:
+            data += self.decompressor.flush()
+
+        if self.decoder is None:
+            self.head += data
+            if len(self.head) < SNIFF_SIZE and not final:
+                return u""
+
+            data, self.head = self.head, b""
+            charset = (detect_charset(self.header_charset, data) or
+                       guess_charset(data[:SNIFF_SIZE]))
+            self.decoder = codecs.getincrementaldecoder(charset)("replace")
+
+        return self.decoder.decode(data, final)
@@ -0,0 +1,191 @@
+"""Persistent requests sessions for the proxy and tor backends.
+
+requests.get creates a new session, and so a new connection pool, for every
+url. Through a proxy every url then pays a new connection to the proxy, an
+https CONNECT tunnel and a tls handshake. The sessions are instead kept in a
+pool keyed by proxy and reused, so that their connections, and the tunnels
+through the proxy, are kept alive between urls.
+
+A requests.Session is not thread safe, so a session is used by one thread at
+a time, it is taken from the pool for a request and put back once the
+response is read. Sessions idle for too long are closed since the proxy has
+most likely closed its connections already.
+"""
+
+from __future__ import absolute_import
+
+from collections import OrderedDict
+from contextlib import contextmanager
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def proxy_url(proxy):
+    """Return the url of a proxy given as host:port, an http proxy"""
+    if "://" in proxy:
+        return proxy
+    return "http://" + proxy
+
+
+def connection_count(session):
+    """Return the number of connections created by the connection pools of
+    the session so far. A connection dropped by the server and opened again
+    by urllib3 is not counted twice.
+    """
+    count = 0
+    for adapter in list(session.adapters.values()):
+        managers = [getattr(adapter, "poolmanager", None)]
+        managers.extend(getattr(adapter, "proxy_manager", {}).values())
+        for manager in managers:
+            if manager is None:
+                continue
+            pools = manager.pools
+            for key in list(pools.keys()):
+                try:
+                    count += pools[key].num_connections
+                except (KeyError, AttributeError):
+                    pass
+    return count
+
+
+class SessionPool(object):
+    """Thread safe pool of idle requests sessions keyed by proxy.
+
+    :Parameters:
+        `maxsize` : int
+            The maximum number of idle sessions kept per proxy.
+
+        `pool_connections` : int
+            The number of hosts whose connections are kept alive by the
+            adapter of each session.
+
+        `pool_maxsize` : int
+            The maximum number of connections kept alive per host by the
+            adapter of each session.
+
+        `idle_timeout` : int
+            Time in seconds after which an idle session is closed.
+
+        `max_keys` : int
+            The maximum number of proxies with idle sessions. The sessions of
+            the least recently used proxy are closed first.
+
+        `metrics` : Metrics
+            If set, the reuse of sessions and connections is counted.
+    """
+
+    def __init__(self, maxsize=4, pool_connections=10, pool_maxsize=4,
+                 idle_timeout=60, max_keys=100, metrics=None):
+        self.maxsize = maxsize
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.idle_timeout = idle_timeout
+        self.max_keys = max_keys
+        self.metrics = metrics
+
+        # proxy -> list of (session, last used time)
+        self.idle = OrderedDict()
+        self.lock = threading.Lock()
+
+        # number of sessions created and reused
+        self.created = 0
+        self.reused = 0
+
+    def __len__(self):
+        with self.lock:
+            return sum(len(sessions) for sessions in self.idle.values())
+
+    def create(self, proxy):
+        """Return a new session using the proxy, None for no proxy"""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_connections,
+                              pool_maxsize=self.pool_maxsize)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        if proxy is not None:
+            url = proxy_url(proxy)
+            session.proxies.update({"http": url, "https": url})
+        return session
+
+    def get(self, proxy):
+        """Return (session, reused), an idle session if available"""
+        now = time.time()
+        expired = []
+        with self.lock:
+            sessions = self.idle.get(proxy, [])
+            while sessions:
+                session, last_used = sessions.pop()
+                if now - last_used < self.idle_timeout:
+                    self.reused += 1
+                    break
+                expired.append(session)
+            else:
+                session = None
+                self.created += 1
+
+        for old in expired:
+            old.close()
+
+        if session is None:
+            return self.create(proxy), False
+        return session, True
+
+    def put(self, proxy, session):
+        """Return a session to the pool once its response is read"""
+        with self.lock:
+            sessions = self.idle.pop(proxy, [])
+            self.idle[proxy] = sessions     # most recently used
+            if len(sessions) < self.maxsize:
+                sessions.append((session, time.time()))
+                session = None
+
+            evicted = []
+            while len(self.idle) > self.max_keys:
+                evicted.extend(self.idle.popitem(last=False)[1])
+
+        if session is not None:
+            session.close()
+        for old, _ in evicted:
+            old.close()
+
+    @contextmanager
+    def session(self, proxy):
+        """Context manager taking a session from the pool and putting it back
+        after the request. The session is closed instead if the request
+        fails, its connections may be broken.
+        """
+        session, reused = self.get(proxy)
+        before = connection_count(session) if self.metrics is not None else 0
+        try:
+            yield session
+        except Exception:
+            session.close()
+            raise
+
+        if self.metrics is not None:
+            self.metrics.count("proxy_sessions_total", 1,
+                               "reused" if reused else "new")
+            self.metrics.count(
+                "proxy_connections_total", 1,
+                "new" if connection_count(session) > before else "reused")
+        self.put(proxy, session)
+
+    def discard(self, proxy):
+        """Close the idle sessions of a proxy, e.g. evicted from the pool"""
+        with self.lock:
+            sessions = self.idle.pop(proxy, [])
+
+        for session, _ in sessions:
+            session.close()
+
+    def clear(self):
+        """Close all the idle sessions"""
+        with self.lock:
+            idle, self.idle = self.idle, OrderedDict()
+
+        for sessions in idle.values():
+            for session, _ in sessions:
+                session.close()
@@ -0,0 +1,124 @@
+"""Signal the tor service through its control port.
+
+Once tor receives the NEWNYM signal, new streams use new circuits while the
+open streams keep their circuit. Tor ignores signals sent less than 10
+seconds apart, so the controller does not send them more often.
+
+The control port is disabled by default, enable it in the torrc file:
+
+    ControlPort 9051
+    HashedControlPassword <output of tor --hash-password>
+"""
+
+from __future__ import absolute_import
+
+import binascii
+import logging
+import socket
+import threading
+import time
+
+
+class TorControlError(Exception):
+    """The control port refused a command"""
+    pass
+
+
+class TorController(object):
+    """Sends signals to tor, one connection per signal.
+
+    :Parameters:
+        `port` : int
+            The control port of tor.
+
+        `host` : str
+            The host tor runs on.
+
+        `password` : str
+            The control password, if HashedControlPassword is set.
+
+        `cookie_path` : str
+            The authentication cookie file, if CookieAuthentication is set.
+
+        `timeout` : int
+            The timeout of the control connection.
+    """
+
+    # seconds between two NEWNYM signals accepted by tor
+    min_interval = 10
+
+    def __init__(self, port=9051, host="127.0.0.1", password=None,
+                 cookie_path=None, timeout=5):
+        self.port = port
+        self.host = host
+        self.password = password
+        self.cookie_path = cookie_path
+        self.timeout = timeout
+
+        self.last_newnym = None
+        self.lock = threading.Lock()
+
+    def authenticate_line(self):
+        if self.password is not None:
+            password = self.password.replace("\\", "\\\\").replace('"', '\\"')
+            return 'AUTHENTICATE "%s"' % password
+        if self.cookie_path is not None:
+            with open(self.cookie_path, "rb") as f:
+                cookie = binascii.hexlify(f.read()).decode("ascii")
+            return "AUTHENTICATE %s" % cookie
+        return "AUTHENTICATE"
+
+    def command(self, f, line):
+        """Send a command and return its reply lines, raise TorControlError
+        unless tor answers 250
+        """
+        f.write((line + "\r\n").encode("ascii"))
+        f.flush()
+
+        lines = []
+        while True:
+            reply = f.readline().decode("ascii", "replace").rstrip("\r\n")
+            if not reply:
+                raise TorControlError("Connection closed by tor")
+            lines.append(reply)
+            # the last line of a reply has a space after the status code
+            if len(reply) < 4 or reply[3] == " ":
+                break
+
+        if not lines[-1].startswith("250"):
+            raise TorControlError(lines[-1])
+        return lines
+
+    def signal(self, name):
+        """Send a signal, e.g. NEWNYM"""
+        sock = socket.create_connection((self.host, self.port), self.timeout)
+        try:
+            f = sock.makefile("rwb")
+            try:
+                self.command(f, self.authenticate_line())
+                self.command(f, "SIGNAL %s" % name)
+                self.command(f, "QUIT")
+            finally:
+                f.close()
+        finally:
+            sock.close()
+
+    def newnym(self):
+        """Ask tor for new circuits. Return False if the last request was
+        too recent or failed.
+        """
+        with self.lock:
+            now = time.time()
+            if (self.last_newnym is not None and
+                    now - self.last_newnym < self.min_interval):
+                return False
+            self.last_newnym = now
+
+            try:
+                self.signal("NEWNYM")
+            except (socket.error, TorControlError, IOError):
+                logging.exception("Unable to signal NEWNYM to tor")
+                return False
+
+        logging.info("Requested new tor circuits")
+        return True
@@ -0,0 +1,220 @@
+"""Checkpoints of the crawl state, used to resume an interrupted crawl.
+
+The state is the visited cache, the urls queued but not read yet with their
+depth, the current level and the number of read urls. It is saved to a
+directory as a snapshot and an append-only log of the changes made since the
+snapshot:
+
+    q <depth> <url>
+        The url is queued.
+
+    v <read> <url>
+        The url is visited, read is 1 if its html was read and 0 otherwise.
+
+    d 0 <url>
+        The queued url is dropped without being read, e.g. rejected by the
+        robots.txt file.
+
+    l <level>
+        The spider starts the level.
+
+The reader threads only put records on a queue. A background thread appends
+them to the log in batches and periodically writes a new snapshot, which
+empties the log, so checkpointing never blocks the reads. Resuming loads the
+snapshot and replays the log, a partially written last record is ignored.
+"""
+
+from __future__ import absolute_import
+
+from collections import OrderedDict
+import io
+import logging
+import os
+import pickle
+import threading
+import time
+
+try:
+    from Queue import Queue, Empty
+except ImportError:
+    from queue import Queue, Empty
+
+from arackpy.utils import fingerprint, write_file
+
+
+class Checkpoint(object):
+    """Saves the crawl state to a directory from a background thread.
+
+    :Parameters:
+        `path` : str
+            The checkpoint directory, created if it does not exist.
+
+        `interval` : int
+            Time in seconds between two snapshots.
+    """
+
+    def __init__(self, path, interval=60):
+        self.path = path
+        self.interval = interval
+
+        self.snapshot_path = os.path.join(path, "snapshot")
+        self.log_path = os.path.join(path, "log")
+
+        # the state as of the last record written
+        self.visited = None
+        self.pending = OrderedDict()    # fingerprint -> (url, depth)
+        self.level = 0
+        self.total_url_count = 0
+
+        self.records = Queue()
+        self.thread = None
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def key(self, url):
+        # pending urls are indexed by the fingerprint of their canonical url
+        return fingerprint(url.rstrip("/"))
+
+    def apply(self, record):
+        """Update the state with the record"""
+        kind = record[0]
+        if kind == "q":
+            _, depth, url = record
+            self.pending[self.key(url)] = (url, depth)
+        elif kind == "v":
+            _, read, url = record
+            self.pending.pop(self.key(url), None)
+            self.total_url_count += read
+        elif kind == "d":
+            self.pending.pop(self.key(record[2]), None)
+        elif kind == "l":
+            self.level = record[1]
+
+    def load(self):
+        """Load the snapshot, replay the log and return True if the directory
+        holds a checkpoint.
+        """
+        try:
+            with open(self.snapshot_path, "rb") as f:
+                state = pickle.load(f)
+        except (IOError, OSError):
+            return False
+
+        self.visited = state["visited"]
+        self.pending = OrderedDict((self.key(url), (url, depth))
+                                   for url, depth in state["pending"])
+        self.level = state["level"]
+        self.total_url_count = state["total_url_count"]
+
+        try:
+            with io.open(self.log_path, encoding="utf-8") as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        break   # interrupted write
+                    kind, value, url = (line[:-1].split("\t", 2) + [""])[:3]
+                    record = (kind, int(value), url)
+                    if kind == "v":
+                        self.visited.add(url.rstrip("/"))
+                    self.apply(record[:2] if kind == "l" else record)
+        except (IOError, OSError):
+            pass
+        except ValueError:
+            logging.warning("Ignoring corrupted checkpoint log %s" %
+                            self.log_path)
+
+        return True
+
+    def start(self, visited, pending, level=0, total_url_count=0):
+        """Write a first snapshot of the given state and start the background
+        thread.
+        """
+        self.visited = visited
+        self.pending = OrderedDict((self.key(url), (url, depth))
+                                   for url, depth in pending)
+        self.level = level
+        self.total_url_count = total_url_count
+        self.snapshot()
+
+        self.thread = threading.Thread(target=self.run,
+                                       name="arackpy-checkpoint")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def queued(self, url, depth):
+        if "\n" not in url:
+            self.records.put(("q", depth, url))
+
+    def visit(self, url, read):
+        if "\n" not in url:
+            self.records.put(("v", int(bool(read)), url))
+
+    def drop(self, url):
+        if "\n" not in url:
+            self.records.put(("d", 0, url))
+
+    def next_level(self, level):
+        self.records.put(("l", level))
+
+    def snapshot(self):
+        """Write the state to a new snapshot and empty the log"""
+        state = {"visited": self.visited,
+                 "pending": list(self.pending.values()),
+                 "level": self.level,
+                 "total_url_count": self.total_url_count,
+                 }
+
+        write_file(self.snapshot_path, pickle.dumps(state, protocol=2))
+
+        io.open(self.log_path, "w").close()
+
+    def run(self):
+        last_snapshot = time.time()
+        stop = False
+        while not stop:
+            timeout = max(0.1, last_snapshot + self.interval - time.time())
+            try:
+                records = [self.records.get(timeout=timeout)]
+            except Empty:
+                records = []
+
+            # batch all the records available
+            while True:
+                try:
+                    records.append(self.records.get_nowait())
+                except Empty:
+                    break
+
+            if None in records:
+                stop = True
+                records = records[:records.index(None)]
+
+            try:
+                self.write(records)
+                if stop or time.time() - last_snapshot >= self.interval:
+                    self.snapshot()
+                    last_snapshot = time.time()
+            except Exception:
+                logging.exception("Unable to write checkpoint %s" % self.path)
+
+    def write(self, records):
+        if not records:
+            return
+
+        lines = []
+        for record in records:
+            self.apply(record)
+            if record[0] == "l":
+                lines.append(u"l\t%d\n" % record[1])
+            else:
+                lines.append(u"%s\t%d\t%s\n" % record)
+
+        with io.open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(u"".join(lines))
+
+    def close(self):
+        """Write the remaining records, a last snapshot and stop"""
+        if self.thread is not None:
+            self.records.put(None)
+            self.thread.join()
+            self.thread = None
@@ -0,0 +1,23 @@
+"""Engines drive the spider, i.e. decide when and how concurrently the urls
+are read, while the backends decide how each url is read and parsed.
+
+The default 'threads' engine is built into the spider itself.
+"""
+
+from abc import abstractmethod
+
+
+class Engine(object):
+    """Abstract base class"""
+
+    def __init__(self, spider):
+        self.spider = spider
+
+    @property
+    def name(self):
+        return self.__class__.__name__
+
+    @abstractmethod
+    def run(self):
+        """Crawl until a termination criteria is met"""
+        pass
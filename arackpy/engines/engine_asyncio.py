@@ -0,0 +1,304 @@
+"""Crawl using a single asyncio event loop instead of one thread per server ip.
+
+A fixed number of worker coroutines, set by the spider concurrency attribute,
+read urls from a shared queue, the urls of the highest priority first. The
+number of urls read at the same time from any one host is limited by the
+host_concurrency attribute and the spider waits between two urls of the same
+host as it does with the threads engine. Since there are no levels, the depth
+of each url is tracked instead to honor the max_levels attribute. The queue
+holds up to max_urls_per_level urls in memory, the urls queued beyond this
+limit are spilled to disk and moved back to the queue by the workers as it
+empties, so no url is dropped. The urls of the sitemaps of the spider, if
+any, are queued at depth 0 whenever the queue has room for them.
+
+The backend reads and parses urls using its aurlread and aurlparse methods.
+The parse method can be a coroutine, otherwise it runs in a thread pool
+executor so that the event loop is not blocked.
+
+.. note::
+    Requires Python 3.5+.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+import logging
+import os
+from queue import Empty
+import time
+from urllib.parse import urlsplit
+
+from arackpy.engines import Engine
+from arackpy.frontier import DepthSpillQueue
+from arackpy.visited import VISITED_CACHES
+
+
+class Engine_Asyncio(Engine):
+    """Reads urls concurrently from an asyncio event loop.
+
+    :Parameters:
+        `spider` : Spider
+            The spider to drive.
+    """
+
+    def __init__(self, spider):
+        super(Engine_Asyncio, self).__init__(spider)
+        self.host_semaphores = {}
+        # urls queued at least once, avoids queueing a url many times before
+        # it is visited
+        self.queued = VISITED_CACHES[spider.visited_cache](
+            spider.visit_history_limit, spider.visited_error_rate)
+
+        # urls queued while the queue is full
+        self.overflow = DepthSpillQueue(spider.max_urls_per_level,
+                                        spider.frontier_spill_path)
+
+        self.sequence = itertools.count()
+        self.done = False
+
+    def run(self):
+        loop = asyncio.new_event_loop()
+        executor = ThreadPoolExecutor(min(32, (os.cpu_count() or 1) + 4))
+        loop.set_default_executor(executor)
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self.crawl())
+        finally:
+            self.overflow.close()
+            loop.close()
+            asyncio.set_event_loop(None)
+            executor.shutdown(wait=False)
+
+    async def crawl(self):
+        spider = self.spider
+
+        # (-priority, sequence, url, depth), fifo within a priority
+        self.queue = asyncio.PriorityQueue()
+        spider.metrics.gauge("frontier_depth", lambda: (self.queue.qsize() +
+                                                        len(self.overflow)))
+        spider.metrics.gauge("spilled_urls",
+                             lambda: self.overflow.total_spilled)
+        for url, depth in spider.seeds():
+            self.put(url, depth, spider.score(url, depth))
+
+        workers = [asyncio.ensure_future(self.worker())
+                   for _ in range(spider.concurrency)]
+        try:
+            if spider.sitemaps is not None:
+                await self.feed()
+            await self.queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        if self.done:
+            logging.info("Reached total read url count %s" %
+                         spider.total_url_count)
+
+    def put(self, url, depth, priority=0):
+        """Queue the url unless not accepted or already queued and return True
+        if it is queued. The url is spilled to disk if the queue is full.
+        """
+        spider = self.spider
+        if not spider.accept(url):
+            return False
+
+        # single thread, no lock required
+        if not self.queued.add(spider.url_key(url)):
+            spider.metrics.count("dropped_urls_total", 1, "duplicate")
+            return False
+
+        if spider.checkpoint is not None:
+            spider.checkpoint.queued(url, depth)
+
+        if self.queue.qsize() >= spider.max_urls_per_level:
+            self.overflow.put(url, depth, priority)
+        else:
+            self.queue.put_nowait((-priority, next(self.sequence), url,
+                                   depth))
+        return True
+
+    def refill(self):
+        """Move the spilled urls back to the queue"""
+        n = self.spider.max_urls_per_level - self.queue.qsize()
+        for _ in range(n):
+            try:
+                url, depth, priority = self.overflow.get()
+            except Empty:
+                break
+            self.queue.put_nowait((-priority, next(self.sequence), url,
+                                   depth))
+
+    async def feed(self):
+        """Queue the urls of the sitemaps while the queue has room, the
+        sitemaps are read from the executor
+        """
+        spider = self.spider
+        loop = asyncio.get_event_loop()
+
+        while not (self.done or spider.sitemaps.exhausted):
+            n = spider.max_urls_per_level - self.queue.qsize()
+            if n <= 0:
+                await asyncio.sleep(0.1)
+                continue
+
+            urls = await loop.run_in_executor(None, spider.next_sitemap_urls,
+                                              n)
+            for url, priority in urls:
+                self.put(url, 0, priority)
+
+    async def worker(self):
+        while True:
+            _, _, url, depth = await self.queue.get()
+            try:
+                if not self.done:
+                    await self.visit(url, depth)
+            except Exception:
+                logging.exception("Unable to crawl url, %s" % url)
+            finally:
+                # refilled before the url is done, so that the queue is never
+                # joined while urls are spilled
+                if not self.done:
+                    self.refill()
+                self.queue.task_done()
+
+    def host_semaphore(self, host):
+        try:
+            return self.host_semaphores[host]
+        except KeyError:
+            semaphore = asyncio.Semaphore(self.spider.host_concurrency)
+            return self.host_semaphores.setdefault(host, semaphore)
+
+    async def get_robots(self, root_url):
+        """Return the robotparser from the robots cache of the spider, the
+        executor is only used when the robots.txt file must be read.
+        """
+        spider = self.spider
+        if not spider.read_robots_file:
+            return None
+
+        rp = spider.robots.cached(root_url)
+        if rp is None:
+            loop = asyncio.get_event_loop()
+            rp = await loop.run_in_executor(None, spider.get_robots, root_url)
+
+        return rp
+
+    async def parse(self, url, html):
+        spider = self.spider
+        loop = asyncio.get_event_loop()
+
+        if spider.parse_pool is not None:
+            # returns the urls to follow, waits for a slot of the window
+            return await loop.run_in_executor(
+                None, spider.parse_pool.parse, url, html,
+                spider.backend.not_modified(url))
+
+        parse = spider.get_parser(url)
+
+        try:
+            if asyncio.iscoroutinefunction(parse):
+                return await self.await_parse(parse(url, html))
+
+            follow_links = await loop.run_in_executor(None, spider.safe_parse,
+                                                      url, html, parse)
+
+            # unchanged calling a coroutine parse
+            if asyncio.iscoroutine(follow_links):
+                follow_links = await self.await_parse(follow_links)
+            return follow_links
+        except Exception:
+            logging.exception("Unable to parse url, %s" % url)
+            return False
+
+    async def await_parse(self, coroutine):
+        """Await a coroutine parse, under the lock if thread_safe_parse is
+        set, and export the items it returns like Spider.safe_parse
+        """
+        spider = self.spider
+        if spider.thread_safe_parse:
+            # the lock is shared with the parse methods run by the executor
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(None, spider.lock.acquire)
+
+        try:
+            with spider.metrics.time("parse"):
+                return spider.export_items(await coroutine)
+        finally:
+            if spider.thread_safe_parse:
+                spider.lock.release()
+
+    async def visit(self, url, depth):
+        spider = self.spider
+
+        if not spider.accept(url):
+            return
+
+        parts = urlsplit(url)
+        root_url = "".join([parts.scheme, "://", parts.netloc])
+
+        async with self.host_semaphore(parts.netloc):
+            # read by another worker while waiting
+            if spider.url_key(url) in spider.visited:
+                spider.metrics.count("dropped_urls_total", 1, "visited")
+                return
+
+            rp = await self.get_robots(root_url)
+            if rp is not None and rp.can_fetch("*", url) is False:
+                logging.info("robots.txt from %s rejected spider" % url)
+                spider.metrics.count("dropped_urls_total", 1, "robots")
+                if spider.checkpoint is not None:
+                    spider.checkpoint.drop(url)
+                return
+
+            html = None
+            start = time.time()
+            try:
+                html = await spider.backend.aurlread(url, spider.timeout)
+                logging.info("Downloaded url, %s" % url)
+                spider.observe(url, start)
+            except Exception as e:
+                logging.exception("Unable to download url, %s" % url)
+                spider.observe(url, start, e)
+                await self.respect_server(url, rp)
+                return
+            finally:
+                spider.visited.add(spider.url_key(url))
+                if spider.checkpoint is not None:
+                    spider.checkpoint.visit(url, html is not None)
+
+            # single thread, no lock required
+            spider.total_url_count += 1
+            if spider.total_url_count > spider.max_urls:
+                self.done = True
+                return
+
+            follow_links = await self.parse(url, html)
+
+            try:
+                if follow_links is None:
+                    with spider.metrics.time("extract"):
+                        new_urls = await spider.backend.aurlparse(html)
+                elif follow_links is False:
+                    new_urls = []
+                else:
+                    new_urls = follow_links
+
+                if depth < spider.max_levels:
+                    with spider.metrics.time("enqueue"):
+                        for new_url, priority in spider.prioritize(
+                                url, new_urls, depth + 1):
+                            self.put(new_url, depth + 1, priority)
+            except Exception:
+                logging.exception("Unable to extract urls from url, %s" % url)
+
+            await self.respect_server(url, rp)
+
+    async def respect_server(self, url, rp):
+        """Wait before the next url of the host, called while holding the
+        host semaphore
+        """
+        spider = self.spider
+        if spider.respect_server:
+            await asyncio.sleep(spider.get_host_delay(url, rp))
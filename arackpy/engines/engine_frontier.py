@@ -0,0 +1,189 @@
+"""Crawl continuously from a per host frontier instead of level by level.
+
+With the threads engine every level waits for the slowest host, e.g. a host
+with many urls and a long robots.txt crawl delay, while the other reader
+threads sit idle. The frontier engine has no levels. Urls are queued per host
+and each reader thread takes the next url of the host that is ready the
+soonest, reads it and schedules the host again once the delay has passed. The
+depth of each url is tracked to honor max_levels. Among the hosts that are
+ready, the url of the highest priority is read first.
+
+The frontier holds up to max_urls_per_level urls in memory. The urls queued
+beyond this limit are spilled to disk, like the level queues of the threads
+engine, and moved back to the frontier by the reader threads as it empties,
+so no url is dropped. The urls of the sitemaps of the spider, if any, are
+queued at depth 0 the same way, whenever the frontier has room for them.
+"""
+
+from __future__ import absolute_import
+
+import logging
+import threading
+
+try:
+    from Queue import Empty
+    from urlparse import urlsplit
+except ImportError:
+    from queue import Empty
+    from urllib.parse import urlsplit
+
+from arackpy.engines import Engine
+from arackpy.frontier import DepthSpillQueue, HostFrontier
+from arackpy.visited import VISITED_CACHES
+
+
+class Engine_Frontier(Engine):
+    """Reads urls from a per host frontier using the reader threads of the
+    spider.
+
+    :Parameters:
+        `spider` : Spider
+            The spider to drive.
+    """
+
+    def __init__(self, spider):
+        super(Engine_Frontier, self).__init__(spider)
+        self.frontier = HostFrontier()
+
+        # urls queued at least once, avoids queueing a url many times before
+        # it is visited
+        self.queued = VISITED_CACHES[spider.visited_cache](
+            spider.visit_history_limit, spider.visited_error_rate)
+
+        # urls queued while the frontier is full
+        self.overflow = DepthSpillQueue(spider.max_urls_per_level,
+                                        spider.frontier_spill_path)
+
+        self.lock = threading.Lock()
+        self.feed_lock = threading.Lock()
+
+    def run(self):
+        spider = self.spider
+        spider.metrics.gauge("frontier_depth", lambda: (len(self.frontier) +
+                                                        len(self.overflow)))
+        spider.metrics.gauge("spilled_urls",
+                             lambda: self.overflow.total_spilled)
+
+        for url, depth in spider.seeds():
+            self.put(url, depth, spider.score(url, depth))
+
+        try:
+            for _ in range(spider.concurrency):
+                spider.pool.submit(self.work)
+            spider.pool.join()
+        finally:
+            self.overflow.close()
+
+        if spider.total_url_count > spider.max_urls:
+            logging.info("Reached total read url count %s" %
+                         spider.total_url_count)
+
+    def put(self, url, depth, priority=0):
+        """Queue the url unless not accepted or already queued and return True
+        if it is queued. The url is spilled to disk if the frontier is full.
+        """
+        spider = self.spider
+        if not spider.accept(url):
+            return False
+
+        with self.lock:
+            if not self.queued.add(spider.url_key(url)):
+                spider.metrics.count("dropped_urls_total", 1, "duplicate")
+                return False
+
+        if spider.checkpoint is not None:
+            spider.checkpoint.queued(url, depth)
+
+        if len(self.frontier) >= spider.max_urls_per_level:
+            self.overflow.put(url, depth, priority)
+        else:
+            self.frontier.put(spider.get_tld(url), url, depth, priority)
+        return True
+
+    def feed(self):
+        """Queue the spilled urls, then the urls of the sitemaps, while the
+        frontier has room
+        """
+        if self.frontier.closed:
+            return
+
+        with self.feed_lock:
+            try:
+                self.refill()
+                self.feed_sitemaps()
+            except Exception:
+                logging.exception("Unable to feed the frontier")
+
+    def refill(self):
+        """Move the spilled urls back to the frontier"""
+        spider = self.spider
+        for _ in range(spider.max_urls_per_level - len(self.frontier)):
+            try:
+                url, depth, priority = self.overflow.get()
+            except Empty:
+                break
+            self.frontier.put(spider.get_tld(url), url, depth, priority)
+
+    def feed_sitemaps(self):
+        """Queue the urls of the sitemaps"""
+        spider = self.spider
+        if spider.sitemaps is None or spider.sitemaps.exhausted:
+            return
+
+        n = spider.max_urls_per_level - len(self.frontier)
+        if n > 0:
+            for url, priority in spider.next_sitemap_urls(n):
+                self.put(url, 0, priority)
+
+    def work(self):
+        self.feed()
+        while True:
+            item = self.frontier.get()
+            if item is None:
+                break
+
+            key, url, depth = item
+            delay = 0
+            try:
+                delay = self.visit(url, depth)
+            except Exception:
+                logging.exception("Unable to crawl url, %s" % url)
+            finally:
+                # fed while the key is busy, so that the other threads never
+                # find the frontier exhausted while urls are left to queue
+                self.feed()
+                self.frontier.done(key, delay)
+
+    def visit(self, url, depth):
+        """Read the url, queue the urls to follow and return the delay before
+        the next url of the same host.
+        """
+        spider = self.spider
+
+        parts = urlsplit(url)
+        rp = spider.get_robots("".join([parts.scheme, "://", parts.netloc]))
+
+        html = spider.fetch(url, rp)
+        if html is None:
+            # a failed read may have raised the delay, e.g. a 503 response
+            if not spider.respect_server:
+                return 0
+            return spider.get_host_delay(url, rp)
+
+        if not spider.increment():
+            self.frontier.close()
+            return 0
+
+        new_urls = spider.follow(url, url, html, depth + 1)
+        if depth < spider.max_levels:
+            with spider.metrics.time("enqueue"):
+                for new_url, priority in new_urls:
+                    self.put(new_url, depth + 1, priority)
+
+        with self.lock:
+            spider.level = max(spider.level, depth)
+
+        if not spider.respect_server:
+            return 0
+
+        return spider.get_host_delay(url, rp)
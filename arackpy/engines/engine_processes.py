@@ -0,0 +1,344 @@
+"""Crawl from several processes, each reading its own shard of hosts.
+
+With threads, the parse method of the spider, the extraction of urls and the
+parsing of robots.txt files all compete for the global interpreter lock of a
+single process. This engine forks a number of processes instead. Each host is
+assigned to one process by consistent hashing and each process runs the
+frontier engine on the hosts of its shard. The urls discovered for a host of
+another shard are sent to the process owning it through its inbox queue.
+
+The processes share the count of read urls, to honor max_urls, and the count
+of urls queued or being read across all the processes. The crawl is over when
+the latter drops to zero, i.e. no process has any url left to read and no url
+is in flight between two processes. The depth of every url is sent along so
+max_levels is honored as well. The max_urls_per_level attribute applies to
+the frontier of each process.
+
+Every process records its own metrics and sends them to the parent process
+when it finishes, where they are added to the metrics of the spider. The
+exported items are sent to the parent process in batches as well, so that
+a single thread writes them.
+
+The urls of the sitemaps, if any, are read by the parent process and sent to
+the processes while fewer than max_urls_per_level urls per process are
+pending.
+
+.. note::
+    Requires the fork start method, i.e. a unix platform. The parse method
+    runs in the child processes, changes it makes to the spider are not seen
+    by the parent process.
+"""
+
+from __future__ import absolute_import
+
+import bisect
+import hashlib
+import logging
+import multiprocessing
+import threading
+import time
+
+try:
+    from Queue import Empty
+except ImportError:
+    from queue import Empty
+
+from arackpy.engines import Engine
+from arackpy.engines.engine_frontier import Engine_Frontier
+from arackpy.frontier import HostFrontier
+from arackpy.items import ItemPipeline, QueueWriter
+
+
+class HashRing(object):
+    """Consistent hashing of keys to nodes.
+
+    Every node is placed at many points of a ring of 32 bit hashes and a key
+    belongs to the node of the first point following its own hash, so that
+    keys spread evenly and adding a node only moves the keys of its points.
+
+    :Parameters:
+        `nodes` : list
+            The nodes, e.g. the process indexes.
+
+        `replicas` : int
+            The number of points per node.
+    """
+
+    def __init__(self, nodes, replicas=100):
+        points = []
+        for node in nodes:
+            for i in range(replicas):
+                points.append((self.hash("%s-%s" % (node, i)), node))
+        points.sort()
+
+        self.hashes = [h for h, _ in points]
+        self.nodes = [node for _, node in points]
+
+    def hash(self, key):
+        digest = hashlib.md5(key.encode("utf-8")).hexdigest()
+        return int(digest[:8], 16)
+
+    def node(self, key):
+        """Return the node owning the key"""
+        i = bisect.bisect(self.hashes, self.hash(key)) % len(self.hashes)
+        return self.nodes[i]
+
+
+class Engine_Shard(Engine_Frontier):
+    """The frontier engine of one process, reading the hosts of its shard.
+
+    :Parameters:
+        `spider` : Spider
+            The spider to drive.
+
+        `shard` : int
+            The index of the process.
+
+        `ring` : HashRing
+            Maps hosts to process indexes.
+
+        `inboxes` : list
+            The url queue of every process.
+
+        `pending` : Value
+            The number of urls queued or being read by all the processes.
+
+        `stop` : Event
+            Set once the crawl is over.
+    """
+
+    # seconds between two termination checks
+    poll_interval = 0.1
+
+    def __init__(self, spider, shard, ring, inboxes, pending, stop):
+        super(Engine_Shard, self).__init__(spider)
+        self.frontier = HostFrontier(persistent=True)
+        self.shard = shard
+        self.ring = ring
+        self.inboxes = inboxes
+        self.pending = pending
+        self.stop = stop
+
+    def add_pending(self, n):
+        with self.pending.get_lock():
+            self.pending.value += n
+            return self.pending.value
+
+    def run(self):
+        receiver = threading.Thread(target=self.receive,
+                                    name="arackpy-shard-receiver")
+        receiver.daemon = True
+        receiver.start()
+
+        super(Engine_Shard, self).run()
+        receiver.join()
+
+    def receive(self):
+        """Queue the urls sent by the other processes and close the frontier
+        once the crawl is over.
+        """
+        inbox = self.inboxes[self.shard]
+        while True:
+            try:
+                url, depth, priority = inbox.get(timeout=self.poll_interval)
+            except Empty:
+                pass
+            else:
+                if not Engine_Frontier.put(self, url, depth, priority):
+                    self.add_pending(-1)
+                continue
+
+            if self.stop.is_set() or self.pending.value <= 0:
+                self.stop.set()
+                self.frontier.close()
+                return
+
+    def feed_sitemaps(self):
+        # the sitemaps are read by the parent process
+        pass
+
+    def put(self, url, depth, priority=0):
+        """Queue the url locally or send it to the process of its host"""
+        try:
+            owner = self.ring.node(self.spider.get_tld(url))
+        except Exception:
+            logging.exception("Unable to shard url, %s" % url)
+            return False
+
+        if owner == self.shard:
+            self.add_pending(1)
+            if not super(Engine_Shard, self).put(url, depth, priority):
+                self.add_pending(-1)
+                return False
+            return True
+
+        # the urls of other shards are sent once, the queued cache holds
+        # either local or sent urls since every host has a single owner
+        with self.lock:
+            if not self.queued.add(self.spider.url_key(url)):
+                return False
+        self.add_pending(1)
+        self.inboxes[owner].put((url, depth, priority))
+        return True
+
+    def visit(self, url, depth):
+        try:
+            return super(Engine_Shard, self).visit(url, depth)
+        finally:
+            if self.stop.is_set() or self.frontier.closed:
+                self.stop.set()
+            self.add_pending(-1)
+
+
+class Engine_Processes(Engine):
+    """Forks processes each crawling a shard of the hosts. The number of
+    processes is set by the processes attribute of the spider, the number of
+    cpus by default.
+
+    :Parameters:
+        `spider` : Spider
+            The spider to drive.
+    """
+
+    def __init__(self, spider):
+        super(Engine_Processes, self).__init__(spider)
+        self.processes = spider.processes or multiprocessing.cpu_count()
+
+        try:
+            self.context = multiprocessing.get_context("fork")
+        except AttributeError:
+            # py27, forks on unix
+            self.context = multiprocessing
+        except ValueError:
+            raise ValueError("processes engine requires the fork start method")
+
+    def run(self):
+        spider = self.spider
+        context = self.context
+
+        ring = HashRing(range(self.processes))
+        inboxes = [context.Queue() for _ in range(self.processes)]
+        pending = context.Value("l", 0)
+        stop = context.Event()
+        # bounded so that the processes wait while the items they export
+        # cannot be written
+        results = context.Queue(4 * self.processes)
+
+        spider.shared_count = context.Value("l", spider.total_url_count)
+
+        for url, depth in spider.seeds():
+            with pending.get_lock():
+                pending.value += 1
+            inboxes[ring.node(spider.get_tld(url))].put(
+                (url, depth, spider.score(url, depth)))
+
+        workers = [context.Process(target=self.work,
+                                   args=(i, ring, inboxes, pending, stop,
+                                         results),
+                                   name="arackpy-shard-%s" % i)
+                   for i in range(self.processes)]
+        # held while the sitemaps are read so that the crawl is not over
+        if spider.sitemaps is not None:
+            with pending.get_lock():
+                pending.value += 1
+
+        for worker in workers:
+            worker.start()
+
+        try:
+            if spider.sitemaps is not None:
+                self.feed(ring, inboxes, pending, stop)
+            self.collect(workers, results)
+            for worker in workers:
+                worker.join()
+        finally:
+            stop.set()
+            for worker in workers:
+                worker.join(5)
+                if worker.is_alive():
+                    worker.terminate()
+            for queue in inboxes + [results]:
+                queue.cancel_join_thread()
+                queue.close()
+
+        spider.total_url_count = spider.shared_count.value
+        if spider.total_url_count > spider.max_urls:
+            logging.info("Reached total read url count %s" %
+                         spider.total_url_count)
+
+    def feed(self, ring, inboxes, pending, stop):
+        """Send the urls of the sitemaps to the processes of their hosts
+        while they have room for them
+        """
+        spider = self.spider
+        limit = spider.max_urls_per_level * self.processes
+        try:
+            while not stop.is_set():
+                room = limit - pending.value
+                if room <= 0:
+                    time.sleep(Engine_Shard.poll_interval)
+                    continue
+
+                urls = spider.next_sitemap_urls(room)
+                for url, priority in urls:
+                    with pending.get_lock():
+                        pending.value += 1
+                    inboxes[ring.node(spider.get_tld(url))].put(
+                        (url, 0, priority))
+
+                if spider.sitemaps.exhausted:
+                    break
+        finally:
+            with pending.get_lock():
+                pending.value -= 1
+
+    def collect(self, workers, results):
+        """Export the items sent by the processes and add their metrics to
+        those of the spider, read while they run so that none blocks on a
+        full pipe.
+        """
+        received = 0
+        while received < len(workers):
+            try:
+                kind, exported = results.get(timeout=0.5)
+            except Empty:
+                if not any(worker.is_alive() for worker in workers):
+                    break
+                continue
+
+            if kind == "items":
+                for item in exported:
+                    self.spider.export(item)
+                continue
+
+            received += 1
+            try:
+                self.spider.metrics.merge(exported)
+            except Exception:
+                logging.exception("Unable to merge process metrics")
+
+    def work(self, shard, ring, inboxes, pending, stop, results):
+        """Crawl the shard, runs in the child process"""
+        spider = self.spider
+
+        # only count the work of this process
+        spider.metrics.reset()
+
+        # the items are sent to the parent process, which writes them
+        if spider.items is not None:
+            spider.items = ItemPipeline(QueueWriter(results),
+                                        spider.export_queue_size,
+                                        spider.export_batch_size,
+                                        spider.export_flush_interval).start()
+        try:
+            Engine_Shard(spider, shard, ring, inboxes, pending, stop).run()
+        except Exception:
+            logging.exception("Shard %s failed" % shard)
+            stop.set()
+        finally:
+            spider.pool.close()
+            for inbox in inboxes:
+                inbox.cancel_join_thread()
+            if spider.items is not None:
+                spider.items.close()
+            results.put(("metrics", spider.metrics.export()))
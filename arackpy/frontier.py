@@ -0,0 +1,402 @@
+"""The url frontiers used by the engines.
+
+The level queues of the threads engine hold a bounded number of urls in
+memory and spill the rest, in order, to an append-only file on disk, so that
+no discovered url is dropped however large a level grows. Urls are queued with
+a priority, one such queue per distinct priority up to a fixed number of them,
+and the urls of the highest priority are read first.
+
+For the frontier engine, urls are queued per politeness key, e.g. the host
+name, and a min heap orders the keys by the next time they are allowed to be
+read. Reader threads get the highest priority url among the keys that are
+ready, read it and hand the key back with the delay to respect before its
+next url. A key is never handed to two threads at the same time, so the urls
+of each host are read sequentially while idle threads move on to other hosts.
+"""
+
+from __future__ import absolute_import
+
+from collections import deque
+import heapq
+import itertools
+import json
+import tempfile
+import threading
+import time
+
+try:
+    from Queue import Empty
+except ImportError:
+    from queue import Empty
+
+
+class SpillQueue(object):
+    """A thread safe fifo url queue that spills to disk.
+
+    Up to maxsize urls are kept in memory. Once full, urls are appended to a
+    temporary file and read back, maxsize at a time, when the urls in memory
+    are consumed. Putting a url never blocks. The file is emptied whenever
+    the queue is, and deleted when the queue is closed or garbage collected.
+
+    :Parameters:
+        `maxsize` : int
+            The maximum number of urls held in memory.
+
+        `path` : str
+            The directory of the spill file, the system temporary directory
+            by default.
+    """
+
+    def __init__(self, maxsize, path=None):
+        assert maxsize > 0
+
+        self.maxsize = maxsize
+        self.path = path
+
+        self.hot = deque()
+        self.lock = threading.Lock()
+
+        # spill file, created on the first overflow, and the offset of the
+        # next url to read back
+        self.file = None
+        self.offset = 0
+        self.spilled = 0
+        self.total_spilled = 0
+
+    def __len__(self):
+        return self.qsize()
+
+    def qsize(self):
+        with self.lock:
+            return len(self.hot) + self.spilled
+
+    def empty(self):
+        with self.lock:
+            return not self.hot and not self.spilled
+
+    def put(self, url, spill=False):
+        """Queue the url, in memory unless full or spill is True"""
+        with self.lock:
+            # once spilling, urls go to disk until read back to keep the order
+            if not (spill or self.spilled) and len(self.hot) < self.maxsize:
+                self.hot.append(url)
+                return
+
+            if self.file is None:
+                self.file = tempfile.TemporaryFile(dir=self.path)
+            self.file.seek(0, 2)
+            self.file.write(url.encode("utf-8").replace(b"\n", b"") + b"\n")
+            self.spilled += 1
+            self.total_spilled += 1
+
+    put_nowait = put
+
+    def get(self, load=None):
+        """Return the next url or raise Empty. Up to load spilled urls,
+        maxsize by default, are read back into memory when it is empty.
+        """
+        with self.lock:
+            if not self.hot and self.spilled:
+                self.load(load or self.maxsize)
+            try:
+                return self.hot.popleft()
+            except IndexError:
+                raise Empty
+
+    get_nowait = get
+
+    def load(self, n):
+        """Read the next n spilled urls back into memory"""
+        self.file.seek(self.offset)
+        for _ in range(min(n, self.spilled)):
+            self.hot.append(self.file.readline()[:-1].decode("utf-8"))
+            self.spilled -= 1
+        self.offset = self.file.tell()
+
+        if not self.spilled:
+            self.file.seek(0)
+            self.file.truncate()
+            self.offset = 0
+
+    def close(self):
+        with self.lock:
+            self.hot.clear()
+            self.spilled = 0
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+class PrioritySpillQueue(object):
+    """A thread safe url queue returning the urls of the highest priority
+    first and in fifo order within a priority.
+
+    Every distinct priority is a bucket, a SpillQueue with a spill file of
+    its own, up to max_buckets of them. The urls of any other priority share
+    the bucket of the nearest priority, so priorities are meant to take a few
+    distinct values, e.g. small integers. Up to maxsize urls are held in
+    memory across all the buckets and the rest is spilled. Putting a url
+    never blocks.
+
+    :Parameters:
+        `maxsize` : int
+            The maximum number of urls held in memory.
+
+        `path` : str
+            The directory of the spill files, the system temporary directory
+            by default.
+
+        `max_buckets` : int
+            The maximum number of distinct priorities.
+    """
+
+    def __init__(self, maxsize, path=None, max_buckets=32):
+        assert maxsize > 0 and max_buckets > 0
+
+        self.maxsize = maxsize
+        self.path = path
+        self.max_buckets = max_buckets
+
+        # priority -> SpillQueue and a max heap of the bucket priorities
+        self.buckets = {}
+        self.priorities = []
+        self.lock = threading.Lock()
+
+        # queued urls and urls held in memory
+        self.size = 0
+        self.hot = 0
+        self.closed_spilled = 0
+
+    def __len__(self):
+        return self.qsize()
+
+    def qsize(self):
+        with self.lock:
+            return self.size
+
+    def empty(self):
+        with self.lock:
+            return not self.size
+
+    @property
+    def total_spilled(self):
+        with self.lock:
+            return self.closed_spilled + sum(bucket.total_spilled for bucket
+                                             in self.buckets.values())
+
+    def bucket(self, priority):
+        """Return the bucket of the priority, created unless there are
+        max_buckets already, then the bucket of the nearest priority
+        """
+        try:
+            return self.buckets[priority]
+        except KeyError:
+            pass
+
+        if len(self.buckets) >= self.max_buckets:
+            nearest = min(self.buckets, key=lambda p: abs(p - priority))
+            return self.buckets[nearest]
+
+        bucket = self.buckets[priority] = SpillQueue(self.maxsize, self.path)
+        heapq.heappush(self.priorities, -priority)
+        return bucket
+
+    def put(self, url, priority=0):
+        with self.lock:
+            bucket = self.bucket(priority)
+            before = len(bucket.hot)
+            bucket.put(url, spill=self.hot >= self.maxsize)
+            self.hot += len(bucket.hot) - before
+            self.size += 1
+
+    put_nowait = put
+
+    def get(self):
+        """Return the next url of the highest priority or raise Empty"""
+        with self.lock:
+            if not self.priorities:
+                raise Empty
+
+            priority = -self.priorities[0]
+            bucket = self.buckets[priority]
+
+            # read back as many spilled urls as there is room for
+            before = len(bucket.hot)
+            url = bucket.get(max(1, self.maxsize - self.hot))
+            self.hot += len(bucket.hot) - before
+            self.size -= 1
+
+            if bucket.empty():
+                # drop the bucket and its spill file
+                heapq.heappop(self.priorities)
+                del self.buckets[priority]
+                self.closed_spilled += bucket.total_spilled
+                bucket.close()
+
+            return url
+
+    get_nowait = get
+
+    def close(self):
+        with self.lock:
+            for bucket in self.buckets.values():
+                self.closed_spilled += bucket.total_spilled
+                bucket.close()
+            self.buckets.clear()
+            self.priorities = []
+            self.size = 0
+            self.hot = 0
+
+
+class DepthSpillQueue(PrioritySpillQueue):
+    """A PrioritySpillQueue of urls along with their depth and priority,
+    holding the urls of the frontier and asyncio engines queued beyond
+    max_urls_per_level.
+    """
+
+    def put(self, url, depth, priority=0):
+        item = "%s %s %s" % (depth, json.dumps(priority), url)
+        super(DepthSpillQueue, self).put(item, priority)
+
+    def get(self):
+        """Return the next (url, depth, priority) of the highest priority or
+        raise Empty
+        """
+        item = super(DepthSpillQueue, self).get()
+        depth, priority, url = item.split(" ", 2)
+        return url, int(depth), json.loads(priority)
+
+
+class HostFrontier(object):
+    """Per key url queues scheduled by the next allowed read time.
+
+    Each url is queued with its depth, i.e. the number of links followed from
+    a start url, so that max_levels can be honored without levels, and a
+    priority. The urls of a key are read by decreasing priority and among the
+    keys ready to be read, the key of the highest priority url goes first.
+
+    :Parameters:
+        `persistent` : bool
+            If set to True, get waits for new urls when the frontier is
+            exhausted, until it is closed, for frontiers fed from outside the
+            reader threads.
+    """
+
+    def __init__(self, persistent=False):
+        self.persistent = persistent
+
+        # key -> heap of (-priority, sequence, url, depth)
+        self.queues = {}
+        self.sequence = itertools.count()
+
+        # keys with queued urls and not being read, (ready time, key) for the
+        # keys waiting for their delay and (-priority, sequence, key) for the
+        # keys ready, ordered by the priority of their best url
+        self.waiting = []
+        self.ready = []
+        self.ready_priority = {}
+        self.scheduled = set()
+
+        # keys being read and the earliest next read time of every key
+        self.busy = set()
+        self.next_time = {}
+
+        self.size = 0
+        self.closed = False
+        self.cond = threading.Condition(threading.Lock())
+
+    def __len__(self):
+        return self.size
+
+    def _schedule(self, key):
+        ready = self.next_time.get(key, 0)
+        if ready <= time.time():
+            self._ready(key)
+        else:
+            heapq.heappush(self.waiting, (ready, key))
+        self.scheduled.add(key)
+        self.cond.notify()
+
+    def _ready(self, key):
+        priority = self.queues[key][0][0]
+        self.ready_priority[key] = priority
+        heapq.heappush(self.ready, (priority, next(self.sequence), key))
+
+    def put(self, key, url, depth, priority=0):
+        """Queue the url under the key"""
+        with self.cond:
+            item = (-priority, next(self.sequence), url, depth)
+            heapq.heappush(self.queues.setdefault(key, []), item)
+            self.size += 1
+
+            if key not in self.busy and key not in self.scheduled:
+                self._schedule(key)
+            elif -priority < self.ready_priority.get(key, -priority):
+                # the ready key has a better url, the old entry is skipped
+                self._ready(key)
+                self.cond.notify()
+
+    def get(self):
+        """Block until a key is ready and return (key, url, depth). The key is
+        busy until done is called.
+
+        Return None when the frontier is closed or exhausted, i.e. there are no
+        queued urls and no busy keys left to produce new ones.
+        """
+        with self.cond:
+            while True:
+                if self.closed:
+                    return None
+
+                now = time.time()
+                while self.waiting and self.waiting[0][0] <= now:
+                    self._ready(heapq.heappop(self.waiting)[1])
+
+                while self.ready:
+                    priority, _, key = heapq.heappop(self.ready)
+                    if self.ready_priority.get(key) != priority:
+                        continue    # outdated entry
+
+                    del self.ready_priority[key]
+                    self.scheduled.discard(key)
+                    self.busy.add(key)
+                    self.size -= 1
+                    _, _, url, depth = heapq.heappop(self.queues[key])
+                    return key, url, depth
+
+                if self.waiting:
+                    # an earlier key may be put in the meantime
+                    self.cond.wait(self.waiting[0][0] - now)
+
+                elif not self.busy and not self.persistent:
+                    # wake the other waiting threads so they return too
+                    self.cond.notify_all()
+                    return None
+
+                else:
+                    self.cond.wait(1)
+
+    def done(self, key, delay=0):
+        """Release the key, its next url is ready after delay seconds"""
+        with self.cond:
+            self.busy.discard(key)
+            self.next_time[key] = time.time() + delay
+
+            if self.queues[key]:
+                self._schedule(key)
+            else:
+                del self.queues[key]
+
+            # forget the read times of idle keys once they have passed
+            if len(self.next_time) > 2 * len(self.queues) + 1000:
+                now = time.time()
+                self.next_time = dict((k, t) for k, t in
+                                      self.next_time.items() if t > now)
+
+            self.cond.notify_all()
+
+    def close(self):
+        """Stop handing out urls, all waiting threads return None"""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
@@ -0,0 +1,208 @@
+"""An on-disk http cache for recrawls.
+
+Each read url is stored in its own file, named by the fingerprint of the url,
+together with its ETag and Last-Modified validators and a digest of the html.
+The next crawl sends the validators back with the request and a 304 Not
+Modified response is served from the file, so the html of unchanged pages is
+not transferred again.
+
+The total size of the files is capped. The least recently used files, ordered
+by modification time which is updated on every hit, are removed first so the
+order survives restarts without an index file.
+"""
+
+from __future__ import absolute_import
+
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from arackpy.utils import fingerprint, write_file
+
+
+class CacheEntry(object):
+    """The cached validators and html of an url.
+
+    :Parameters:
+        `url` : str
+            The url read.
+
+        `etag` : str
+            The ETag response header or None.
+
+        `last_modified` : str
+            The Last-Modified response header or None.
+
+        `digest` : str
+            The sha1 hex digest of the html.
+
+        `html` : str
+            The html, only stored when the response has validators.
+    """
+
+    def __init__(self, url, etag=None, last_modified=None, digest=None,
+                 html=""):
+        self.url = url
+        self.etag = etag
+        self.last_modified = last_modified
+        self.digest = digest
+        self.html = html
+
+    @property
+    def validators(self):
+        """The conditional request headers"""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def to_bytes(self):
+        meta = {"url": self.url, "etag": self.etag,
+                "last_modified": self.last_modified, "digest": self.digest}
+        return (json.dumps(meta).encode("utf-8") + b"\n" +
+                self.html.encode("utf-8"))
+
+    @classmethod
+    def from_bytes(cls, data):
+        meta, _, html = data.partition(b"\n")
+        return cls(html=html.decode("utf-8"),
+                   **dict((str(k), v) for k, v in
+                          json.loads(meta.decode("utf-8")).items()))
+
+
+def digest(html):
+    return hashlib.sha1(html.encode("utf-8")).hexdigest()
+
+
+class HttpCache(object):
+    """Thread safe on-disk cache of validators and html.
+
+    :Parameters:
+        `path` : str
+            The cache directory, created if it does not exist.
+
+        `maxsize` : int
+            The maximum total size of the cached files in bytes.
+    """
+
+    def __init__(self, path, maxsize=100 * 2 ** 20):
+        self.path = path
+        self.maxsize = maxsize
+
+        # file name -> file size, least recently used first
+        self.files = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self.load()
+
+    def __len__(self):
+        return len(self.files)
+
+    def load(self):
+        """Index the files of the cache directory by modification time"""
+        files = []
+        for name in os.listdir(self.path):
+            if name.endswith(".tmp"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.path, name))
+            except OSError:
+                continue
+            files.append((stat.st_mtime, name, stat.st_size))
+
+        with self.lock:
+            for _, name, size in sorted(files):
+                self.files[name] = size
+                self.size += size
+        self.evict()
+
+    def filename(self, url):
+        return "%032x" % fingerprint(url, 128)
+
+    def get(self, url):
+        """Return the CacheEntry of the url or None"""
+        name = self.filename(url)
+        path = os.path.join(self.path, name)
+        with self.lock:
+            if name not in self.files:
+                self.misses += 1
+                return None
+            self.files[name] = self.files.pop(name)    # most recently used
+
+        try:
+            with open(path, "rb") as f:
+                entry = CacheEntry.from_bytes(f.read())
+            os.utime(path, None)
+        except (IOError, OSError, ValueError, TypeError):
+            logging.warning("Unable to read cached url, %s" % url)
+            self.remove(name)
+            return None
+
+        # fingerprint collision
+        if entry.url != url:
+            with self.lock:
+                self.misses += 1
+            return None
+
+        with self.lock:
+            self.hits += 1
+        return entry
+
+    def put(self, entry):
+        """Store the entry, replacing the previous one of the same url"""
+        name = self.filename(entry.url)
+        path = os.path.join(self.path, name)
+        data = entry.to_bytes()
+
+        tmp_path = "%s.%s.tmp" % (path, threading.current_thread().ident)
+        try:
+            write_file(path, data, tmp_path)
+        except (IOError, OSError):
+            logging.exception("Unable to cache url, %s" % entry.url)
+            return
+
+        with self.lock:
+            self.size -= self.files.pop(name, 0)
+            self.files[name] = len(data)
+            self.size += len(data)
+        self.evict()
+
+    def remove(self, name):
+        with self.lock:
+            self.size -= self.files.pop(name, 0)
+        try:
+            os.remove(os.path.join(self.path, name))
+        except OSError:
+            pass
+
+    def evict(self):
+        """Remove the least recently used files until the cache fits"""
+        while True:
+            with self.lock:
+                if self.size <= self.maxsize or not self.files:
+                    return
+                name, size = self.files.popitem(last=False)
+                self.size -= size
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                pass
+
+    def stats(self):
+        """Return the cache hit and miss counts, the number of files and their
+        total size in bytes
+        """
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "size": len(self.files), "bytes": self.size}
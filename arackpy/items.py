@@ -0,0 +1,367 @@
+"""Export the items scraped by the parse method.
+
+The items yielded by parse, or passed to Spider.export, are put in a bounded
+queue and written by a single background thread, so that the reader threads
+never wait for the disk nor for each other. The writer thread takes the items
+in batches and writes each batch at once, one sqlite transaction per batch,
+and flushes the file every flush interval so that the output can be followed
+while the spider crawls. The reader threads only wait when the queue is full,
+i.e. when the items are produced faster than they can be written.
+
+The items are written as json lines, csv rows or sqlite rows, chosen by the
+extension of the output path, .jsonl, .csv or .db, .sqlite and .sqlite3.
+Json lines and csv files are gzip compressed if the path ends with .gz, e.g.
+items.jsonl.gz.
+"""
+
+from __future__ import absolute_import
+
+import csv
+import gzip
+import io
+import json
+import logging
+import sqlite3
+import sys
+import threading
+import time
+
+try:
+    from Queue import Queue, Empty
+except ImportError:
+    from queue import Queue, Empty
+
+
+FORMATS = {".jsonl": "jsonl", ".csv": "csv",
+           ".db": "sqlite", ".sqlite": "sqlite", ".sqlite3": "sqlite"}
+
+
+def is_url(value):
+    """Return True for the values of a parse generator that are urls to
+    follow, an url or an (url, priority) pair, rather than items
+    """
+    try:
+        string_types = (str, unicode)
+    except NameError:
+        # py3
+        string_types = (str,)
+
+    if isinstance(value, string_types):
+        return True
+    return (isinstance(value, tuple) and len(value) == 2 and
+            isinstance(value[0], string_types) and
+            isinstance(value[1], (int, float)))
+
+
+def open_output(path):
+    """Open the file for writing bytes, gzip compressed if the path ends with
+    .gz
+    """
+    if path.endswith(".gz"):
+        return gzip.GzipFile(path, "wb")
+    return open(path, "wb")
+
+
+def fields_of(item):
+    """Return the field names of an item, the keys of a dict"""
+    try:
+        return list(item.keys())
+    except AttributeError:
+        raise ValueError("items must be dicts, not %s" % type(item).__name__)
+
+
+class JsonLinesWriter(object):
+    """Writes every item as a json object on a line of its own.
+
+    :Parameters:
+        `path` : str
+            The output file, gzip compressed if it ends with .gz.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.f = open_output(path)
+
+    def write(self, items):
+        lines = [json.dumps(item, ensure_ascii=False, default=str)
+                 for item in items]
+        self.f.write(("\n".join(lines) + "\n").encode("utf-8"))
+
+    def flush(self):
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+class CsvWriter(object):
+    """Writes the items as rows of a csv file with a header.
+
+    :Parameters:
+        `path` : str
+            The output file, gzip compressed if it ends with .gz.
+
+        `fields` : list
+            The columns, the keys of the first item by default. Other keys
+            are ignored.
+    """
+
+    def __init__(self, path, fields=None):
+        self.path = path
+        self.fields = fields
+        self.raw = open_output(path)
+        if sys.version_info[0] < 3:
+            # the csv module of py27 writes bytes
+            self.f = self.raw
+        else:
+            self.f = io.TextIOWrapper(self.raw, encoding="utf-8", newline="")
+        self.writer = None
+
+    def write(self, items):
+        if self.writer is None:
+            if self.fields is None:
+                self.fields = fields_of(items[0])
+            self.writer = csv.DictWriter(self.f, self.fields,
+                                         extrasaction="ignore")
+            self.writer.writeheader()
+        self.writer.writerows(items)
+
+    def flush(self):
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+class SqliteWriter(object):
+    """Inserts the items as rows of a sqlite table, one transaction per
+    batch. The table is created if it does not exist. Values that are not
+    numbers or strings are stored as json.
+
+    :Parameters:
+        `path` : str
+            The database file.
+
+        `table` : str
+            The table name.
+
+        `fields` : list
+            The columns, the keys of the first item by default. Other keys
+            are ignored.
+    """
+
+    def __init__(self, path, table="items", fields=None):
+        self.path = path
+        self.table = table
+        self.fields = fields
+
+        # opened by the writer thread, connections are bound to a thread
+        self.conn = None
+        self.insert = None
+
+    def quote(self, name):
+        return '"%s"' % name.replace('"', '""')
+
+    def open(self, item):
+        if self.fields is None:
+            self.fields = fields_of(item)
+
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+
+        columns = ", ".join(self.quote(field) for field in self.fields)
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS %s (%s)" %
+                              (self.quote(self.table), columns))
+        self.insert = "INSERT INTO %s (%s) VALUES (%s)" % (
+            self.quote(self.table), columns,
+            ", ".join("?" for _ in self.fields))
+
+    def value(self, value):
+        if value is None or isinstance(value, (int, float, bytes)):
+            return value
+        try:
+            if isinstance(value, unicode):
+                return value
+        except NameError:
+            # py3
+            if isinstance(value, str):
+                return value
+        return json.dumps(value, ensure_ascii=False, default=str)
+
+    def write(self, items):
+        if self.conn is None:
+            self.open(items[0])
+
+        rows = [[self.value(item.get(field)) for field in self.fields]
+                for item in items]
+        with self.conn:
+            self.conn.executemany(self.insert, rows)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def open_writer(path, format=None, fields=None, table="items"):
+    """Return the writer of the format, by default guessed from the extension
+    of the path, ignoring .gz
+    """
+    if format is None:
+        name = path[:-3] if path.endswith(".gz") else path
+        for extension, name_format in FORMATS.items():
+            if name.endswith(extension):
+                format = name_format
+                break
+        else:
+            raise ValueError("Unknown export format of %s" % path)
+
+    if format == "jsonl":
+        return JsonLinesWriter(path)
+    elif format == "csv":
+        return CsvWriter(path, fields)
+    elif format == "sqlite":
+        if path.endswith(".gz"):
+            raise ValueError("sqlite exports cannot be compressed")
+        return SqliteWriter(path, table, fields)
+    raise ValueError("Unknown export format %s" % format)
+
+
+class ItemPipeline(object):
+    """A bounded queue of items written in batches by a background thread.
+
+    :Parameters:
+        `writer` : object
+            Writes the batches, e.g. a JsonLinesWriter, see open_writer.
+
+        `maxsize` : int
+            The maximum number of queued items, put blocks once reached.
+
+        `batch_size` : int
+            The maximum number of items written at once.
+
+        `flush_interval` : float
+            Time in seconds after which the queued items are written even if
+            the batch is not full, and the output is flushed.
+
+        `metrics` : Metrics
+            If set, the exported items are counted.
+    """
+
+    def __init__(self, writer, maxsize=10000, batch_size=1000,
+                 flush_interval=1.0, metrics=None):
+        self.writer = writer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.metrics = metrics
+
+        self.queue = Queue(maxsize)
+        self.thread = None
+
+        # items written and items lost to write errors
+        self.written = 0
+        self.dropped = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run,
+                                       name="arackpy-item-writer")
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def put(self, item):
+        """Queue an item, waiting while the queue is full"""
+        self.queue.put(item)
+
+    def run(self):
+        batch = []
+        flush_at = time.time() + self.flush_interval
+        stopping = False
+        while not stopping:
+            try:
+                item = self.queue.get(timeout=max(flush_at - time.time(), 0))
+                if item is None:
+                    stopping = True
+                else:
+                    batch.append(item)
+                    # take the other queued items without waiting
+                    while len(batch) < self.batch_size:
+                        item = self.queue.get_nowait()
+                        if item is None:
+                            stopping = True
+                            break
+                        batch.append(item)
+            except Empty:
+                pass
+
+            if batch and (len(batch) >= self.batch_size or stopping or
+                          time.time() >= flush_at):
+                self.write(batch)
+                batch = []
+
+            if stopping or time.time() >= flush_at:
+                self.flush()
+                flush_at = time.time() + self.flush_interval
+
+    def write(self, batch):
+        try:
+            self.writer.write(batch)
+            self.written += len(batch)
+            if self.metrics is not None:
+                self.metrics.count("exported_items_total", len(batch))
+        except Exception:
+            logging.exception("Unable to export %s items" % len(batch))
+            self.dropped += len(batch)
+
+    def flush(self):
+        try:
+            self.writer.flush()
+        except Exception:
+            logging.exception("Unable to flush the exported items")
+
+    def close(self):
+        """Write the queued items and close the writer"""
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+        self.writer.close()
+
+
+class QueueWriter(object):
+    """Sends the batches of items to another process through a queue, used
+    by the processes of the processes engine.
+
+    :Parameters:
+        `queue` : multiprocessing.Queue
+            The queue, batches are sent as ("items", batch).
+    """
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def write(self, items):
+        self.queue.put(("items", list(items)))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class ItemList(object):
+    """Collects the items in a list, used by the parse pool processes to
+    return the items with the urls to follow
+    """
+
+    def __init__(self):
+        self.items = []
+
+    def put(self, item):
+        self.items.append(item)
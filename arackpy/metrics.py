@@ -0,0 +1,373 @@
+"""Crawl metrics and a Prometheus text exporter.
+
+The spider records the time spent in every stage of a url, the downloaded
+bytes, the response status codes, the latency of every host and the urls it
+drops, see METRICS. Recording only updates counters private to the calling
+thread, without any lock, so metrics are always on. The counters of all the
+threads are merged when they are read, by Spider.stats or the http exporter.
+
+Gauges, e.g. the number of queued urls, are functions called when the metrics
+are read.
+
+Histograms count observations in fixed buckets, like Prometheus histograms,
+and quantiles such as the p99 latency are estimated from the buckets.
+"""
+
+from __future__ import absolute_import, division
+
+import bisect
+import logging
+import threading
+import time
+
+try:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+
+
+# upper bounds of the histogram buckets in seconds, the last one is +Inf
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+           5.0, 10.0, 30.0)
+
+# name -> (type, label name, help)
+METRICS = {
+    "stage_seconds":
+        ("histogram", "stage", "Time spent in each stage of the crawl, dns, "
+         "robots, fetch, decode, extract, parse and enqueue"),
+    "host_fetch_seconds":
+        ("histogram", "host", "Time taken to read an url per host"),
+    "responses_total":
+        ("counter", "code", "Responses per http status code"),
+    "downloaded_bytes_total":
+        ("counter", None, "Bytes downloaded, before decompression"),
+    "sitemap_urls_total":
+        ("counter", None, "Urls queued from sitemaps"),
+    "dropped_urls_total":
+        ("counter", "reason", "Urls not read per reason, visited, external, "
+         "duplicate, robots or unresolved"),
+    "proxy_requests_total":
+        ("counter", "result", "Urls read through a proxy, success or failure"),
+    "proxy_sessions_total":
+        ("counter", "reuse", "Requests of the proxy and tor backends made "
+         "on a new or a reused session"),
+    "proxy_connections_total":
+        ("counter", "reuse", "Requests of the proxy and tor backends made "
+         "on a new or a reused connection"),
+    "tor_circuit_renewals_total":
+        ("counter", "method", "Degraded tor circuits replaced, by isolation "
+         "or newnym"),
+    "exported_items_total":
+        ("counter", None, "Items written by the export pipeline"),
+    "read_urls":
+        ("gauge", None, "Urls read"),
+    "level":
+        ("gauge", None, "Current level or deepest depth read"),
+    "frontier_depth":
+        ("gauge", None, "Urls queued and not read yet"),
+    "spilled_urls":
+        ("gauge", None, "Urls spilled to disk by the url queues"),
+    "visited_urls":
+        ("gauge", None, "Urls in the visited cache"),
+    "dns_cache_hits":
+        ("gauge", None, "Host names found in the dns cache"),
+    "dns_cache_misses":
+        ("gauge", None, "Host names resolved"),
+    "robots_cache_size":
+        ("gauge", None, "Robots.txt files cached"),
+    "http_cache_hits":
+        ("gauge", None, "Pages found in the http cache"),
+    "http_cache_misses":
+        ("gauge", None, "Pages not found in the http cache"),
+    "proxies":
+        ("gauge", None, "Usable proxies of the proxy pool"),
+    }
+
+PREFIX = "arackpy_"
+
+
+def quantile(buckets, count, q):
+    """Estimate the q quantile, 0 <= q <= 1, from the per bucket counts of a
+    histogram, interpolating linearly within the bucket.
+    """
+    if not count:
+        return None
+
+    rank = q * count
+    cumulative = 0
+    for i, n in enumerate(buckets):
+        if n and cumulative + n >= rank:
+            lower = BUCKETS[i - 1] if i else 0.0
+            if i == len(BUCKETS):
+                return lower    # +Inf bucket
+            return lower + (BUCKETS[i] - lower) * (rank - cumulative) / n
+        cumulative += n
+    return BUCKETS[-1]
+
+
+class Timer(object):
+    """Context manager recording the time spent in a stage"""
+
+    __slots__ = ("metrics", "stage", "start")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe("stage_seconds", time.time() - self.start,
+                             self.stage)
+
+
+class Metrics(object):
+    """Counters and histograms recorded per thread and merged on read.
+
+    Every metric has an optional label, e.g. the status code of the
+    responses_total counter.
+    """
+
+    def __init__(self):
+        self.gauges = {}
+        self.reset()
+
+    def reset(self):
+        """Forget all the recorded values, the gauges are kept"""
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+        # (counters, histograms) of every thread, kept once the thread ends
+        self.shards = []
+
+    def shard(self):
+        try:
+            return self.local.shard
+        except AttributeError:
+            shard = self.local.shard = ({}, {})
+            with self.lock:
+                self.shards.append(shard)
+            return shard
+
+    def count(self, name, value=1, label=None):
+        """Add the value to a counter"""
+        counters = self.shard()[0]
+        key = (name, label)
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name, value, label=None):
+        """Add an observation, e.g. a duration in seconds, to a histogram"""
+        histograms = self.shard()[1]
+        key = (name, label)
+        try:
+            histogram = histograms[key]
+        except KeyError:
+            histogram = histograms[key] = [[0] * (len(BUCKETS) + 1), 0.0]
+        histogram[0][bisect.bisect_left(BUCKETS, value)] += 1
+        histogram[1] += value
+
+    def time(self, stage):
+        """Return a context manager recording the time spent in the stage"""
+        return Timer(self, stage)
+
+    def gauge(self, name, function):
+        """Register a function returning the current value of a gauge,
+        replacing the previous one of the same name.
+        """
+        self.gauges[name] = function
+
+    def export(self):
+        """Return the recorded values of all the threads merged, as a pair of
+        dicts mapping (name, label) to counts and to histograms.
+        """
+        with self.lock:
+            shards = list(self.shards)
+
+        counters, histograms = {}, {}
+        for shard_counters, shard_histograms in shards:
+            for key, value in list(shard_counters.items()):
+                counters[key] = counters.get(key, 0) + value
+            for key, (buckets, total) in list(shard_histograms.items()):
+                try:
+                    histogram = histograms[key]
+                except KeyError:
+                    histograms[key] = [list(buckets), total]
+                    continue
+                histogram[0] = [a + b for a, b in zip(histogram[0], buckets)]
+                histogram[1] += total
+
+        return counters, histograms
+
+    def merge(self, exported):
+        """Add values exported by another Metrics, e.g. of a child process"""
+        counters, histograms = exported
+        for (name, label), value in counters.items():
+            self.count(name, value, label)
+
+        own = self.shard()[1]
+        for key, (buckets, total) in histograms.items():
+            histogram = own.setdefault(key, [[0] * (len(BUCKETS) + 1), 0.0])
+            histogram[0] = [a + b for a, b in zip(histogram[0], buckets)]
+            histogram[1] += total
+
+    def read_gauges(self):
+        values = {}
+        for name, function in list(self.gauges.items()):
+            try:
+                values[name] = function()
+            except Exception:
+                logging.exception("Unable to read gauge %s" % name)
+        return values
+
+    def snapshot(self):
+        """Return a dict of the current value of every metric.
+
+        Unlabelled counters and gauges map to their value and labelled ones
+        to a dict of the value per label. Histograms map to a dict with the
+        count, the sum and the estimated p50, p90 and p99 of the
+        observations, per label if labelled.
+        """
+        counters, histograms = self.export()
+
+        stats = {}
+        for (name, label), value in counters.items():
+            if label is None:
+                stats[name] = value
+            else:
+                stats.setdefault(name, {})[label] = value
+
+        for (name, label), (buckets, total) in histograms.items():
+            count = sum(buckets)
+            summary = {"count": count, "sum": total,
+                       "p50": quantile(buckets, count, 0.5),
+                       "p90": quantile(buckets, count, 0.9),
+                       "p99": quantile(buckets, count, 0.99),
+                       }
+            if label is None:
+                stats[name] = summary
+            else:
+                stats.setdefault(name, {})[label] = summary
+
+        stats.update(self.read_gauges())
+        return stats
+
+    def render(self):
+        """Return all the metrics in the Prometheus text exposition format"""
+        counters, histograms = self.export()
+
+        samples = {}    # name -> list of lines
+        for (name, label), value in counters.items():
+            samples.setdefault(name, []).append(
+                "%s%s%s %s" % (PREFIX, name, self.labels(name, label), value))
+
+        for (name, label), (buckets, total) in histograms.items():
+            lines = samples.setdefault(name, [])
+            cumulative = 0
+            for i, n in enumerate(buckets):
+                cumulative += n
+                le = repr(float(BUCKETS[i])) if i < len(BUCKETS) else "+Inf"
+                lines.append("%s%s_bucket%s %s" % (
+                    PREFIX, name, self.labels(name, label, le), cumulative))
+            lines.append("%s%s_sum%s %s" % (
+                PREFIX, name, self.labels(name, label), total))
+            lines.append("%s%s_count%s %s" % (
+                PREFIX, name, self.labels(name, label), cumulative))
+
+        for name, value in self.read_gauges().items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                samples.setdefault(name, []).append(
+                    "%s%s %s" % (PREFIX, name, value))
+
+        output = []
+        for name in sorted(samples):
+            kind, _, description = METRICS.get(name, ("untyped", None, ""))
+            if description:
+                output.append("# HELP %s%s %s" % (PREFIX, name, description))
+            output.append("# TYPE %s%s %s" % (PREFIX, name, kind))
+            output.extend(sorted(samples[name]))
+        return "\n".join(output) + "\n"
+
+    def labels(self, name, label, le=None):
+        pairs = []
+        if label is not None:
+            label_name = METRICS.get(name, (None, None))[1] or "label"
+            value = (str(label).replace("\\", "\\\\").replace("\"", "\\\"")
+                     .replace("\n", "\\n"))
+            pairs.append("%s=\"%s\"" % (label_name, value))
+        if le is not None:
+            pairs.append("le=\"%s\"" % le)
+        if not pairs:
+            return ""
+        return "{%s}" % ",".join(pairs)
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class MetricsServer(object):
+    """Serves the metrics in the Prometheus text format from a background
+    thread, at any path.
+
+    :Parameters:
+        `metrics` : Metrics
+            The metrics to serve.
+
+        `host` : str
+            The address to listen on.
+
+        `port` : int
+            The port to listen on, 0 for any free port, see the port
+            attribute once started.
+    """
+
+    def __init__(self, metrics, host="127.0.0.1", port=9100):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                try:
+                    body = metrics.render().encode("utf-8")
+                except Exception:
+                    logging.exception("Unable to render metrics")
+                    self.send_error(500)
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type",
+                                 "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logging.debug("metrics: " + format % args)
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self.server.server_address[1]
+
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       name="arackpy-metrics")
+        self.thread.daemon = True
+        self.thread.start()
+        logging.info("Serving metrics at http://%s:%s/metrics" %
+                     (self.host, self.port))
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.thread.join()
+            self.server = None
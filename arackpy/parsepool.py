@@ -0,0 +1,163 @@
+"""Parse urls in a pool of processes while the reader threads keep reading.
+
+A parse method doing cpu bound work, e.g. building a BeautifulSoup tree or
+counting words, holds the global interpreter lock and starves the reader
+threads. The parse pool runs the parse method and the url extraction of the
+backend in forked worker processes instead. Only the url, the html, the urls
+to follow and the exported items cross the process boundary.
+
+The number of parses submitted but not finished is bounded by a window. A
+reader thread submitting a parse while the window is full waits for a slot,
+so that the html of read urls does not pile up in memory when the processes
+cannot keep up.
+
+.. note::
+    The worker processes are forked, i.e. a unix platform is required, and
+    changes the parse method makes to the spider are not seen by the reader
+    threads. The pool must be created before the spider starts any thread,
+    and the parse method runs without the lock of thread_safe_parse and
+    without the parse timing of the metrics.
+"""
+
+from __future__ import absolute_import
+
+import logging
+import multiprocessing
+import threading
+
+from arackpy.items import ItemList
+
+try:
+    from concurrent.futures import ProcessPoolExecutor
+except ImportError:
+    # py27 without the futures package
+    ProcessPoolExecutor = None
+
+
+# spiders by id, inherited by the forked worker processes
+SPIDERS = {}
+
+
+def parse_links(spider_id, url, html, unchanged=False):
+    """Parse the html in a worker process and return the list of urls to
+    follow, relative to the url, and the list of items exported by parse.
+    """
+    spider = SPIDERS[spider_id]
+    parse = spider.unchanged if unchanged else spider.parse
+
+    # the items are exported by the parent process
+    items = spider.items = ItemList()
+
+    # not safe_parse, a lock held by a parent thread when the process was
+    # forked is never released in the process
+    try:
+        follow_links = spider.export_items(parse(url, html))
+    except Exception:
+        logging.exception("Unable to parse url, %s" % url)
+        return [], items.items
+
+    try:
+        if follow_links is None:
+            return list(spider.backend.urlparse(html)), items.items
+        elif follow_links is False:
+            return [], items.items
+        return list(follow_links), items.items
+    except Exception:
+        logging.exception("Unable to extract urls from url, %s" % url)
+        return [], items.items
+
+
+class ParsePool(object):
+    """A process pool running the parse method of the spider.
+
+    :Parameters:
+        `spider` : Spider
+            The spider whose parse method is run.
+
+        `processes` : int
+            The number of worker processes, the number of cpus by default.
+
+        `window` : int
+            The maximum number of parses submitted and not finished.
+    """
+
+    def __init__(self, spider, processes=None, window=100):
+        if ProcessPoolExecutor is None:
+            raise ValueError("parse pool requires concurrent.futures")
+
+        self.spider = spider
+        self.processes = processes or multiprocessing.cpu_count()
+        self.window = threading.BoundedSemaphore(window)
+
+        self.unfinished = 0
+        self.cond = threading.Condition(threading.Lock())
+
+        SPIDERS[id(spider)] = spider
+        try:
+            context = multiprocessing.get_context("fork")
+            self.executor = ProcessPoolExecutor(self.processes,
+                                                mp_context=context)
+        except (AttributeError, TypeError):
+            # before python 3.7, forks on unix
+            self.executor = ProcessPoolExecutor(self.processes)
+
+        # fork the worker processes now, before the spider starts threads
+        self.executor.submit(int).result()
+
+    def submit(self, url, html, unchanged=False, callback=None):
+        """Submit the parse of the html, waiting for a slot of the window,
+        and return a future of the list of urls to follow and the list of
+        items exported by parse. The items are exported by the spider and
+        the callback is called with the future once the parse is finished
+        and before join returns.
+        """
+        self.window.acquire()
+        with self.cond:
+            self.unfinished += 1
+
+        try:
+            future = self.executor.submit(parse_links, id(self.spider), url,
+                                          html, unchanged)
+        except Exception:
+            self.release(None)
+            raise
+
+        def done(future):
+            try:
+                if not future.exception():
+                    for item in future.result()[1]:
+                        self.spider.export(item)
+                if callback is not None:
+                    callback(future)
+            except Exception:
+                logging.exception("Unable to follow urls from url, %s" % url)
+            finally:
+                self.release(future)
+
+        future.add_done_callback(done)
+        return future
+
+    def release(self, future):
+        self.window.release()
+        with self.cond:
+            self.unfinished -= 1
+            if not self.unfinished:
+                self.cond.notify_all()
+
+    def parse(self, url, html, unchanged=False):
+        """Parse the html and wait for the list of urls to follow"""
+        try:
+            return self.submit(url, html, unchanged).result()[0]
+        except Exception:
+            logging.exception("Unable to parse url, %s" % url)
+            return []
+
+    def join(self):
+        """Wait until all the submitted parses are finished"""
+        with self.cond:
+            while self.unfinished:
+                self.cond.wait(1)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        SPIDERS.pop(id(self.spider), None)
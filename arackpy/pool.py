@@ -0,0 +1,90 @@
+"""A pool of long lived reader threads.
+
+The threads are started once, on the first submitted task, and are reused at
+every level. Completion is tracked by counting the unfinished tasks, so other
+threads running in the same process do not affect the spider.
+"""
+
+from __future__ import absolute_import
+
+import logging
+import threading
+
+try:
+    from Queue import Queue
+except ImportError:
+    from queue import Queue
+
+
+class WorkerPool(object):
+    """A fixed number of daemon threads executing tasks from a queue.
+
+    :Parameters:
+        `size` : int
+            The number of worker threads.
+
+        `name` : str
+            The prefix of the worker thread names.
+    """
+
+    def __init__(self, size, name="arackpy-worker"):
+        assert size > 0
+
+        self.size = size
+        self.name = name
+
+        self.tasks = Queue()
+        self.threads = []
+
+        # number of submitted tasks not yet completed
+        self.unfinished = 0
+        self.done = threading.Condition(threading.Lock())
+
+    def start(self):
+        """Start the worker threads, called by submit if required"""
+        while len(self.threads) < self.size:
+            thread = threading.Thread(target=self.work, name="%s-%s" %
+                                      (self.name, len(self.threads)))
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def submit(self, func, *args):
+        """Run func with args on the next available worker"""
+        if len(self.threads) < self.size:
+            self.start()
+
+        with self.done:
+            self.unfinished += 1
+
+        self.tasks.put((func, args))
+
+    def work(self):
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                break
+
+            func, args = task
+            try:
+                func(*args)
+            except Exception:
+                logging.exception("Unhandled exception in worker thread")
+            finally:
+                with self.done:
+                    self.unfinished -= 1
+                    if self.unfinished == 0:
+                        self.done.notify_all()
+
+    def join(self):
+        """Block until all the submitted tasks are completed"""
+        with self.done:
+            while self.unfinished:
+                # a timeout keeps the main thread responsive to Ctrl-c
+                self.done.wait(1)
+
+    def close(self):
+        """Stop the worker threads once the queued tasks are completed"""
+        for _ in self.threads:
+            self.tasks.put(None)
+        self.threads = []
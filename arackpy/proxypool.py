@@ -0,0 +1,332 @@
+"""A pool of proxies picked by health, used by the proxy and tor backends.
+
+Every proxy keeps its number of successes and failures and a moving average
+of its latency. Proxies are picked at random, weighted by their smoothed
+success rate divided by their latency, so that fast and dependable proxies
+read most of the urls while the others are still tried now and then.
+
+A failed proxy cools down before it is picked again, twice as long after each
+consecutive failure, and is evicted after max_failures consecutive failures.
+When fewer than min_proxies proxies are left, or every refresh_interval
+seconds, new candidates are requested from the source, e.g. a free proxy
+list, in a background thread. The candidates are validated concurrently by
+worker threads before they join the pool, so the crawl never stops while the
+pool is refilled.
+"""
+
+from __future__ import absolute_import, division
+
+import logging
+import random
+import threading
+import time
+
+from arackpy.pool import WorkerPool
+
+
+class ProxyError(Exception):
+    """No proxy is available to read an url"""
+    pass
+
+
+class ProxyStats(object):
+    """The health of a proxy"""
+
+    __slots__ = ("proxy", "successes", "failures", "consecutive_failures",
+                 "latency", "cooldown_until")
+
+    def __init__(self, proxy):
+        self.proxy = proxy
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.latency = None
+        self.cooldown_until = 0
+
+    @property
+    def success_rate(self):
+        """The success rate smoothed towards 1/2 for unused proxies"""
+        return (self.successes + 1) / (self.successes + self.failures + 2)
+
+    def weight(self, default_latency):
+        latency = self.latency if self.latency is not None else default_latency
+        return self.success_rate / max(latency, 0.01)
+
+    def to_dict(self):
+        return {"successes": self.successes, "failures": self.failures,
+                "consecutive_failures": self.consecutive_failures,
+                "success_rate": self.success_rate, "latency": self.latency,
+                "cooldown_until": self.cooldown_until}
+
+
+def weighted_choice(items, weights):
+    """Return an item picked at random with a probability proportional to its
+    weight, also for py27
+    """
+    point = random.uniform(0, sum(weights))
+    for item, weight in zip(items, weights):
+        point -= weight
+        if point <= 0:
+            return item
+    return items[-1]
+
+
+class ProxyPool(object):
+    """Thread safe pool of proxies scored by health.
+
+    :Parameters:
+        `proxies` : list
+            The initial proxies, e.g. host:port, trusted without validation.
+
+        `source` : function
+            Called without arguments to get an iterable of new candidate
+            proxies when the pool runs low. None if the pool is never
+            refilled.
+
+        `validator` : function
+            Called with a candidate proxy, returns True if the proxy works.
+            Candidates are accepted without validation if None.
+
+        `min_proxies` : int
+            The pool is refilled when fewer proxies are left.
+
+        `max_failures` : int
+            The number of consecutive failures after which a proxy is evicted.
+
+        `cooldown` : float
+            Time in seconds a proxy is not picked after a failure, doubled
+            after each consecutive failure.
+
+        `max_cooldown` : float
+            The longest cooldown.
+
+        `alpha` : float
+            The weight of the latest latency in the latency moving average.
+
+        `refresh_interval` : float
+            Time in seconds after which new candidates are requested from the
+            source even if the pool is not low, None to never refresh.
+
+        `validate_threads` : int
+            The number of threads validating candidates concurrently.
+    """
+
+    # seconds between two refills, so that a dead source is not hammered
+    min_refill_interval = 10
+
+    def __init__(self, proxies=None, source=None, validator=None,
+                 min_proxies=5, max_failures=3, cooldown=5, max_cooldown=300,
+                 alpha=0.3, refresh_interval=None, validate_threads=8):
+        self.source = source
+        self.validator = validator
+        self.min_proxies = min_proxies
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.alpha = alpha
+        self.refresh_interval = refresh_interval
+
+        # proxy -> ProxyStats of the usable proxies
+        self.proxies = {}
+        self.evicted = set()
+        self.validating = set()
+        self.refilling = False
+        self.last_refill = None
+
+        # time of the last refill, or since the proxies were given, used by
+        # the refresh interval
+        self.last_update = time.time()
+
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.validators = WorkerPool(validate_threads,
+                                     name="arackpy-proxy-validator")
+
+        self.add(proxies or [], validate=False)
+
+    def __len__(self):
+        with self.lock:
+            return len(self.proxies)
+
+    def stats(self):
+        """Return a dict mapping every usable proxy to its health"""
+        with self.lock:
+            return dict((proxy, stats.to_dict())
+                        for proxy, stats in self.proxies.items())
+
+    def health(self, proxy):
+        """Return the health of a usable proxy as a dict, None otherwise"""
+        with self.lock:
+            stats = self.proxies.get(proxy)
+            return None if stats is None else stats.to_dict()
+
+    def add(self, proxies, validate=True):
+        """Add new proxies to the pool, validated in the background first if
+        validate is set and there is a validator. Evicted proxies are skipped.
+        """
+        candidates = []
+        with self.lock:
+            for proxy in proxies:
+                if (proxy in self.proxies or proxy in self.evicted or
+                        proxy in self.validating):
+                    continue
+                if validate and self.validator is not None:
+                    self.validating.add(proxy)
+                    candidates.append(proxy)
+                else:
+                    self.proxies[proxy] = ProxyStats(proxy)
+            self.changed.notify_all()
+
+        for proxy in candidates:
+            self.validators.submit(self.validate, proxy)
+
+    def validate(self, proxy):
+        try:
+            ok = self.validator(proxy)
+        except Exception:
+            ok = False
+
+        with self.lock:
+            self.validating.discard(proxy)
+            if ok:
+                logging.info("Adding proxy %s" % proxy)
+                self.proxies.setdefault(proxy, ProxyStats(proxy))
+            else:
+                logging.info("Rejecting proxy %s" % proxy)
+                self.evicted.add(proxy)
+            self.changed.notify_all()
+
+    def refill(self, force=False):
+        """Request new candidates from the source in a background thread,
+        unless a refill is running or the last one was too recent.
+        """
+        with self.lock:
+            if self.source is None or self.refilling:
+                return
+            now = time.time()
+            if (not force and self.last_refill is not None and
+                    now - self.last_refill < self.min_refill_interval):
+                return
+            self.refilling = True
+            self.last_refill = self.last_update = now
+
+        thread = threading.Thread(target=self._refill,
+                                  name="arackpy-proxy-refill")
+        thread.daemon = True
+        thread.start()
+
+    def _refill(self):
+        try:
+            logging.info("Refilling the proxy pool")
+            self.add(list(self.source()))
+        except Exception:
+            logging.exception("Unable to refill the proxy pool")
+        finally:
+            with self.lock:
+                self.refilling = False
+                self.changed.notify_all()
+
+    def needs_refill(self):
+        if len(self.proxies) < self.min_proxies:
+            return True
+        return (self.refresh_interval is not None and
+                time.time() - self.last_update > self.refresh_interval)
+
+    def acquire(self, timeout=None):
+        """Return a proxy picked by health, waiting up to timeout seconds for
+        one to cool down or to be validated. Return None if there is none.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+
+        with self.lock:
+            while True:
+                if self.needs_refill():
+                    self.lock.release()
+                    try:
+                        self.refill()
+                    finally:
+                        self.lock.acquire()
+
+                now = time.time()
+                ready = [stats for stats in self.proxies.values()
+                         if stats.cooldown_until <= now]
+                if ready:
+                    latencies = [stats.latency for stats in ready
+                                 if stats.latency is not None]
+                    default = (sum(latencies) / len(latencies) if latencies
+                               else 1.0)
+                    weights = [stats.weight(default) for stats in ready]
+                    return weighted_choice(ready, weights).proxy
+
+                # nothing will ever become available
+                if not (self.proxies or self.validating or self.refilling):
+                    return None
+
+                wait = None if deadline is None else deadline - now
+                if self.proxies:
+                    cooled = min(stats.cooldown_until
+                                 for stats in self.proxies.values())
+                    wait = cooled - now if wait is None else min(
+                        wait, cooled - now)
+                if wait is not None and wait <= 0:
+                    if deadline is not None and now >= deadline:
+                        return None
+                    continue
+                # a bounded wait keeps the thread responsive to Ctrl-c
+                self.changed.wait(min(wait, 1) if wait is not None else 1)
+
+    def success(self, proxy, latency):
+        """Record a url read using the proxy in latency seconds"""
+        with self.lock:
+            stats = self.proxies.get(proxy)
+            if stats is None:
+                return
+            stats.successes += 1
+            stats.consecutive_failures = 0
+            if stats.latency is None:
+                stats.latency = latency
+            else:
+                stats.latency += self.alpha * (latency - stats.latency)
+
+    def failure(self, proxy):
+        """Record a failed read, cool the proxy down and evict it after
+        max_failures consecutive failures. Return True if it is evicted.
+        """
+        with self.lock:
+            stats = self.proxies.get(proxy)
+            if stats is None:
+                return False
+            stats.failures += 1
+            stats.consecutive_failures += 1
+
+            if stats.consecutive_failures >= self.max_failures:
+                logging.info("Evicting proxy %s" % proxy)
+                del self.proxies[proxy]
+                self.evicted.add(proxy)
+                self.changed.notify_all()
+                return True
+
+            cooldown = min(self.cooldown *
+                           2 ** (stats.consecutive_failures - 1),
+                           self.max_cooldown)
+            stats.cooldown_until = time.time() + cooldown
+            self.changed.notify_all()
+            return False
+
+    def reset(self, proxy):
+        """Forget the health of a proxy, e.g. once its tor circuit changed"""
+        with self.lock:
+            if proxy in self.proxies:
+                self.proxies[proxy] = ProxyStats(proxy)
+                self.changed.notify_all()
+
+    def remove(self, proxy):
+        """Remove a proxy from the pool without evicting it, return False if
+        it is not in the pool
+        """
+        with self.lock:
+            return self.proxies.pop(proxy, None) is not None
+
+    def close(self):
+        """Stop the validation threads"""
+        self.validators.close()
@@ -0,0 +1,136 @@
+"""A caching dns resolver used to group urls by server ip.
+
+Host names are resolved once and cached for a limited time, including the
+ones that cannot be resolved. The distinct host names of a level are resolved
+in parallel so that a level with many urls only costs as many lookups as it
+has new hosts.
+"""
+
+from __future__ import absolute_import
+
+from collections import OrderedDict
+import socket
+import threading
+import time
+
+from arackpy.pool import WorkerPool
+
+
+class Resolver(object):
+    """Thread safe dns cache with least recently used eviction.
+
+    :Parameters:
+        `ttl` : int
+            Time in seconds a resolved ip address is cached.
+
+        `maxsize` : int
+            The maximum number of host names cached.
+
+        `negative_ttl` : int
+            Time in seconds a host name that cannot be resolved is cached.
+
+        `workers` : int
+            The number of threads resolving host names in parallel.
+    """
+
+    def __init__(self, ttl=300, maxsize=10000, negative_ttl=60, workers=16):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.negative_ttl = negative_ttl
+
+        # host -> (ip or None, expiry time)
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.pool = WorkerPool(workers, name="arackpy-dns")
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.cache)
+
+    def lookup(self, host):
+        """Return (True, ip) if the host is cached, ip is None if the host
+        cannot be resolved, and (False, None) otherwise.
+        """
+        with self.lock:
+            try:
+                ip, expires = self.cache[host]
+            except KeyError:
+                self.misses += 1
+                return False, None
+
+            if expires < time.time():
+                del self.cache[host]
+                self.misses += 1
+                return False, None
+
+            self.hits += 1
+            return True, ip
+
+    def store(self, host, ip):
+        ttl = self.ttl if ip is not None else self.negative_ttl
+        with self.lock:
+            self.cache.pop(host, None)
+            self.cache[host] = (ip, time.time() + ttl)
+            while len(self.cache) > self.maxsize:
+                self.cache.popitem(last=False)
+
+    def query(self, host):
+        """Resolve the host bypassing the cache and store the result"""
+        try:
+            ip = socket.gethostbyname(host)
+        except (socket.gaierror, socket.herror, UnicodeError):
+            ip = None
+        self.store(host, ip)
+        return ip
+
+    def resolve(self, host):
+        """Return the ip address of the host or raise socket.gaierror"""
+        found, ip = self.lookup(host)
+        if not found:
+            ip = self.query(host)
+
+        if ip is None:
+            raise socket.gaierror("Unable to resolve host %s" % host)
+        return ip
+
+    def resolve_many(self, hosts):
+        """Return a dictionary of host to ip address, None if the host cannot
+        be resolved. The hosts not cached are resolved in parallel.
+        """
+        ips = {}
+        missing = []
+        for host in set(hosts):
+            found, ip = self.lookup(host)
+            if found:
+                ips[host] = ip
+            else:
+                missing.append(host)
+
+        if len(missing) == 1:
+            ips[missing[0]] = self.query(missing[0])
+        elif missing:
+            results = {}
+
+            def _query(host):
+                results[host] = self.query(host)
+
+            for host in missing:
+                self.pool.submit(_query, host)
+            self.pool.join()
+
+            for host in missing:
+                ips[host] = results.get(host)
+
+        return ips
+
+    def close(self):
+        """Stop the resolver threads, they are started again if required"""
+        self.pool.close()
+
+    def stats(self):
+        """Return the cache hit and miss counts and the cache size"""
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "size": len(self.cache)}
@@ -0,0 +1,217 @@
+"""A robots.txt cache shared by all the reader threads.
+
+Each robots.txt file is downloaded once per scheme and host and kept for a
+limited time. When several threads ask for the same host at the same time,
+only one of them downloads the file while the others wait for it. The least
+recently used files are evicted once the cache is full. Optionally, the cache
+is saved to a json file and loaded back so that a restarted spider does not
+download all the files again.
+"""
+
+from __future__ import absolute_import
+
+from collections import OrderedDict
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    from robotparser import RobotFileParser
+    from urllib2 import urlopen, HTTPError
+    from urlparse import urlsplit
+except ImportError:
+    from urllib.robotparser import RobotFileParser
+    from urllib.request import urlopen
+    from urllib.error import HTTPError
+    from urllib.parse import urlsplit
+
+from arackpy.utils import write_file
+
+
+class CachedRobotFileParser(RobotFileParser):
+    """A robotparser that remembers its raw lines, the time it was fetched
+    and the crawl delay of each user agent.
+    """
+
+    def __init__(self, url="", lines=None, status=200, fetched=None):
+        RobotFileParser.__init__(self, url)
+        self.lines = lines or []
+        self.status = status
+        self.fetched = time.time() if fetched is None else fetched
+        self.delays = {}
+
+        # missing files allow everything, forbidden and unavailable ones
+        # nothing
+        if status in (401, 403) or status >= 500:
+            self.disallow_all = True
+        elif status >= 400:
+            self.allow_all = True
+        else:
+            self.parse(self.lines)
+
+    def crawl_delay(self, useragent):
+        try:
+            return self.delays[useragent]
+        except KeyError:
+            try:
+                delay = RobotFileParser.crawl_delay(self, useragent)
+            except AttributeError:
+                # py27
+                delay = None
+            self.delays[useragent] = delay
+            return delay
+
+    def site_maps(self):
+        """Return the list of urls of the Sitemap lines, also for py27"""
+        urls = []
+        for line in self.lines:
+            name, _, value = line.partition(":")
+            if name.strip().lower() == "sitemap" and value.strip():
+                urls.append(value.split("#", 1)[0].strip())
+        return urls
+
+    def to_dict(self):
+        return {"url": self.url, "lines": self.lines, "status": self.status,
+                "fetched": self.fetched}
+
+
+class RobotsCache(object):
+    """Thread safe cache of robots.txt files keyed by scheme and host.
+
+    :Parameters:
+        `ttl` : int
+            Time in seconds after which a robots.txt file is downloaded again.
+
+        `maxsize` : int
+            The maximum number of robots.txt files kept in memory.
+
+        `path` : str
+            Optional json file used to persist the cache between runs.
+
+        `timeout` : int
+            The timeout used when a robots.txt file is read.
+    """
+
+    # retry hosts whose robots.txt file cannot be read sooner
+    error_ttl = 60
+
+    def __init__(self, ttl=3600, maxsize=1000, path=None, timeout=5):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.path = path
+        self.timeout = timeout
+
+        self.entries = OrderedDict()
+        self.pending = {}
+        self.lock = threading.Lock()
+
+        if path and os.path.exists(path):
+            self.load()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def key(self, url):
+        parts = urlsplit(url)
+        return "".join([parts.scheme, "://", parts.netloc.lower()])
+
+    def expired(self, rp):
+        ttl = self.ttl if rp.status < 500 else self.error_ttl
+        return time.time() - rp.fetched > ttl
+
+    def cached(self, url):
+        """Return the robotparser for the url if it is cached and has not
+        expired, None otherwise. Never blocks on a download.
+        """
+        key = self.key(url)
+        with self.lock:
+            rp = self.entries.get(key)
+            if rp is None or self.expired(rp):
+                return None
+            self._touch(key)
+            return rp
+
+    def get(self, url):
+        """Return the robotparser for the host of the url, downloading the
+        robots.txt file if it is not cached or has expired.
+        """
+        key = self.key(url)
+
+        while True:
+            with self.lock:
+                rp = self.entries.get(key)
+                if rp is not None and not self.expired(rp):
+                    self._touch(key)
+                    return rp
+
+                event = self.pending.get(key)
+                if event is None:
+                    event = self.pending[key] = threading.Event()
+                    break
+
+            # another thread is downloading the same file
+            event.wait()
+
+        try:
+            rp = self.fetch(key)
+            with self.lock:
+                self.entries[key] = rp
+                self._touch(key)
+                while len(self.entries) > self.maxsize:
+                    self.entries.popitem(last=False)
+        finally:
+            with self.lock:
+                del self.pending[key]
+            event.set()
+
+        return rp
+
+    def _touch(self, key):
+        try:
+            self.entries.move_to_end(key)
+        except AttributeError:
+            # py27
+            self.entries[key] = self.entries.pop(key)
+
+    def fetch(self, root_url):
+        """Download and parse the robots.txt file of the root url"""
+        url = root_url + "/robots.txt"
+        logging.info("Reading robots.txt file for url %s" % root_url)
+
+        try:
+            response = urlopen(url, timeout=self.timeout)
+            lines = response.read().decode("utf-8", "replace").splitlines()
+            return CachedRobotFileParser(url, lines)
+        except HTTPError as e:
+            return CachedRobotFileParser(url, status=e.code)
+        except Exception:
+            # unreachable host, urls are skipped until the next retry
+            logging.warning("Unable to read robots.txt for url %s" % root_url)
+            return CachedRobotFileParser(url, status=503)
+
+    def load(self):
+        """Load the cache from the json file"""
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (IOError, ValueError):
+            logging.warning("Unable to load robots cache %s" % self.path)
+            return
+
+        with self.lock:
+            for key, entry in sorted(data.items(),
+                                     key=lambda item: item[1]["fetched"]):
+                self.entries[key] = CachedRobotFileParser(**entry)
+
+    def save(self):
+        """Save the cache to the json file"""
+        if not self.path:
+            return
+
+        with self.lock:
+            data = dict((key, rp.to_dict())
+                        for key, rp in self.entries.items())
+
+        write_file(self.path, json.dumps(data).encode("utf-8"))
@@ -0,0 +1,172 @@
+"""Seed the spider with the urls listed in sitemaps.
+
+Sitemaps are xml files listing the urls of a site, possibly gzip compressed,
+and sitemap indexes are xml files listing sitemaps. They are found in the
+Sitemap lines of the robots.txt files or given explicitly.
+
+Sitemaps can list millions of urls, so they are never loaded at once. Each
+file is parsed incrementally while it downloads and every parsed element is
+discarded, so the memory used does not depend on the size of the file. The
+urls are pulled from the feed as the queues of the spider have room for them.
+"""
+
+from __future__ import absolute_import
+
+from collections import namedtuple
+import gzip
+import itertools
+import logging
+import threading
+
+try:
+    from urllib2 import urlopen
+except ImportError:
+    from urllib.request import urlopen
+
+try:
+    from xml.etree.cElementTree import iterparse
+except ImportError:
+    from xml.etree.ElementTree import iterparse
+
+
+# an url of a sitemap, lastmod, changefreq and priority are None if missing
+SitemapEntry = namedtuple("SitemapEntry", "url lastmod changefreq priority")
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def local_name(tag):
+    """Return the tag without its xml namespace"""
+    return tag.rsplit("}", 1)[-1]
+
+
+def open_sitemap(url, timeout=5):
+    """Open the sitemap and return a file object of the uncompressed xml"""
+    response = urlopen(url, timeout=timeout)
+
+    headers = response.info()
+    compressed = (url.endswith(".gz") or
+                  "gzip" in (headers.get("Content-Encoding") or "") or
+                  "gzip" in (headers.get("Content-Type") or ""))
+    if not compressed:
+        try:
+            compressed = response.peek(2)[:2] == GZIP_MAGIC
+        except AttributeError:
+            # py27
+            pass
+
+    if compressed:
+        return gzip.GzipFile(fileobj=response, mode="rb")
+    return response
+
+
+def parse_sitemap(f):
+    """Parse a sitemap or a sitemap index incrementally. Yield a SitemapEntry
+    for every url of a sitemap and the url of every sitemap of an index.
+    """
+    root = None
+    fields = {}
+    for event, elem in iterparse(f, events=("start", "end")):
+        if root is None:
+            root = elem
+            continue
+        if event != "end":
+            continue
+
+        tag = local_name(elem.tag)
+        if tag in ("loc", "lastmod", "changefreq", "priority"):
+            fields[tag] = (elem.text or "").strip()
+        elif tag == "url":
+            priority = fields.get("priority")
+            try:
+                priority = float(priority) if priority else None
+            except ValueError:
+                priority = None
+            if fields.get("loc"):
+                yield SitemapEntry(fields["loc"], fields.get("lastmod"),
+                                   fields.get("changefreq"), priority)
+            fields = {}
+            root.clear()
+        elif tag == "sitemap":
+            if fields.get("loc"):
+                yield fields["loc"]
+            fields = {}
+            root.clear()
+
+
+def iter_sitemap(url, timeout=5, max_depth=3, seen=None):
+    """Yield the SitemapEntry of every url of the sitemap, following the
+    sitemaps of sitemap indexes up to max_depth levels deep. Each sitemap is
+    read once.
+    """
+    seen = set() if seen is None else seen
+    if url in seen:
+        return
+    seen.add(url)
+
+    logging.info("Reading sitemap %s" % url)
+
+    nested = []
+    try:
+        f = open_sitemap(url, timeout)
+        try:
+            for item in parse_sitemap(f):
+                if isinstance(item, SitemapEntry):
+                    yield item
+                else:
+                    nested.append(item)
+        finally:
+            f.close()
+    except Exception:
+        logging.warning("Unable to read sitemap %s" % url)
+
+    if nested and max_depth <= 0:
+        logging.warning("Ignoring sitemaps nested in %s" % url)
+        return
+
+    for sitemap_url in nested:
+        for entry in iter_sitemap(sitemap_url, timeout, max_depth - 1, seen):
+            yield entry
+
+
+class SitemapFeed(object):
+    """A thread safe and lazy iterator over the urls of several sitemaps.
+
+    :Parameters:
+        `sitemap_urls` : iterable
+            The urls of the sitemaps or sitemap indexes, consumed lazily.
+
+        `timeout` : int
+            The timeout used when a sitemap is read.
+    """
+
+    def __init__(self, sitemap_urls, timeout=5):
+        self.timeout = timeout
+
+        seen = set()
+        self.entries = itertools.chain.from_iterable(
+            iter_sitemap(url, timeout, seen=seen) for url in sitemap_urls)
+
+        self.exhausted = False
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def take(self, n):
+        """Return the next n entries at most, fewer once the sitemaps are
+        exhausted
+        """
+        with self.lock:
+            if self.exhausted:
+                return []
+
+            try:
+                entries = list(itertools.islice(self.entries, n))
+            except Exception:
+                logging.exception("Unable to read sitemaps")
+                entries = []
+                self.exhausted = True
+
+            if len(entries) < n:
+                self.exhausted = True
+            self.count += len(entries)
+            return entries
@@ -4,23 +4,19 @@ from __future__ import (print_function, division, absolute_import,
                         unicode_literals)
 
 from abc import abstractmethod
-from collections import deque, defaultdict
+from collections import defaultdict, OrderedDict
+from functools import partial
+import inspect
 import logging
 
 try:
-    from Queue import Queue, Full
+    from Queue import Empty
 except ImportError:
-    from queue import Queue, Full
+    from queue import Empty
 
 import random
 
-try:
-    from robotparser import RobotFileParser
-except ImportError:
-    from urllib.robotparser import RobotFileParser
-
 import sys
-from socket import gethostbyname
 import time
 import threading
 
@@ -30,7 +26,20 @@ except ImportError:
     from urllib.parse import urlsplit, urljoin
 
 
+from arackpy.backends.backend_cache import Backend_Cache
 from arackpy.backends.backend_default import Backend_Default
+from arackpy.checkpoint import Checkpoint
+from arackpy.frontier import PrioritySpillQueue
+from arackpy.items import ItemPipeline, is_url, open_writer
+from arackpy.metrics import Metrics, MetricsServer
+from arackpy.parsepool import ParsePool
+from arackpy.pool import WorkerPool
+from arackpy.resolver import Resolver
+from arackpy.robots import RobotsCache
+from arackpy.sitemap import SitemapFeed
+from arackpy.throttle import AutoThrottle
+from arackpy.utils import TRACKING_PARAMS, canonicalize
+from arackpy.visited import VISITED_CACHES
 
 # change default encoding for py27 from ascii
 if sys.version_info <= (2, 7):
@@ -60,14 +69,35 @@ try:
 except ImportError:
     logging.warning("Unable to import backend %s" % "tor")
 
+from arackpy.engines.engine_frontier import Engine_Frontier
+from arackpy.engines.engine_processes import Engine_Processes
+
+# mapping between name and engine class, threads is built into the spider
+ENGINES = {"threads": None,
+           "frontier": Engine_Frontier,
+           "asyncio": None,
+           "processes": Engine_Processes,
+           }
+
+try:
+    from arackpy.engines.engine_asyncio import Engine_Asyncio
+    ENGINES["asyncio"] = Engine_Asyncio
+except (ImportError, SyntaxError):
+    # py27
+    logging.warning("Unable to import engine %s" % "asyncio")
+
 
 class Spider(object):
     """Create a spider.
 
     The spider is implemented using two queues. Reader threads get from the
     active queue and put into the empty queue. When the active queue is empty,
-    it is swapped with the once empty but now full queue. New reader threads
-    are spawned at every level and process urls from the active queue.
+    it is swapped with the once empty but now full queue. A fixed size pool of
+    reader threads, started once, processes the urls from the active queue at
+    every level, in batches of at most max_urls_per_level urls. The queues
+    keep that many urls in memory and spill the rest to disk, so discovered
+    urls are never dropped. Within a level, the urls of the highest priority
+    are read first, see the score and parse methods.
 
     Urls are grouped by host server ip address and the corresponding html is
     downloaded sequentially from each ip depending on the requirements set in
@@ -78,6 +108,10 @@ class Spider(object):
     max_levels. Pressing Ctrl-c will also interrupt and kill the spider albeit
     in a harsh manner.
 
+    Alternatively, the 'frontier' engine removes the levels and reads urls
+    continuously from per host queues and the 'asyncio' engine reads all the
+    urls from a single event loop. See the engine attribute.
+
     :Parameters:
         `start_urls` : list
             List of urls marking the starting point for the spider.
@@ -86,9 +120,35 @@ class Spider(object):
             If set to True, spider will traverse domains outside the starting
             urls.
 
+        `sitemap_urls` : list
+            Urls of sitemaps or sitemap indexes, possibly gzip compressed,
+            whose urls are read along with the start urls. The sitemaps are
+            parsed incrementally and their urls are queued as the queues have
+            room for them, so sitemaps of any size are read in constant
+            memory. See arackpy.sitemap and the score_sitemap method.
+
+        `read_sitemaps` : bool
+            If set to True, the sitemaps listed in the robots.txt files of the
+            start url hosts are read as well.
+
+        `strip_query_params` : tuple
+            The query parameters removed from the urls to follow, e.g.
+            tracking parameters. A name ending with * matches any suffix. The
+            urls are also canonicalized, see arackpy.utils.canonicalize, so
+            that equivalent urls are read once.
+
+        `visited_cache` : str
+            The type of cache used to keep track of the visited urls. Either
+            'bloomfilter', a scalable bloom filter, or 'fingerprint', an exact
+            set of 64 bit url hashes. Both have constant time lookups.
+
         `visit_history_limit` : int
-            Used to set the cache size of the deque which keeps tracks of all
-            the visisted urls.
+            The initial capacity of the visited cache. The bloom filter grows
+            beyond this limit, so visited urls are never forgotten.
+
+        `visited_error_rate` : float
+            The false positive rate of the bloom filter, i.e. the probability
+            that an unvisited url is reported as visited and skipped.
 
         `respect_server` : bool
             If set to True, the wait_time_range attribute is applied.
@@ -99,22 +159,144 @@ class Spider(object):
             to crawl the page at all. If a time cannot be determined, the
             wait_time_range is set to the default.
 
+        `robots_cache_ttl` : int
+            The time in seconds a robots.txt file is cached before it is read
+            again. Each file is read once per host and shared by all the
+            reader threads and levels.
+
+        `robots_cache_size` : int
+            The maximum number of robots.txt files cached. The least recently
+            used files are evicted first.
+
+        `robots_cache_path` : str
+            If set, the robots.txt cache is saved to this json file when the
+            spider stops and loaded when it starts.
+
+        `dns_cache_ttl` : int
+            The time in seconds the ip address of a host is cached. Hosts that
+            cannot be resolved are cached for a shorter time.
+
+        `dns_cache_size` : int
+            The maximum number of host names cached.
+
+        `dns_workers` : int
+            The number of threads resolving the new host names of a level in
+            parallel.
+
+        `http_cache_path` : str
+            If set, the backend is wrapped with an on-disk http cache stored
+            in this directory. Recrawls send conditional requests and pages
+            that have not changed are passed to the unchanged method instead
+            of parse.
+
+        `http_cache_size` : int
+            The maximum size of the http cache in bytes. The least recently
+            used pages are evicted first.
+
+        `checkpoint_interval` : int
+            The time in seconds between two snapshots of the crawl state when
+            the crawl is checkpointed, see the resume argument of crawl.
+
+        `metrics_port` : int
+            If set, the crawl metrics are served in the Prometheus text format
+            on this port while the spider crawls, 0 for any free port. See
+            arackpy.metrics and the stats method.
+
+        `metrics_host` : str
+            The address the metrics are served on.
+
         `wait_time_range` : tuple
             A time interval from which a wait time is randomly selected.
 
+        `auto_throttle` : bool
+            If set to True, the wait time of each host adapts to the latency
+            of its responses instead of the wait_time_range, and grows when
+            the host answers with 429 or 503 status codes or a Retry-After
+            header. The robots.txt crawl delay is always honored. See
+            arackpy.throttle and the host_delays method.
+
+        `throttle_start_delay` : float
+            The wait time of a host before its first response.
+
+        `throttle_min_delay` : float
+            The smallest wait time of a host.
+
+        `throttle_max_delay` : float
+            The largest wait time of a host, unless its Retry-After header
+            asks for more.
+
+        `throttle_target_concurrency` : float
+            The average number of requests in flight to each host the wait
+            time aims at.
+
+        `throttle_target_latency` : float
+            If set, the response time in seconds the wait time aims at
+            instead of the target concurrency.
+
         `timeout` : int
             The timeout used when the url is read from. If the url cannot be
             read within the specified time, a timeout exception occurs.
 
         `thread_safe_parse` : bool
             If set to True, the parse method is thread safe, which allows for
-            easy debugging using print statements.
+            easy debugging using print statements. Not required to export
+            items, see export_path.
+
+        `export_path` : str
+            If set, the items yielded by the parse method, see parse, are
+            written to this file by a background thread, as json lines, csv
+            or sqlite rows depending on the extension, .jsonl, .csv or .db.
+            Json lines and csv files ending with .gz are compressed. See
+            arackpy.items.
+
+        `export_format` : str
+            The format of the export, 'jsonl', 'csv' or 'sqlite', instead of
+            the extension of the export path.
+
+        `export_fields` : list
+            The csv columns or the sqlite columns, the keys of the first item
+            by default.
+
+        `export_table` : str
+            The sqlite table the items are inserted in.
+
+        `export_batch_size` : int
+            The maximum number of items written at once, one sqlite
+            transaction each.
+
+        `export_flush_interval` : float
+            Time in seconds after which the queued items are written and the
+            export file is flushed.
+
+        `export_queue_size` : int
+            The maximum number of items waiting to be written. Parse waits
+            for room when the queue is full.
+
+        `parse_processes` : int
+            If set, the parse method and the url extraction run in a pool of
+            this many processes, so that a cpu bound parse method does not
+            slow down the reader threads. The threads engine keeps reading
+            while the parses are queued. The parse method cannot be a
+            coroutine and runs without the lock of thread_safe_parse.
+            Ignored by the processes engine.
+
+        `parse_window` : int
+            The maximum number of parses queued or running in the process
+            pool. Reader threads wait for a slot when the window is full.
 
         `max_urls_per_level` : int
             Children urls immediately below the start urls form the first
             level. Since the number of urls per level can increase at an
             exponential rate, a limit is set to prevent memory bottlenecks by
-            defining a max queue size for the active and empty queues.
+            defining the number of urls the active and empty queues hold in
+            memory. The urls beyond the limit are spilled to a temporary file
+            and the level is read in batches of this size. The frontier and
+            asyncio engines hold this many queued urls in memory and spill the
+            rest as well.
+
+        `frontier_spill_path` : str
+            The directory of the temporary files the queues spill to, the
+            system temporary directory by default.
 
         `max_level` : int
             The maximum number of levels to crawl before termination. Everytime
@@ -129,6 +311,32 @@ class Spider(object):
         `debug` : bool
             Log all debug messages to stdout.
 
+        `engine` : str
+            The engine used to crawl, either 'threads', 'frontier', 'asyncio'
+            or 'processes'. The threads engine reads the urls of each server
+            ip from a pool of reader threads, level by level. The frontier
+            engine uses the same threads but has no levels, idle threads read
+            the next host that is ready instead of waiting for the slowest
+            host of the level. The asyncio engine reads urls concurrently from
+            one event loop and is better suited to crawls spanning thousands
+            of hosts. The processes engine runs the frontier engine in several
+            processes, for spiders with a cpu bound parse method.
+
+        `concurrency` : int
+            The maximum number of urls read at the same time, i.e. the number
+            of reader threads of the threads engine or the number of worker
+            coroutines of the asyncio engine. The processes engine starts
+            this many reader threads in every process.
+
+        `processes` : int
+            The number of processes of the processes engine, the number of
+            cpus by default. Hosts are spread over the processes, each
+            running the frontier engine, so that parsing uses all the cpus.
+
+        `host_concurrency` : int
+            The maximum number of urls read at the same time from the same
+            host by the asyncio engine.
+
         `backend` : Backend
             The type of backend to use for the spider. The default backend is
             specified if nothing is specified. See below for a list of other
@@ -137,12 +345,6 @@ class Spider(object):
         `kwargs` : dict
             Keyword arguments used to initialize the specific backend.
 
-    TODO
-
-        In order of importance:
-
-        1. Implement a bloomfilter for visisted urls cache instead of a deque.
-
     BUGS
 
         1. Pypi not showing code syntax highlighting.
@@ -154,24 +356,78 @@ class Spider(object):
     # stay at the same top level domain
     follow_external_links = False
 
-    # TODO: implement a bloomfilter
+    # seed from sitemaps, explicit or found in robots.txt
+    sitemap_urls = []
+    read_sitemaps = False
+
+    # removed from the canonical urls
+    strip_query_params = TRACKING_PARAMS
+
+    # 'bloomfilter' or 'fingerprint'
+    visited_cache = "bloomfilter"
+
     visit_history_limit = 2000
 
+    visited_error_rate = 0.001
+
     # be nice to the host server
     respect_server = True
 
     read_robots_file = True
 
+    # robots.txt cache
+    robots_cache_ttl = 3600
+    robots_cache_size = 1000
+    robots_cache_path = None
+
+    # dns cache
+    dns_cache_ttl = 300
+    dns_cache_size = 10000
+    dns_workers = 16
+
+    # http cache directory, disabled by default
+    http_cache_path = None
+    http_cache_size = 100 * 2 ** 20
+
+    # seconds between crawl state snapshots
+    checkpoint_interval = 60
+
+    # prometheus metrics endpoint, disabled by default
+    metrics_port = None
+    metrics_host = "127.0.0.1"
+
     wait_time_range = (1, 3)
 
+    # adaptive wait time per host
+    auto_throttle = False
+    throttle_start_delay = 1.0
+    throttle_min_delay = 0.0
+    throttle_max_delay = 60.0
+    throttle_target_concurrency = 1.0
+    throttle_target_latency = None
+
     # urlopen timeout in seconds
     timeout = 5
 
     # thread safe parse
     thread_safe_parse = False
 
-    # max urls to put on queue every jump
+    # item export, disabled by default
+    export_path = None
+    export_format = None
+    export_fields = None
+    export_table = "items"
+    export_batch_size = 1000
+    export_flush_interval = 1.0
+    export_queue_size = 10000
+
+    # parse in a process pool, disabled by default
+    parse_processes = 0
+    parse_window = 100
+
+    # max urls held in memory per level, the rest is spilled to disk
     max_urls_per_level = 1000
+    frontier_spill_path = None
 
     # termination criteria
     max_levels = 100    # max jumps
@@ -180,6 +436,18 @@ class Spider(object):
     # debug mode
     debug = False
 
+    # 'threads', 'frontier' or 'asyncio'
+    engine = "threads"
+
+    # reader threads or coroutines
+    concurrency = 100
+
+    # asyncio engine limit
+    host_concurrency = 1
+
+    # processes engine, None for the number of cpus
+    processes = None
+
     def __init__(self, backend="default", **kwargs):
         """Create a spider instance using a backend. The 'default' backend is
         used by default.
@@ -191,80 +459,381 @@ class Spider(object):
             **kwargs
                 Backend specific arguments.
         """
-        assert len(self.start_urls) <= self.max_urls_per_level
+        # level implementation using queues spilling to disk
+        self.active_queue = PrioritySpillQueue(self.max_urls_per_level,
+                                               self.frontier_spill_path)
+        self.empty_queue = PrioritySpillQueue(self.max_urls_per_level,
+                                              self.frontier_spill_path)
 
-        # level implementation using queues
-        self.active_queue = Queue(self.max_urls_per_level)
-        self.empty_queue = Queue(self.max_urls_per_level)
+        start_urls = [canonicalize(url, self.strip_query_params)
+                      for url in self.start_urls]
 
         # top level domain names
-        self.tlds = [self.get_tld(url) for url in self.start_urls]
+        self.tlds = [self.get_tld(url) for url in start_urls]
 
-        self.visited = deque(maxlen=self.visit_history_limit)
+        try:
+            self.visited = VISITED_CACHES[self.visited_cache](
+                self.visit_history_limit, self.visited_error_rate)
+        except KeyError:
+            raise ValueError("unknown visited cache %s" % self.visited_cache)
+
+        # urls put in the empty queue once, keeps the spilled levels small
+        self.queued = VISITED_CACHES[self.visited_cache](
+            self.visit_history_limit, self.visited_error_rate)
 
         self.lock = threading.Lock()
 
+        self.robots = RobotsCache(self.robots_cache_ttl,
+                                  self.robots_cache_size,
+                                  self.robots_cache_path, self.timeout)
+
+        self.resolver = Resolver(self.dns_cache_ttl, self.dns_cache_size,
+                                 workers=self.dns_workers)
+
+        self.throttle = None
+        if self.auto_throttle:
+            self.throttle = AutoThrottle(self.throttle_start_delay,
+                                         self.throttle_min_delay,
+                                         self.throttle_max_delay,
+                                         self.throttle_target_concurrency,
+                                         self.throttle_target_latency)
+
+        # reader threads, started on demand and reused at every level
+        self.pool = WorkerPool(self.concurrency)
+
         # termination flags
         self.level = 0
         self.total_url_count = 0
 
+        # process pool running parse, see parse_processes
+        self.parse_pool = None
+
+        # read url count shared by the processes of the processes engine
+        self.shared_count = None
+
+        # crawl state checkpoints, see crawl
+        self.checkpoint = None
+        self.resumed = None
+
+        # urls of the sitemaps, opened by crawl
+        self.sitemaps = None
+
+        # pipeline of the exported items, opened by crawl
+        self.items = None
+
+        # counters and timings, see stats
+        self.metrics = Metrics()
+        self.metrics_server = None
+
         # backends for reading html and extracting urls
         try:
             self.backend = BACKENDS[backend](self, **kwargs)
         except (KeyError, TypeError):
             self.backend = BACKENDS["default"](self)
-            logging.warning("%s backend unavailable,",
-                            " using %s" % (backend, "default"))
+            logging.warning("%s backend unavailable, using %s" %
+                            (backend, "default"))
+
+        if self.http_cache_path:
+            self.backend = Backend_Cache(self, self.backend,
+                                         self.http_cache_path,
+                                         self.http_cache_size)
+
+        self.register_gauges()
 
         # initialize queue
-        for start_url in self.start_urls:
-            self.active_queue.put(start_url)
+        for start_url in start_urls:
+            self.active_queue.put(start_url, self.score(start_url, 0))
 
         if self.debug:
             logger = logging.getLogger()
             logger.setLevel(logging.DEBUG)
 
+    def register_gauges(self):
+        """Register the gauges of the metrics, the engines replace the
+        frontier depth with the size of their own queues.
+        """
+        metrics = self.metrics
+        metrics.gauge("read_urls", lambda: self.total_url_count)
+        metrics.gauge("level", lambda: self.level)
+        metrics.gauge("frontier_depth", lambda: (self.active_queue.qsize() +
+                                                 self.empty_queue.qsize()))
+        metrics.gauge("spilled_urls",
+                      lambda: (self.active_queue.total_spilled +
+                               self.empty_queue.total_spilled))
+        metrics.gauge("visited_urls", lambda: len(self.visited))
+        metrics.gauge("dns_cache_hits", lambda: self.resolver.stats()["hits"])
+        metrics.gauge("dns_cache_misses",
+                      lambda: self.resolver.stats()["misses"])
+        metrics.gauge("robots_cache_size", lambda: len(self.robots))
+
+        cache = getattr(self.backend, "cache", None)
+        if cache is not None:
+            metrics.gauge("http_cache_hits", lambda: cache.stats()["hits"])
+            metrics.gauge("http_cache_misses", lambda: cache.stats()["misses"])
+
+    def stats(self):
+        """Return a snapshot of the crawl metrics as a dict, e.g.
+        stats()["stage_seconds"]["fetch"]["p99"] or
+        stats()["responses_total"]["200"]. See arackpy.metrics.METRICS for
+        the list of metrics.
+
+        The parse and extract stages of the urls parsed in a process pool are
+        not recorded. With the processes engine the metrics of the child
+        processes are added once they finish.
+        """
+        return self.metrics.snapshot()
+
     def get_tld(self, url):
         """Get the top level domain given the url"""
         return urlsplit(url).netloc
 
-    def crawl(self, max_urls=None):
+    def crawl(self, max_urls=None, engine=None, resume=None, processes=None):
+        """Start crawling from the start urls.
+
+        :Parameters:
+            `max_urls` : int
+                Overrides the max_urls attribute.
+
+            `engine` : str
+                Overrides the engine attribute.
+
+            `resume` : str
+                A checkpoint directory. If it holds the state of an
+                interrupted crawl, the crawl continues from it instead of the
+                start urls. The state is then saved to the directory as the
+                spider crawls, every checkpoint_interval seconds and when the
+                spider stops, including on Ctrl-c.
+
+            `processes` : int
+                Crawl using the processes engine with this many processes.
+        """
         if max_urls:
             self.max_urls = max_urls
 
-        try:
-            while True:
-                ips = self.urls_by_ips()
+        engine = engine or self.engine
+        if processes:
+            self.processes = processes
+            engine = "processes"
 
-                # spawn child thread for urls per ip basis
-                self.spawn_reader_threads(ips)
+        if engine != "threads" and ENGINES.get(engine) is None:
+            raise ValueError("%s engine unavailable" % engine)
 
-                # main thread more responsive than when calling thread.join for
-                # spawned thread, wait for spawned threads to terminate after
-                # each jump
-                while threading.active_count() > 1:
-                    time.sleep(0.1)
+        if resume and engine == "processes":
+            raise ValueError("processes engine cannot resume a crawl")
 
-                # must visit the max_level so max_level + 1
-                self.swap_queues()
-                self.level += 1
+        # forks the parse processes, before any thread is started
+        if self.parse_processes and engine != "processes":
+            self.parse_pool = ParsePool(self, self.parse_processes,
+                                        self.parse_window)
 
-                # check termination
-                if self.level == (self.max_levels + 1):
-                    logging.info("Reached jump level %s" % self.max_levels)
-                    break
+        if resume:
+            self.restore(resume)
 
-                # value of total_url_count can get higher than max_urls
-                # because it is updated by multiple threads
-                if self.total_url_count > self.max_urls:
-                    logging.info("Reached total read url count %s" %
-                                 self.total_url_count)
-                    break
+        if self.sitemap_urls or self.read_sitemaps:
+            self.sitemaps = SitemapFeed(self.sitemap_sources(), self.timeout)
+
+        if self.export_path:
+            writer = open_writer(self.export_path, self.export_format,
+                                 self.export_fields, self.export_table)
+            self.items = ItemPipeline(writer, self.export_queue_size,
+                                      self.export_batch_size,
+                                      self.export_flush_interval,
+                                      self.metrics).start()
+
+        if self.metrics_port is not None:
+            self.metrics_server = MetricsServer(self.metrics,
+                                                self.metrics_host,
+                                                self.metrics_port)
+            self.metrics_server.start()
+
+        try:
+            if engine == "threads":
+                self.queue_resumed()
+                self.crawl_levels()
+            else:
+                ENGINES[engine](self).run()
 
         except (KeyboardInterrupt, SystemExit):
             logging.info("user interrupted termination")
             sys.exit()
 
+        finally:
+            self.pool.close()
+            self.resolver.close()
+            self.backend.close()
+            self.robots.save()
+            self.active_queue.close()
+            self.empty_queue.close()
+            if self.parse_pool is not None:
+                self.parse_pool.close()
+                self.parse_pool = None
+            if self.items is not None:
+                self.items.close()
+                self.items = None
+            if self.checkpoint is not None:
+                self.checkpoint.close()
+            if self.metrics_server is not None:
+                self.metrics_server.close()
+                self.metrics_server = None
+
+    def restore(self, path):
+        """Restore the crawl state from the checkpoint directory, if any, and
+        start checkpointing to it.
+        """
+        self.checkpoint = Checkpoint(path, self.checkpoint_interval)
+
+        if self.checkpoint.load():
+            self.visited = self.checkpoint.visited
+            self.level = self.checkpoint.level
+            self.total_url_count = self.checkpoint.total_url_count
+            self.resumed = list(self.checkpoint.pending.values())
+
+            # the start urls are part of the restored state
+            while not self.active_queue.empty():
+                self.active_queue.get()
+
+            logging.info("Resuming crawl at level %s with %s urls" %
+                         (self.level, len(self.resumed)))
+            pending = self.resumed
+        else:
+            pending = [(canonicalize(url, self.strip_query_params),
+                        self.level) for url in self.start_urls]
+
+        self.checkpoint.start(self.visited, pending, self.level,
+                              self.total_url_count)
+
+    def queue_resumed(self):
+        """Put the urls restored from a checkpoint in the active queue, or in
+        the empty queue if they belong to the next level.
+        """
+        resumed, self.resumed = self.resumed or [], None
+        for url, depth in resumed:
+            # the priorities returned by parse are not checkpointed
+            if depth <= self.level:
+                self.active_queue.put(url, self.score(url, depth))
+            else:
+                self.empty_queue.put(url, self.score(url, depth))
+
+    def seeds(self):
+        """Return the (url, depth) pairs to crawl first, the start urls or the
+        urls restored from a checkpoint.
+        """
+        if self.resumed is not None:
+            resumed, self.resumed = self.resumed, None
+            return resumed
+
+        seeds = []
+        while not self.active_queue.empty():
+            seeds.append((self.active_queue.get(), self.level))
+        return seeds
+
+    def sitemap_sources(self):
+        """Yield the urls of the sitemaps to read, the sitemap_urls and the
+        sitemaps of the robots.txt files of the start url hosts if
+        read_sitemaps is set.
+        """
+        for url in self.sitemap_urls:
+            yield url
+
+        if not self.read_sitemaps:
+            return
+
+        roots = set()
+        for url in self.start_urls:
+            parts = urlsplit(url)
+            root_url = "".join([parts.scheme, "://", parts.netloc])
+            if root_url in roots:
+                continue
+            roots.add(root_url)
+
+            for sitemap_url in self.robots.get(root_url).site_maps():
+                yield sitemap_url
+
+    def next_sitemap_urls(self, n):
+        """Return the next n (url, priority) pairs of the sitemaps at most,
+        the urls that are not accepted or skipped by score_sitemap excluded.
+        Fewer urls are returned once the sitemaps are exhausted.
+        """
+        urls = []
+        while len(urls) < n and not self.sitemaps.exhausted:
+            for entry in self.sitemaps.take(n - len(urls)):
+                url = canonicalize(entry.url, self.strip_query_params)
+                if not self.accept(url):
+                    continue
+
+                priority = self.score_sitemap(entry._replace(url=url))
+                if priority is not None:
+                    urls.append((url, priority))
+
+        self.metrics.count("sitemap_urls_total", len(urls))
+        return urls
+
+    def score_sitemap(self, entry):
+        """Return the priority of an url found in a sitemap, or None to skip
+        it, e.g. when its lastmod is older than the last crawl. The entry is
+        an arackpy.sitemap.SitemapEntry.
+
+        By default, the priority of the sitemap, from 0.0 to 1.0 and 0.5 if
+        missing, scaled to an integer from 0 to 10.
+        """
+        priority = 0.5 if entry.priority is None else entry.priority
+        return int(round(10 * min(max(priority, 0.0), 1.0)))
+
+    def feed_sitemaps(self):
+        """Fill the active queue with the urls of the sitemaps, up to
+        max_urls_per_level urls, and return True while the sitemaps are not
+        exhausted.
+        """
+        if self.sitemaps is None:
+            return False
+
+        n = self.max_urls_per_level - self.active_queue.qsize()
+        if n > 0:
+            for url, priority in self.next_sitemap_urls(n):
+                if not self.queued.add(self.url_key(url)):
+                    continue
+                self.active_queue.put(url, priority)
+                if self.checkpoint is not None:
+                    self.checkpoint.queued(url, self.level)
+
+        return not self.sitemaps.exhausted
+
+    def crawl_levels(self):
+        """Crawl level by level using reader threads"""
+        while True:
+            # read urls per ip basis and wait for all the reads of a batch to
+            # complete, the level ends once the active queue is empty and the
+            # sitemaps are exhausted
+            while True:
+                feeding = self.feed_sitemaps()
+                ips = self.urls_by_ips()
+                self.submit_readers(ips)
+                self.pool.join()
+                if self.parse_pool is not None:
+                    self.parse_pool.join()
+
+                if ((self.active_queue.empty() and not feeding) or
+                        self.total_url_count > self.max_urls):
+                    break
+
+            # must visit the max_level so max_level + 1
+            self.swap_queues()
+            self.level += 1
+            if self.checkpoint is not None:
+                self.checkpoint.next_level(self.level)
+
+            # check termination
+            if self.level == (self.max_levels + 1):
+                logging.info("Reached jump level %s" % self.max_levels)
+                break
+
+            # value of total_url_count can get higher than max_urls
+            # because it is updated by multiple threads
+            if self.total_url_count > self.max_urls:
+                logging.info("Reached total read url count %s" %
+                             self.total_url_count)
+                break
+
     def swap_queues(self):
         """Swap the full and empty queue.
 
@@ -278,8 +847,8 @@ class Spider(object):
         (self.empty_queue, self.active_queue) = (self.active_queue,
                                                  self.empty_queue)
 
-    def spawn_reader_threads(self, ips):
-        """Spawn a thread associated with each ip"""
+    def submit_readers(self, ips):
+        """Submit a read task associated with each ip to the reader threads"""
         try:
             # for py27 support
             ipitems = ips.iteritems()
@@ -287,61 +856,94 @@ class Spider(object):
             ipitems = ips.items()
 
         for ((ip, root_url), urls) in ipitems:
-            child_thread = threading.Thread(target=self.read,
-                                            args=(ip, root_url, urls))
-            child_thread.daemon = True
-            child_thread.start()
+            self.pool.submit(self.read, ip, root_url, list(urls))
 
     def urls_by_ips(self):
-        """Group urls by host ip address"""
-        ips = defaultdict(set)  # remove duplicates
-
-        while not self.active_queue.empty():
+        """Group the next batch of at most max_urls_per_level urls of the
+        active queue by host ip address, in priority order
+        """
+        ips = defaultdict(OrderedDict)  # remove duplicates, keep the order
 
-            url = self.active_queue.get()
+        urls = []
+        for _ in range(self.max_urls_per_level):
+            try:
+                url = self.active_queue.get()
+            except Empty:
+                break
 
-            if url.rstrip("/") in self.visited:
-                logging.info("Already visited url, %s" % url)
+            if not self.accept(url):
                 continue
 
-            # test if external link and skip
-            if self.follow_external_links is False:
-                try:
-                    if self.get_tld(url) not in self.tlds:
-                        logging.info("Skipping external url, %s" % url)
-                        continue
-                except Exception:
-                    logging.exception("Invalid top level url, %s" % url)
-                    continue
-
-            # robots.txt for top level domain, note one ip can host multiple
-            # sites
-            robots = {}
             try:
-                loc = self.get_tld(url)
-                base_url = urlsplit(url).geturl()
-
-                # create robotparser object
-                try:
-                    scheme = base_url.split(":")[0]
-                    root_url = "".join([scheme, "://", loc])
-                    robot = robots.setdefault(loc, root_url)
-                except IOError:
-                    robot = None
-                    logging.warning("Unable to read robots.txt",
-                                    "for url, %s" % base_url)
-
-                # the split(':') allows for port numbers including
-                # localhost:8080
-                ips[(gethostbyname(loc.split(":")[0]),
-                    robot)].add((base_url, url))
-
+                parts = urlsplit(url)
+                # the hostname excludes port numbers, i.e. localhost:8080
+                urls.append((url, parts.hostname, parts))
             except Exception:
                 logging.exception("Unable to group url, %s" % url)
+
+        # one lookup per distinct host, resolved in parallel
+        with self.metrics.time("dns"):
+            hosts = self.resolver.resolve_many(host for _, host, _ in urls)
+
+        for url, host, parts in urls:
+            ip = hosts.get(host)
+            if ip is None:
+                logging.warning("Unable to resolve host for url, %s" % url)
+                self.metrics.count("dropped_urls_total", 1, "unresolved")
+                if self.checkpoint is not None:
+                    self.checkpoint.drop(url)
                 continue
 
+            # robots.txt for top level domain, note one ip can host multiple
+            # sites
+            root_url = "".join([parts.scheme, "://", parts.netloc])
+            ips[(ip, root_url)][(parts.geturl(), url)] = None
+
         return ips
 
+    def absolute_url(self, base_url, url):
+        """Return the canonical absolute url of a link"""
+        return canonicalize(urljoin(base_url, url), self.strip_query_params)
+
+    def url_key(self, url):
+        """Return the key of the url in the visited and queued caches.
+        Equivalent urls, including with or without a trailing slash, share
+        the same key.
+        """
+        return canonicalize(url, self.strip_query_params).rstrip("/")
+
+    def accept(self, url):
+        """Return True if the url has not been visited and, unless external
+        links are followed, belongs to one of the start url domains.
+        """
+        if self.url_key(url) in self.visited:
+            logging.info("Already visited url, %s" % url)
+            self.metrics.count("dropped_urls_total", 1, "visited")
+            return False
+
+        # test if external link and skip
+        if self.follow_external_links is False:
+            try:
+                if self.get_tld(url) not in self.tlds:
+                    logging.info("Skipping external url, %s" % url)
+                    self.metrics.count("dropped_urls_total", 1, "external")
+                    return False
+            except Exception:
+                logging.exception("Invalid top level url, %s" % url)
+                return False
+
+        return True
+
+    def get_robots(self, root_url):
+        """Return the robotparser for the root url or None if the robots.txt
+        file is not read.
+        """
+        if not (root_url and self.read_robots_file):
+            return None
+
+        with self.metrics.time("robots"):
+            return self.robots.get(root_url)
+
     def read(self, ip, root_url, urls):
         """One thread reads and parses urls from one server ip, i.e. one item
         from the queue. This allows for the thread to respect the server while
@@ -358,95 +960,158 @@ class Spider(object):
         The url is the absolute path to the html file that can can be directly
         passed in to be read by the backend.
         """
-        if root_url and self.read_robots_file:
-            try:
-                rp = RobotFileParser(root_url)
-                rp.read()
-                logging.info("Reading robots.txt file for url %s" % root_url)
-            except IOError:
-                logging.warning("Unable to create robotparser, url skipped")
+        rp = self.get_robots(root_url)
 
-        for base_url, url in urls:
-            try:
-                # check robots file
-                if rp.can_fetch("*", url) is False:
-                    logging.info("robots.txt from %s rejected spider" % url)
-                    continue
-            except Exception:
-                logging.exception("Ignoring robots.txt file")
-
-            try:
-                # download the raw html - note urls contains 'http' or 'https'
-                html = self.backend.urlread(url, timeout=self.timeout)
-                logging.info("Downloaded url, %s" % url)
-
-                # note as visited - deques are threadsafe for append
-                self.visited.append(url.rstrip("/"))
+        for i, (base_url, url) in enumerate(urls):
+            # wait to respect server between two urls, not after the last one
+            if i and self.respect_server:
+                logging.info("Respecting server at, %s" % ip)
+                self.wait(delay=self.get_host_delay(url, rp))
 
-            except Exception:
-                logging.exception("Unable to download url, %s" % url)
-                self.visited.append(url.rstrip("/"))
+            html = self.fetch(url, rp)
+            if html is None:
                 continue
 
             # stop each thread if max count is reached - don't parse
-            with self.lock:
-                self.total_url_count += 1
-                if self.total_url_count > self.max_urls:
-                    break
+            if not self.increment():
+                break
+
+            if self.parse_pool is not None:
+                # keep reading while the html is parsed
+                self.parse_pool.submit(
+                    url, html, self.backend.not_modified(url),
+                    callback=partial(self.follow_parsed, base_url))
+            else:
+                self.queue_urls(self.follow(base_url, url, html))
+
+    def queue_urls(self, new_urls):
+        """Put the accepted (url, priority) pairs to follow in the empty
+        queue, once
+        """
+        # the empty queue spills to disk, putting never blocks
+        with self.metrics.time("enqueue"):
+            for new_url, priority in new_urls:
+                if not self.accept(new_url):
+                    continue
+                if not self.queued.add(self.url_key(new_url)):
+                    self.metrics.count("dropped_urls_total", 1, "duplicate")
+                    continue
+                self.empty_queue.put(new_url, priority)
+                if self.checkpoint is not None:
+                    self.checkpoint.queued(new_url, self.level + 1)
+
+    def follow_parsed(self, base_url, future):
+        """Queue the urls returned by the parse pool"""
+        self.queue_urls(self.prioritize(base_url, future.result()[0],
+                                        self.level + 1))
+
+    def fetch(self, url, rp=None):
+        """Download the url, unless rejected by the robotparser, and mark it as
+        visited. Return the raw html or None if it is not read.
+        """
+        try:
+            # check robots file
+            if rp is not None and rp.can_fetch("*", url) is False:
+                logging.info("robots.txt from %s rejected spider" % url)
+                self.metrics.count("dropped_urls_total", 1, "robots")
+                if self.checkpoint is not None:
+                    self.checkpoint.drop(url)
+                return None
+        except Exception:
+            logging.exception("Ignoring robots.txt file")
+
+        start = time.time()
+        try:
+            # download the raw html - note urls contains 'http' or 'https'
+            html = self.backend.urlread(url, timeout=self.timeout)
+            logging.info("Downloaded url, %s" % url)
+            self.observe(url, start)
+        except Exception as e:
+            logging.exception("Unable to download url, %s" % url)
+            self.observe(url, start, e)
+            html = None
+
+        # note as visited - the cache is threadsafe
+        self.visited.add(self.url_key(url))
+        if self.checkpoint is not None:
+            self.checkpoint.visit(url, html is not None)
+
+        return html
+
+    def increment(self):
+        """Count a read url and return False once max_urls is exceeded"""
+        with self.lock:
+            self.total_url_count += 1
+            if self.shared_count is None:
+                return self.total_url_count <= self.max_urls
+
+        with self.shared_count.get_lock():
+            self.shared_count.value += 1
+            return self.shared_count.value <= self.max_urls
+
+    def follow(self, base_url, url, html, depth=None):
+        """Parse the html of the url and return the list of (absolute url,
+        priority) pairs to follow next, at the given depth, the next level by
+        default.
+        """
+        if depth is None:
+            depth = self.level + 1
 
-            try:
-                if not self.thread_safe_parse:
-                    follow_links = self.parse(url, html)
-                else:
-                    with self.lock:
-                        follow_links = self.parse(url, html)
-            except Exception:
-                logging.exception("Unable to parse url, %s" % url)
-                follow_links = False
+        if self.parse_pool is not None:
+            new_urls = self.parse_pool.parse(url, html,
+                                             self.backend.not_modified(url))
+            return self.prioritize(base_url, new_urls, depth)
 
-            try:
-                if follow_links is None:    # nothing is returned
-                    # extract all new urls, when parse returns nothing
-                    # new_urls are with respect to current html page
-                    # must use urljoin to form the absolute url below
-                    new_urls = self.backend.urlparse(html)
-                elif follow_links is False:     # user initiated termination
-                    new_urls = []
-                else:
-                    # user provided urls returned by self.parse
-                    new_urls = follow_links
-
-                # to limit the number of urls added by each thread the work is
-                # reduced instead of trying to coordinate the threads somehow
-                qsize = self.max_urls_per_level     # queue size
-                nthreads = threading.active_count() - 1     # not main thread
-                urls_per_thread = qsize // nthreads
-
-                # number of urls sampled cannot be larger than population
-                if urls_per_thread > len(new_urls):
-                    urls_per_thread = len(new_urls)
-
-                for new_url in random.sample(new_urls, urls_per_thread):
-                    try:
-                        # print(urljoin(base_url, new_url))
-                        self.empty_queue.put(urljoin(base_url, new_url),
-                                             timeout=0.1)
-                    except Full:
-                        logging.info("Queue is full, skipping remaining urls")
-                        break
-            except Exception:
-                logging.exception("Unable to extract urls from url, %s" % url)
+        follow_links = self.safe_parse(url, html)
 
-            # wait to respect server before jumping expect if one url only
-            if self.respect_server and len(urls) > 1:
-                logging.info("Respecting server at, %s" % ip)
-                try:
-                    # python 3.6 method
-                    delay = rp.crawl_delay("*")
-                    self.wait(delay=delay)
-                except (NameError, AttributeError):
-                    logging.info("Unable to extract delay time from robots.txt")
-                    self.wait()
+        try:
+            if follow_links is None:    # nothing is returned
+                # extract all new urls, when parse returns nothing
+                # new_urls are with respect to current html page
+                with self.metrics.time("extract"):
+                    new_urls = self.backend.urlparse(html)
+            elif follow_links is False:     # user initiated termination
+                new_urls = []
+            else:
+                # user provided urls returned by self.parse
+                new_urls = follow_links
+
+            # must use urljoin to form the absolute url
+            return self.prioritize(base_url, new_urls, depth)
+        except Exception:
+            logging.exception("Unable to extract urls from url, %s" % url)
+            return []
+
+    def prioritize(self, base_url, new_urls, depth):
+        """Return the (absolute url, priority) pairs of the urls, either urls
+        or (url, priority) pairs returned by parse. The urls without a
+        priority are scored.
+        """
+        pairs = []
+        for new_url in new_urls:
+            priority = None
+            if isinstance(new_url, (tuple, list)):
+                new_url, priority = new_url
+
+            new_url = self.absolute_url(base_url, new_url)
+            if priority is None:
+                priority = self.score(new_url, depth)
+            pairs.append((new_url, priority))
+        return pairs
+
+    def score(self, url, depth):
+        """Return the priority of an url to follow, at the depth, i.e. the
+        number of links followed from a start url. The urls of higher
+        priority are read first.
+
+        By default all the urls have the same priority 0 and are read in the
+        order they are found. Override this method for focused crawls, e.g.
+        to favor urls matching a pattern or close to the start urls. Priorities
+        should take a few distinct values, e.g. small integers, the level
+        queues keep up to 32 of them apart and queue the urls of any other
+        priority with the nearest one, see arackpy.frontier.PrioritySpillQueue.
+        """
+        return 0
 
     @abstractmethod
     def parse(self, url, html):
@@ -461,6 +1126,15 @@ class Spider(object):
         for example. If parse returns False, all urls are ignored. Note, by
         default methods implicitly return None if nothing else is.
 
+        The list can also hold (url, priority) pairs, e.g. a priority based on
+        the anchor text of the link. The urls of higher priority are read
+        first, the urls without a priority are scored by the score method.
+
+        Parse can also be a generator yielding the items scraped from the
+        html, e.g. dicts, which are written to the export_path file. Yielded
+        urls or (url, priority) pairs are followed as if returned in a list,
+        all the urls of the html are followed if none is yielded.
+
         .. attention::
             The user defined urls in the list must all be absolute urls.
 
@@ -472,8 +1146,143 @@ class Spider(object):
         """
         raise NotImplementedError("implement")
 
+    def get_parser(self, url):
+        """Return the unchanged method for the urls that have not changed and
+        the parse method otherwise. Call once per read url.
+        """
+        if self.backend.not_modified(url):
+            return self.unchanged
+        return self.parse
+
+    def unchanged(self, url, html):
+        """Called instead of parse for the urls that have not changed since
+        the last crawl when the http cache is enabled.
+
+        By default parse is called. Override this method to skip the pages
+        already processed, returning None to still follow the urls of the
+        page or False to ignore them.
+        """
+        return self.parse(url, html)
+
+    def safe_parse(self, url, html, parse=None):
+        """Call parse, or unchanged for the urls that have not changed, under
+        the lock if thread_safe_parse is set, and return False if it raises an
+        exception.
+        """
+        if parse is None:
+            parse = self.get_parser(url)
+
+        try:
+            with self.metrics.time("parse"):
+                if not self.thread_safe_parse:
+                    return self.export_items(parse(url, html))
+                else:
+                    with self.lock:
+                        return self.export_items(parse(url, html))
+        except Exception:
+            logging.exception("Unable to parse url, %s" % url)
+            return False
+
+    def export_items(self, follow_links):
+        """Export the items of a parse generator and return the urls it
+        yields, or what it returns. Any other value of parse is returned
+        unchanged.
+        """
+        if not inspect.isgenerator(follow_links):
+            return follow_links
+
+        urls = []
+        while True:
+            try:
+                value = next(follow_links)
+            except StopIteration as e:
+                returned = getattr(e, "value", None)
+                break
+
+            if is_url(value):
+                urls.append(value)
+            else:
+                self.export(value)
+
+        if returned is False:
+            return False
+        if returned is not None:
+            urls = list(returned) + urls
+        return urls or None
+
+    def export(self, item):
+        """Queue an item to be written to the export_path file, waiting while
+        the export queue is full. Items are dropped if export_path is not set.
+        """
+        if self.items is None:
+            logging.debug("Dropping item, export_path is not set")
+            return
+        self.items.put(item)
+
+    def get_delay(self, rp=None):
+        """Return the delay in seconds from the robotparser if specified and
+        None otherwise.
+        """
+        try:
+            # python 3.6 method
+            return rp.crawl_delay("*")
+        except AttributeError:
+            logging.info("Unable to extract delay time from robots.txt")
+            return None
+
+    def get_wait_time(self):
+        """Return a wait time randomly selected from the wait_time_range"""
+        return random.uniform(*self.wait_time_range)
+
+    def get_host_delay(self, url, rp=None):
+        """Return the delay in seconds before the next url of the same host,
+        the crawl delay of the robotparser if specified, at least, when auto
+        throttle is enabled and a random wait time otherwise.
+        """
+        delay = self.get_delay(rp)
+        if self.throttle is not None:
+            return self.throttle.delay(self.get_tld(url), delay)
+
+        if delay is None:
+            delay = self.get_wait_time()
+        return delay
+
+    def observe(self, url, start, error=None):
+        """Record the response time of the url in the metrics and report it
+        to the auto throttle, the error is the exception raised reading the
+        url, if any.
+        """
+        latency = time.time() - start
+        host = self.get_tld(url)
+
+        status, retry_after = 200, None
+        if error is not None:
+            # the code of http errors, not set for connection errors
+            status = getattr(error, "code", None)
+            headers = getattr(error, "headers", None) or {}
+            try:
+                retry_after = headers.get("Retry-After")
+            except AttributeError:
+                pass
+
+        metrics = self.metrics
+        metrics.observe("stage_seconds", latency, "fetch")
+        metrics.observe("host_fetch_seconds", latency, host)
+        metrics.count("responses_total", 1, str(status or "error"))
+
+        if self.throttle is not None:
+            self.throttle.observe(host, latency, status or 500, retry_after)
+
+    def host_delays(self):
+        """Return the current wait time of every host read, empty unless
+        auto_throttle is enabled.
+        """
+        if self.throttle is None:
+            return {}
+        return self.throttle.delays()
+
     def wait(self, delay=None):
         """Enter the total delay time in seconds"""
         if delay is None:
-            delay = random.randrange(*self.wait_time_range)
+            delay = self.get_wait_time()
         time.sleep(delay)
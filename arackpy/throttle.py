@@ -0,0 +1,132 @@
+"""Adaptive per host delays between two urls of the same host.
+
+A fixed wait time throttles fast servers as much as slow ones. The auto
+throttle adjusts the delay of every host from the latency of its responses
+instead. The delay moves half way towards a target delay after every response:
+
+    latency / target_concurrency
+        By default, so that about target_concurrency requests would be in
+        flight if the spider read the host continuously.
+
+    max(delay, latency) * latency / target_latency
+        If a target latency is set, the delay grows while the server answers
+        slower than the target and shrinks while it answers faster.
+
+Error responses never lower the delay. A 429 Too Many Requests or 503 Service
+Unavailable response doubles it, or sets it to the Retry-After header value if
+larger. The crawl delay of the robots.txt file, if any, is always a floor.
+"""
+
+from __future__ import absolute_import, division
+
+from email.utils import parsedate_tz, mktime_tz
+import threading
+import time
+
+
+BACKOFF_CODES = (429, 503)
+
+
+def parse_retry_after(value):
+    """Return the Retry-After header value in seconds or None"""
+    if not value:
+        return None
+
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+
+    date = parsedate_tz(value)
+    if date is None:
+        return None
+    return max(0, mktime_tz(date) - time.time())
+
+
+class AutoThrottle(object):
+    """Thread safe per host delay controller.
+
+    :Parameters:
+        `start_delay` : float
+            The delay of a host before any response is received.
+
+        `min_delay` : float
+            The smallest delay.
+
+        `max_delay` : float
+            The largest delay, except when a Retry-After header asks for more.
+
+        `target_concurrency` : float
+            The average number of requests in flight to a host the delay aims
+            at.
+
+        `target_latency` : float
+            If set, the response time in seconds the delay aims at instead.
+    """
+
+    def __init__(self, start_delay=1.0, min_delay=0.0, max_delay=60.0,
+                 target_concurrency=1.0, target_latency=None):
+        self.start_delay = start_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.target_concurrency = target_concurrency
+        self.target_latency = target_latency
+
+        # host -> current delay
+        self.host_delays = {}
+        self.lock = threading.Lock()
+
+    def delay(self, host, floor=None):
+        """Return the delay before the next url of the host, at least the
+        floor, e.g. the crawl delay of robots.txt.
+        """
+        with self.lock:
+            delay = self.host_delays.get(host, self.start_delay)
+        return max(delay, floor or 0)
+
+    def delays(self):
+        """Return a copy of the current delay of every host"""
+        with self.lock:
+            return dict(self.host_delays)
+
+    def observe(self, host, latency, status=200, retry_after=None):
+        """Update the delay of the host from a response.
+
+        :Parameters:
+            `host` : str
+                The host of the read url.
+
+            `latency` : float
+                The time in seconds taken to read the url.
+
+            `status` : int
+                The http status code of the response.
+
+            `retry_after` : str
+                The Retry-After header of the response, if any.
+        """
+        with self.lock:
+            delay = self.host_delays.get(host, self.start_delay)
+
+            if status in BACKOFF_CODES:
+                new_delay = min(max(2 * delay, self.start_delay),
+                                self.max_delay)
+                seconds = parse_retry_after(retry_after)
+                if seconds is not None:
+                    new_delay = max(new_delay, seconds)
+            else:
+                if self.target_latency:
+                    target = (max(delay, latency) * latency /
+                              self.target_latency)
+                else:
+                    target = latency / self.target_concurrency
+
+                new_delay = (delay + target) / 2
+                new_delay = min(max(new_delay, self.min_delay),
+                                self.max_delay)
+
+                # slow error responses are no sign the server got faster
+                if status >= 400 and new_delay < delay:
+                    new_delay = delay
+
+            self.host_delays[host] = new_delay
+            return new_delay
@@ -1,10 +1,28 @@
+import binascii
+import hashlib
+import os
+import re
+
 try:
     from HTMLParser import HTMLParser
     import urllib2
-    from urlparse import urlsplit, urljoin
+    from urlparse import urlsplit, urlunsplit, urljoin
+    from urllib import unquote
 except ImportError:
     from html.parser import HTMLParser
-    from urllib.parse import urlsplit, urljoin
+    from urllib.parse import urlsplit, urlunsplit, urljoin, unquote
+
+try:
+    from html import unescape
+except ImportError:
+    # py27
+    unescape = HTMLParser().unescape
+
+try:
+    from lxml.html import fromstring
+    from lxml.etree import HTMLPullParser, ParserError, XMLSyntaxError
+except ImportError:
+    fromstring = None
 
 
 def is_absolute(url):
@@ -12,6 +30,108 @@ def is_absolute(url):
     return bool(urlsplit(url).netloc)
 
 
+def fingerprint(url, bits=64):
+    """Return an integer hash of the url with the given number of bits, up to
+    128 bits.
+    """
+    digest = hashlib.md5(url.encode("utf-8")).digest()
+    return int(binascii.hexlify(digest[:bits // 8]), 16)
+
+
+def write_file(path, data, tmp_path=None):
+    """Write the bytes to a temporary file renamed over the file, so that a
+    reader or a crash never leaves a partially written file.
+    """
+    if tmp_path is None:
+        tmp_path = path + ".tmp"
+
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    try:
+        os.replace(tmp_path, path)
+    except AttributeError:
+        # py27, not atomic on windows
+        os.rename(tmp_path, path)
+
+
+# query parameters removed by canonicalize, a trailing * matches any suffix
+TRACKING_PARAMS = ("utm_*", "gclid", "dclid", "fbclid", "msclkid", "mc_cid",
+                   "mc_eid", "_ga", "yclid", "igshid")
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def remove_dot_segments(path):
+    """Resolve the . and .. segments of the path, see RFC 3986 5.2.4"""
+    if "." not in path:
+        return path
+
+    segments = []
+    for segment in path.split("/"):
+        if segment == "..":
+            if len(segments) > 1:
+                segments.pop()
+        elif segment != ".":
+            segments.append(segment)
+
+    # keep the trailing slash of a path ending with a dot segment
+    if path.split("/")[-1] in (".", ".."):
+        segments.append("")
+
+    return "/".join(segments) or "/"
+
+
+def is_stripped(name, strip_params):
+    name = unquote(name)
+    for param in strip_params:
+        if param.endswith("*"):
+            if name.startswith(param[:-1]):
+                return True
+        elif name == param:
+            return True
+    return False
+
+
+def canonicalize(url, strip_params=TRACKING_PARAMS):
+    """Return the canonical form of the url so that equivalent urls are read
+    once. The scheme and host are lowercased, the default port is dropped,
+    dot segments are resolved, the fragment is removed and the query
+    parameters are sorted, without the ones matching strip_params. Invalid
+    urls are returned unchanged.
+
+    >>> canonicalize("HTTP://Host:80/a/./b/../c?y=2&utm_source=x&x=1#frag")
+    'http://host/a/c?x=1&y=2'
+    """
+    try:
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        host = parts.hostname or ""
+        port = parts.port
+    except ValueError:
+        return url
+
+    if not host:
+        return url
+
+    netloc = host
+    if ":" in host:
+        netloc = "[%s]" % host    # ipv6
+    if port is not None and DEFAULT_PORTS.get(scheme) != port:
+        netloc = "%s:%s" % (netloc, port)
+    if "@" in parts.netloc:
+        netloc = "%s@%s" % (parts.netloc.rsplit("@", 1)[0], netloc)
+
+    path = remove_dot_segments(parts.path) or "/"
+
+    query = parts.query
+    if query:
+        params = [param for param in query.split("&") if param and not
+                  is_stripped(param.split("=", 1)[0], strip_params)]
+        query = "&".join(sorted(params))
+
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
 def urlopentorr(url):
     proxy_support = urllib2.ProxyHandler({"http": "127.0.0.1:8118"})
     opener = urllib2.build_opener(proxy_support)
@@ -19,25 +139,210 @@ def urlopentorr(url):
     return opener.open(url).read()
 
 
-class AnchorTagParser(HTMLParser):
-    """Native url anchor tag parser"""
+class LinkCollector(object):
+    """Collects the urls of the link tags seen by a parser.
+
+    Besides anchor tags, the href of area tags and of link tags with a 'next'
+    relation are collected. If the page has a base tag, the urls are joined
+    with its href.
+    """
 
     def __init__(self):
-        HTMLParser.__init__(self)
         self.urls = set()
+        self.base = None
 
-    def handle_starttag(self, tag, attrs):
-        if tag == "a":
-            for name, value in attrs:
-                if name == "href":
-                    self.urls.add(value)
+    def add_tag(self, tag, attrs):
+        href = attrs.get("href")
+        if not href:
+            return
+
+        if tag == "base":
+            if self.base is None:
+                self.base = href
+        elif tag != "link" or is_next(attrs.get("rel")):
+            self.urls.add(href)
+
+    def links(self):
+        """Return the urls collected so far and clear them"""
+        urls = resolve_base(self.urls, self.base)
+        self.urls = set()
+        return urls
 
     def parse(self, html):
-        """Parse and extract all anchor tags"""
+        """Parse and extract all link tags"""
         self.feed(html)
-        urls = self.urls.copy()
-        self.urls.clear()
+        self.close()
+        return self.links()
+
 
-        # print urls
+class AnchorTagParser(LinkCollector, HTMLParser):
+    """Native url anchor tag parser.
+
+    The parser keeps state, use one parser per page or per thread. The html
+    can be fed incrementally, in chunks.
+    """
+
+    def __init__(self):
+        HTMLParser.__init__(self)
+        LinkCollector.__init__(self)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("a", "area", "link", "base"):
+            self.add_tag(tag, dict(attrs))
+
+    def parse(self, html):
+        urls = LinkCollector.parse(self, html)
+        self.reset()
+        self.base = None
 
         return urls
+
+
+TAG_RE = re.compile(r"<(a|area|link|base)\s([^>]*)>", re.IGNORECASE)
+
+ATTR_RE = re.compile(r"""([^\s=/>]+)\s*=\s*"""
+                     r"""(?:"([^"]*)"|'([^']*)'|([^\s>]+))""")
+
+
+class RegexLinkParser(LinkCollector):
+    """Url parser using precompiled regular expressions. This is the fastest
+    strategy but tags inside comments and scripts are not skipped.
+
+    The html can be fed incrementally, a tag split between two chunks is kept
+    until the next chunk completes it.
+    """
+
+    # longest incomplete tag kept between two chunks
+    max_tail = 65536
+
+    def __init__(self):
+        LinkCollector.__init__(self)
+        self.tail = ""
+
+    def feed(self, html):
+        html = self.tail + html
+        self.tail = ""
+
+        start = html.rfind("<")
+        if start != -1 and html.find(">", start) == -1:
+            html, tail = html[:start], html[start:]
+            if len(tail) <= self.max_tail:
+                self.tail = tail
+
+        for tag, attr_text in TAG_RE.findall(html):
+            attrs = {}
+            for name, dquoted, squoted, unquoted in ATTR_RE.findall(attr_text):
+                attrs[name.lower()] = dquoted or squoted or unquoted
+
+            href = attrs.get("href")
+            if href and "&" in href:
+                attrs["href"] = unescape(href)
+
+            self.add_tag(tag.lower(), attrs)
+
+    def close(self):
+        self.tail = ""
+
+
+class LxmlLinkParser(LinkCollector):
+    """Url parser using the lxml pull parser, requires the lxml module.
+
+    Elements are discarded once parsed, so memory usage does not grow with
+    the size of the html fed incrementally.
+    """
+
+    def __init__(self):
+        LinkCollector.__init__(self)
+        self.parser = HTMLPullParser(events=("end",))
+
+    def read_events(self):
+        for _, element in self.parser.read_events():
+            tag = element.tag
+            if tag in ("a", "area", "link", "base"):
+                self.add_tag(tag, element.attrib)
+
+            # free the parsed elements
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
+    def feed(self, html):
+        self.parser.feed(html)
+        self.read_events()
+
+    def close(self):
+        try:
+            self.parser.close()
+        except XMLSyntaxError:   # empty document
+            pass
+        self.read_events()
+
+
+def is_next(rel):
+    return bool(rel) and "next" in rel.lower().split()
+
+
+def resolve_base(urls, base):
+    if not base:
+        return set(urls)
+    return set(urljoin(base, url) for url in urls)
+
+
+def extract_links_html(html):
+    """Extract the urls using the native html parser"""
+    return AnchorTagParser().parse(html)
+
+
+def extract_links_regex(html):
+    """Extract the urls using precompiled regular expressions"""
+    return RegexLinkParser().parse(html)
+
+
+def extract_links_lxml(html):
+    """Extract the urls using lxml, requires the lxml module"""
+    try:
+        tree = fromstring(html)
+    except (ParserError, ValueError):     # empty or xml declared document
+        return set()
+
+    urls = tree.xpath("//a/@href | //area/@href")
+    urls.extend(link.get("href") for link in tree.xpath("//link[@href]")
+                if is_next(link.get("rel")))
+    base = tree.xpath("//base/@href")
+
+    return resolve_base(urls, base[0] if base else None)
+
+
+# mapping between name and link extraction function
+LINK_EXTRACTORS = {"html": extract_links_html,
+                   "regex": extract_links_regex,
+                   "lxml": extract_links_lxml if fromstring else None,
+                   }
+
+LINK_EXTRACTORS["auto"] = LINK_EXTRACTORS["lxml"] or extract_links_html
+
+# mapping between name and incremental link parser class
+LINK_PARSERS = {"html": AnchorTagParser,
+                "regex": RegexLinkParser,
+                "lxml": LxmlLinkParser if fromstring else None,
+                }
+
+LINK_PARSERS["auto"] = LINK_PARSERS["lxml"] or AnchorTagParser
+
+
+def get_link_extractor(name):
+    """Return the link extraction function by name, 'auto' selects lxml if
+    it is installed and the native html parser otherwise.
+    """
+    extractor = LINK_EXTRACTORS.get(name)
+    if extractor is None:
+        raise ValueError("%s link extractor unavailable" % name)
+    return extractor
+
+
+def get_link_parser(name):
+    """Return a new incremental link parser by name, see get_link_extractor"""
+    parser_class = LINK_PARSERS.get(name)
+    if parser_class is None:
+        raise ValueError("%s link parser unavailable" % name)
+    return parser_class()
@@ -0,0 +1,197 @@
+"""Caches used by the spider to keep track of visited urls.
+
+Every cache supports constant time membership testing and is safe to share
+between the reader threads. Two implementations are available:
+
+    `bloomfilter`
+        A scalable bloom filter. Memory usage is a few bits per url and the
+        filter grows as more urls are added. A small fraction of urls, defined
+        by the error rate, may be reported as visited when they are not.
+
+    `fingerprint`
+        An exact set of 64 bit url fingerprints. Uses more memory than the
+        bloom filter but never reports a false positive.
+"""
+
+from __future__ import division, absolute_import
+
+import math
+import threading
+
+from arackpy.utils import fingerprint
+
+
+class BloomFilter(object):
+    """A fixed size bloom filter.
+
+    The number of bits and hash functions are derived from the capacity and
+    the desired false positive rate. Adding more urls than the capacity
+    increases the false positive rate beyond the specified value.
+
+    :Parameters:
+        `capacity` : int
+            The number of urls the filter is sized for.
+
+        `error_rate` : float
+            The false positive rate once the filter is at capacity.
+    """
+
+    def __init__(self, capacity, error_rate):
+        assert capacity > 0 and 0 < error_rate < 1
+
+        self.capacity = capacity
+        self.error_rate = error_rate
+
+        ln2 = math.log(2)
+        self.nbits = int(math.ceil(-capacity * math.log(error_rate) /
+                                   (ln2 * ln2)))
+        self.nhashes = max(1, int(round(self.nbits / capacity * ln2)))
+        self.bits = bytearray((self.nbits + 7) // 8)
+        self.count = 0
+
+    def _indexes(self, url):
+        # double hashing, two 64 bit values generate all k indexes
+        h = fingerprint(url, bits=128)
+        h1, h2 = h >> 64, h & 0xFFFFFFFFFFFFFFFF
+        for i in range(self.nhashes):
+            yield (h1 + i * h2) % self.nbits
+
+    def add(self, url):
+        """Add the url and return True if it was not already present"""
+        added = False
+        for i in self._indexes(url):
+            mask = 1 << (i & 7)
+            if not self.bits[i >> 3] & mask:
+                self.bits[i >> 3] |= mask
+                added = True
+
+        if added:
+            self.count += 1
+
+        return added
+
+    def __contains__(self, url):
+        bits = self.bits
+        return all(bits[i >> 3] & (1 << (i & 7)) for i in self._indexes(url))
+
+    def __len__(self):
+        return self.count
+
+
+class ScalableBloomFilter(object):
+    """A bloom filter that grows when it reaches capacity.
+
+    A new and larger filter with a tighter error rate is stacked on top of the
+    existing ones once the current filter is full, so that the overall false
+    positive rate stays close to the requested one. See Almeida et al.,
+    "Scalable Bloom Filters", 2007.
+
+    :Parameters:
+        `capacity` : int
+            The initial number of urls the first filter is sized for.
+
+        `error_rate` : float
+            The upper bound of the overall false positive rate.
+
+        `growth` : int
+            The capacity multiplier applied to every new filter.
+
+        `tightening` : float
+            The error rate multiplier applied to every new filter.
+    """
+
+    def __init__(self, capacity=2000, error_rate=0.001, growth=2,
+                 tightening=0.5):
+        self.initial_capacity = capacity
+        self.error_rate = error_rate
+        self.growth = growth
+        self.tightening = tightening
+
+        self.filters = []
+        self.lock = threading.Lock()
+
+        # the sum of the geometric series of error rates is the overall rate
+        self._add_filter(capacity, error_rate * (1 - tightening))
+
+    def _add_filter(self, capacity, error_rate):
+        self.filters.append(BloomFilter(capacity, error_rate))
+
+    def add(self, url):
+        """Add the url and return True if it was not already present"""
+        with self.lock:
+            if any(url in f for f in self.filters):
+                return False
+
+            current = self.filters[-1]
+            if current.count >= current.capacity:
+                self._add_filter(current.capacity * self.growth,
+                                 current.error_rate * self.tightening)
+                current = self.filters[-1]
+
+            return current.add(url)
+
+    def __getstate__(self):
+        # picklable for the crawl checkpoints
+        with self.lock:
+            state = self.__dict__.copy()
+            state["filters"] = list(self.filters)
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def __contains__(self, url):
+        # newer filters hold more urls, check them first
+        return any(url in f for f in reversed(self.filters))
+
+    def __len__(self):
+        return sum(len(f) for f in self.filters)
+
+
+class FingerprintSet(object):
+    """An exact set of 64 bit url fingerprints.
+
+    :Parameters:
+        `capacity` : int
+            Unused, an exact set grows without bounds.
+
+        `error_rate` : float
+            Unused, accepted for compatibility with the bloom filter. The
+            probability of two urls sharing a fingerprint is negligible for
+            any practical crawl.
+    """
+
+    def __init__(self, capacity=None, error_rate=None):
+        self.fingerprints = set()
+        self.lock = threading.Lock()
+
+    def add(self, url):
+        """Add the url and return True if it was not already present"""
+        fp = fingerprint(url)
+        with self.lock:
+            if fp in self.fingerprints:
+                return False
+            self.fingerprints.add(fp)
+            return True
+
+    def __getstate__(self):
+        with self.lock:
+            return {"fingerprints": set(self.fingerprints)}
+
+    def __setstate__(self, state):
+        self.fingerprints = state["fingerprints"]
+        self.lock = threading.Lock()
+
+    def __contains__(self, url):
+        return fingerprint(url) in self.fingerprints
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+
+# mapping between name and class
+VISITED_CACHES = {"bloomfilter": ScalableBloomFilter,
+                  "fingerprint": FingerprintSet,
+                  }
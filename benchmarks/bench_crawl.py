@@ -0,0 +1,275 @@
+"""Measure the crawl throughput of every backend and engine on a synthetic web
+graph served from localhost, see benchmarks/webgraph.py.
+
+Every crawl runs in its own process, so that the memory high-water mark and
+the cpu time are those of the crawl alone, while the web graph is served from
+this process. The results are printed as a table and, with --output, written
+as json along with the commit and the graph, so that two commits can be
+compared:
+
+    $ python benchmarks/bench_crawl.py --output base.json
+    $ git checkout feature
+    $ python benchmarks/bench_crawl.py --compare base.json
+
+The fetch latencies are estimated from the histogram buckets of the spider
+metrics, see arackpy.metrics.
+"""
+
+from __future__ import print_function, division
+
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    # windows
+    resource = None
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from webgraph import WebGraph, WebGraphServer   # noqa: E402
+
+
+# name -> (backend, backend kwargs, spider attributes)
+BACKENDS = {"default": ("default", {}, {}),
+            "stream": ("default", {"stream": True}, {}),
+            "cache": ("default", {}, {"http_cache_path": True}),
+            }
+
+ENGINES = ["threads", "frontier", "asyncio", "processes"]
+
+
+def usage():
+    """Return the cpu time in seconds and the max resident memory in MB of
+    this process and its children
+    """
+    if resource is None:
+        times = os.times()
+        return times[0] + times[1] + times[2] + times[3], None
+
+    rss_unit = 2 ** 20 if sys.platform == "darwin" else 2 ** 10
+    cpu, rss = 0.0, 0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        ru = resource.getrusage(who)
+        cpu += ru.ru_utime + ru.ru_stime
+        rss = max(rss, ru.ru_maxrss)
+    return cpu, rss / rss_unit
+
+
+def crawl(config):
+    """Run one crawl, in the worker process, and return its result"""
+    from arackpy.spider import Spider
+
+    # errors of the synthetic graph are expected
+    logging.disable(logging.ERROR)
+
+    backend, backend_kwargs, attributes = BACKENDS[config["backend"]]
+    attributes = dict(attributes)
+
+    cache_dir = None
+    if attributes.get("http_cache_path"):
+        cache_dir = tempfile.mkdtemp(prefix="arackpy-bench-")
+        attributes["http_cache_path"] = cache_dir
+
+    class BenchSpider(Spider):
+        start_urls = config["start_urls"]
+        respect_server = False
+        max_levels = config["max_levels"]
+        concurrency = config["concurrency"]
+        engine = config["engine"]
+
+        def parse(self, url, html):
+            pass
+
+    for name, value in attributes.items():
+        setattr(BenchSpider, name, value)
+
+    try:
+        spider = BenchSpider(backend, **backend_kwargs)
+        cpu, _ = usage()
+        start = time.time()
+        spider.crawl(config["max_urls"])
+        seconds = time.time() - start
+        cpu = usage()[0] - cpu
+    finally:
+        if cache_dir is not None:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    stats = spider.stats()
+    fetch = stats.get("stage_seconds", {}).get("fetch", {})
+    responses = stats.get("responses_total", {})
+    pages = spider.total_url_count
+
+    return {"backend": config["backend"],
+            "engine": config["engine"],
+            "pages": pages,
+            "seconds": seconds,
+            "pages_per_sec": pages / seconds if seconds else None,
+            "p50": fetch.get("p50"),
+            "p99": fetch.get("p99"),
+            "max_rss_mb": usage()[1],
+            "cpu_per_page_ms": 1000 * cpu / pages if pages else None,
+            "errors": sum(n for code, n in responses.items() if code != "200"),
+            "downloaded_mb": stats.get("downloaded_bytes_total", 0) / 2 ** 20,
+            }
+
+
+def run_worker(config):
+    """Run one crawl in a new process and return its result"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [ROOT_DIR] + [p for p in [env.get("PYTHONPATH")] if p])
+
+    output = subprocess.check_output(
+        [sys.executable, os.path.abspath(__file__), "--worker",
+         json.dumps(config)], env=env)
+    return json.loads(output.decode("utf-8").strip().splitlines()[-1])
+
+
+def commit():
+    try:
+        output = subprocess.check_output(["git", "rev-parse", "HEAD"],
+                                         cwd=ROOT_DIR,
+                                         stderr=subprocess.STDOUT)
+        return output.decode("ascii").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def fmt(value, spec):
+    return "-" if value is None else spec % value
+
+
+def print_results(results):
+    print("%-8s %-10s %6s %9s %8s %8s %9s %9s %6s" % (
+        "backend", "engine", "pages", "pages/s", "p50 ms", "p99 ms",
+        "rss MB", "cpu ms/p", "errors"))
+    for r in results:
+        print("%-8s %-10s %6s %9s %8s %8s %9s %9s %6s" % (
+            r["backend"], r["engine"], r["pages"],
+            fmt(r["pages_per_sec"], "%.1f"),
+            fmt(r["p50"] and 1000 * r["p50"], "%.1f"),
+            fmt(r["p99"] and 1000 * r["p99"], "%.1f"),
+            fmt(r["max_rss_mb"], "%.1f"),
+            fmt(r["cpu_per_page_ms"], "%.2f"), r["errors"]))
+
+
+def mean_by_key(results, field):
+    values = {}
+    for r in results:
+        if r.get(field) is not None:
+            values.setdefault((r["backend"], r["engine"]), []).append(r[field])
+    return dict((key, sum(v) / len(v)) for key, v in values.items())
+
+
+def compare(results, baseline):
+    """Print the change of every result relative to the baseline"""
+    print("\ncompared to %s" % (baseline.get("commit") or "baseline"))
+    print("%-8s %-10s %10s %10s %10s" % ("backend", "engine", "pages/s",
+                                         "p99", "cpu/page"))
+    fields = ("pages_per_sec", "p99", "cpu_per_page_ms")
+    new = [mean_by_key(results, field) for field in fields]
+    old = [mean_by_key(baseline["results"], field) for field in fields]
+
+    for key in sorted(new[0]):
+        changes = []
+        for n, o in zip(new, old):
+            if n.get(key) is None or not o.get(key):
+                changes.append("-")
+            else:
+                changes.append("%+.1f%%" % (100 * (n[key] / o[key] - 1)))
+        print("%-8s %-10s %10s %10s %10s" % (key + tuple(changes)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--hosts", type=int, default=8)
+    parser.add_argument("--fanout", type=int, default=8)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--page-size", type=int, default=16384)
+    parser.add_argument("--latency", type=float, default=0.005,
+                        help="seconds a host takes to answer")
+    parser.add_argument("--latency-step", type=float, default=0.001,
+                        help="latency added per host")
+    parser.add_argument("--jitter", type=float, default=0.005)
+    parser.add_argument("--error-rate", type=float, default=0.01)
+    parser.add_argument("--cross-host", type=float, default=0.2)
+    parser.add_argument("--disallow", action="append", default=[],
+                        help="path prefix disallowed by robots.txt")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-urls", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--backends", default="default,stream",
+                        help="any of %s" % ",".join(sorted(BACKENDS)))
+    parser.add_argument("--engines", default=",".join(ENGINES))
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--output", help="write the results to a json file")
+    parser.add_argument("--compare", help="json results to compare to")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(crawl(json.loads(args.worker))))
+        return
+
+    graph = WebGraph(args.hosts, args.fanout, args.depth, args.page_size,
+                     args.latency, args.latency_step, args.jitter,
+                     args.error_rate, args.cross_host, args.disallow,
+                     args.seed)
+    server = WebGraphServer(graph).start()
+
+    results = []
+    try:
+        for backend in args.backends.split(","):
+            for engine in args.engines.split(","):
+                for _ in range(args.repeat):
+                    config = {"backend": backend, "engine": engine,
+                              "start_urls": server.start_urls,
+                              "max_levels": args.depth,
+                              "max_urls": args.max_urls,
+                              "concurrency": args.concurrency,
+                              }
+                    try:
+                        results.append(run_worker(config))
+                    except subprocess.CalledProcessError:
+                        print("%s %s crawl failed" % (backend, engine),
+                              file=sys.stderr)
+    finally:
+        server.stop()
+
+    print_results(results)
+
+    report = {"commit": commit(),
+              "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "python": platform.python_version(),
+              "platform": platform.platform(),
+              "graph": graph.to_dict(),
+              "max_urls": args.max_urls,
+              "concurrency": args.concurrency,
+              "results": results,
+              }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
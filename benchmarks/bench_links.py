@@ -0,0 +1,71 @@
+"""Compare the link extraction strategies of arackpy.utils.
+
+Run on a synthetic corpus of pages:
+
+    $ python benchmarks/bench_links.py
+
+or on a corpus of saved html files:
+
+    $ python benchmarks/bench_links.py page1.html page2.html ...
+"""
+
+from __future__ import print_function, division
+
+import io
+import os
+import random
+import sys
+import timeit
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, ROOT_DIR)
+
+from arackpy.utils import LINK_EXTRACTORS   # noqa: E402
+
+
+def synthetic_page(nlinks, seed):
+    rnd = random.Random(seed)
+    parts = ["<html><head><title>page %s</title>" % seed,
+             '<link rel="stylesheet" href="/style.css">',
+             '<script>var x = "<a href=/script>";</script></head><body>']
+    for i in range(nlinks):
+        parts.append('<div class="item"><p>%s</p>' % ("lorem ipsum " * 20))
+        parts.append('<a class="link" href="/page/%s?ref=%s&amp;i=%s">'
+                     'link %s</a></div>' % (rnd.randint(0, 10 ** 6), seed, i,
+                                            i))
+    parts.append('<link rel="next" href="/page/%s/2"></body></html>' % seed)
+    return "".join(parts)
+
+
+def load_corpus(paths):
+    if not paths:
+        return [synthetic_page(nlinks, seed) for seed, nlinks in
+                enumerate([10, 50, 100, 200, 500, 1000, 2000] * 3)]
+
+    corpus = []
+    for path in paths:
+        with io.open(path, encoding="utf-8", errors="replace") as f:
+            corpus.append(f.read())
+    return corpus
+
+
+def main(paths):
+    corpus = load_corpus(paths)
+    size = sum(len(html) for html in corpus) / 1e6
+    print("corpus: %s pages, %.1f MB" % (len(corpus), size))
+
+    for name in sorted(LINK_EXTRACTORS):
+        extractor = LINK_EXTRACTORS[name]
+        if extractor is None or name == "auto":
+            continue
+
+        links = sum(len(extractor(html)) for html in corpus)
+        seconds = min(timeit.repeat(
+            lambda: [extractor(html) for html in corpus], number=1, repeat=3))
+        print("%-6s %8.3f s %8.1f MB/s %8s links" % (name, seconds,
+                                                     size / seconds, links))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
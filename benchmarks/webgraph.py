@@ -0,0 +1,285 @@
+"""A synthetic web graph served from many virtual hosts on localhost.
+
+Every host is a threaded http server listening on its own port of 127.0.0.1,
+so the spider sees as many hosts as there are ports. The pages of a host form
+a tree, page /p/<n> links to the pages /p/<n * fanout + 1> ... of the next
+depth, and a share of the links point to the same page of another host. The
+content of every page, the links and the errors are derived from a seed, so
+that two runs crawl the same graph. Only the latency jitter differs.
+
+Run standalone to browse the graph:
+
+    $ python benchmarks/webgraph.py --hosts 4 --fanout 5 --depth 3
+"""
+
+from __future__ import print_function, division
+
+import argparse
+import hashlib
+import random
+import threading
+import time
+
+try:    # py2
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+except ImportError:     # py3
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+
+
+FILLER = ("Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do "
+          "eiusmod tempor incididunt ut labore et dolore magna aliqua. ")
+
+
+class WebGraph(object):
+    """The shape of the synthetic web graph.
+
+    :Parameters:
+        `hosts` : int
+            The number of virtual hosts.
+
+        `fanout` : int
+            The number of links per page.
+
+        `depth` : int
+            The depth of the page tree of every host, the pages at this depth
+            have no links.
+
+        `page_size` : int
+            The approximate size of a page in bytes.
+
+        `latency` : float
+            The time in seconds a host takes to answer. Every host answers
+            slower than the previous one by latency_step.
+
+        `latency_step` : float
+            The latency added per host index.
+
+        `jitter` : float
+            A random time up to this many seconds added to every answer.
+
+        `error_rate` : float
+            The share of pages answered with a 500 error.
+
+        `cross_host` : float
+            The share of links pointing to another host.
+
+        `disallow` : list
+            The path prefixes disallowed by the robots.txt file of every host.
+
+        `seed` : int
+            The seed of the graph.
+    """
+
+    def __init__(self, hosts=4, fanout=5, depth=3, page_size=8192,
+                 latency=0.0, latency_step=0.0, jitter=0.0, error_rate=0.0,
+                 cross_host=0.2, disallow=(), seed=0):
+        self.hosts = hosts
+        self.fanout = fanout
+        self.depth = depth
+        self.page_size = page_size
+        self.latency = latency
+        self.latency_step = latency_step
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.cross_host = cross_host
+        self.disallow = list(disallow)
+        self.seed = seed
+
+        # pages per host, 1 + fanout + ... + fanout ** depth
+        self.npages = sum(fanout ** d for d in range(depth + 1))
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+    def random(self, *key):
+        """Return a random generator seeded by the graph seed and the key,
+        independent of the hash randomization of python.
+        """
+        key = "-".join(str(k) for k in (self.seed,) + key)
+        digest = hashlib.md5(key.encode("utf-8")).hexdigest()
+        return random.Random(int(digest[:16], 16))
+
+    def robots(self):
+        lines = ["User-agent: *"]
+        lines.extend("Disallow: %s" % path for path in self.disallow)
+        return "\n".join(lines) + "\n"
+
+    def delay(self, host, path):
+        jitter = self.random("jitter", host, path, time.time()).random()
+        return self.latency + host * self.latency_step + jitter * self.jitter
+
+    def is_error(self, host, n):
+        return self.random("error", host, n).random() < self.error_rate
+
+    def links(self, host, n, host_urls):
+        """Return the urls the page n of the host links to"""
+        first = n * self.fanout + 1
+        if first >= self.npages:
+            return []
+
+        rnd = self.random("links", host, n)
+        urls = []
+        for child in range(first, first + self.fanout):
+            target = host
+            if self.hosts > 1 and rnd.random() < self.cross_host:
+                target = rnd.randrange(self.hosts)
+            urls.append("%s/p/%s" % (host_urls[target], child))
+        return urls
+
+    def page(self, host, n, host_urls):
+        links = "".join('<li><a href="%s">page %s</a></li>' % (url, i)
+                        for i, url in enumerate(self.links(host, n,
+                                                           host_urls)))
+        head = ("<html><head><title>host %s page %s</title></head><body>"
+                "<ul>%s</ul>" % (host, n, links))
+        tail = "</body></html>"
+
+        padding = max(0, self.page_size - len(head) - len(tail))
+        text = (FILLER * (padding // len(FILLER) + 1))[:padding]
+        return (head + "<p>%s</p>" % text + tail).encode("utf-8")
+
+
+class GraphHandler(BaseHTTPRequestHandler):
+
+    # keep-alive connections
+    protocol_version = "HTTP/1.1"
+
+    # the headers and the body are written separately, without TCP_NODELAY
+    # the delayed ack of the client adds ~40ms to every response
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        graph = server.graph
+
+        with server.lock:
+            server.requests += 1
+
+        delay = graph.delay(server.index, self.path)
+        if delay > 0:
+            time.sleep(delay)
+
+        if self.path == "/robots.txt":
+            self.reply(200, graph.robots().encode("utf-8"), "text/plain")
+            return
+
+        path = self.path.rstrip("/")
+        if not path:
+            n = 0
+        elif path.startswith("/p/"):
+            try:
+                n = int(path[3:])
+            except ValueError:
+                n = graph.npages
+        else:
+            n = graph.npages
+
+        if n >= graph.npages:
+            self.reply(404, b"not found", "text/plain")
+        elif graph.is_error(server.index, n):
+            self.reply(500, b"server error", "text/plain")
+        else:
+            body = graph.page(server.index, n, server.host_urls)
+            self.reply(200, body, "text/html; charset=utf-8")
+
+    def reply(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class HostServer(ThreadingMixIn, HTTPServer):
+    """Serves the pages of one virtual host"""
+
+    daemon_threads = True
+
+    def __init__(self, graph, index, host_urls):
+        HTTPServer.__init__(self, ("127.0.0.1", 0), GraphHandler)
+        self.graph = graph
+        self.index = index
+        self.host_urls = host_urls
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:%s" % self.server_address[1]
+
+
+class WebGraphServer(object):
+    """Serves a WebGraph, one server per host, from daemon threads.
+
+    :Parameters:
+        `graph` : WebGraph
+            The graph to serve.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.host_urls = []
+        self.servers = []
+
+    @property
+    def start_urls(self):
+        return [url + "/" for url in self.host_urls]
+
+    @property
+    def requests(self):
+        """The number of requests answered by all the hosts"""
+        return sum(server.requests for server in self.servers)
+
+    def start(self):
+        for i in range(self.graph.hosts):
+            server = HostServer(self.graph, i, self.host_urls)
+            self.servers.append(server)
+            self.host_urls.append(server.url)
+
+            thread = threading.Thread(target=server.serve_forever,
+                                      name="webgraph-%s" % i)
+            thread.daemon = True
+            thread.start()
+        return self
+
+    def stop(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        self.servers = []
+        self.host_urls = []
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--hosts", type=int, default=4)
+    parser.add_argument("--fanout", type=int, default=5)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--page-size", type=int, default=8192)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    graph = WebGraph(args.hosts, args.fanout, args.depth, args.page_size,
+                     args.latency, jitter=args.jitter,
+                     error_rate=args.error_rate, seed=args.seed)
+    server = WebGraphServer(graph).start()
+    for url in server.start_urls:
+        print(url)
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
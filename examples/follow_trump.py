@@ -56,8 +56,10 @@ class FollowTrumpSpider(Spider):
                   " - (%s) mentions." % (url, count["trump"]))
             hrefs = hrefs_from_html(html)
 
-            # list of urls to put on queue
-            return hrefs
+            # list of urls to put on queue, the pages mentioning trump the
+            # most are followed first
+            priority = min(count["trump"], 10)
+            return [(href, priority) for href in hrefs]
 
         return False    # only follow trump
 
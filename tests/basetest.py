@@ -7,7 +7,9 @@ from __future__ import print_function
 import atexit
 import os
 import signal
+import socket
 import subprocess
+import sys
 import time
 import unittest
 
@@ -24,31 +26,45 @@ PROXY_SERVER = None
 PROXY_SERVER_PORT = 20000
 
 
+def wait_for_port(port, timeout=10):
+    """Wait until a server accepts connections on the local port"""
+    deadline = time.time() + timeout
+    while True:
+        try:
+            socket.create_connection(("localhost", port), 1).close()
+            return
+        except socket.error:
+            if time.time() > deadline:
+                raise RuntimeError("server not listening on port %s" % port)
+            time.sleep(0.05)
+
+
 def setUpModule():
     global DOC_SERVER, PROXY_SERVER
 
     # start servers once
     if DOC_SERVER is None and PROXY_SERVER is None:
-        cmd = "python -m pydoc -p %s" % DOC_SERVER_PORT
-        DOC_SERVER = subprocess.Popen(cmd.split())
+        # pydoc stops serving once its interactive prompt reads the end of
+        # stdin, keep a pipe open instead of inheriting the stdin of the tests
+        cmd = [sys.executable, "-m", "pydoc", "-p", str(DOC_SERVER_PORT)]
+        DOC_SERVER = subprocess.Popen(cmd, stdin=subprocess.PIPE,
+                                      stdout=subprocess.PIPE)
 
-        cmd2 = "python %s %s" % (os.path.join(TEST_DIR, "proxyserver.py"),
-                                 PROXY_SERVER_PORT)
-        PROXY_SERVER = subprocess.Popen(cmd2.split())
-
-        # let servers start
-        time.sleep(3)
+        cmd2 = [sys.executable, os.path.join(TEST_DIR, "proxyserver.py"),
+                str(PROXY_SERVER_PORT)]
+        PROXY_SERVER = subprocess.Popen(cmd2)
 
         atexit.register(shutdown_servers, DOC_SERVER, PROXY_SERVER)
 
+        # let servers start
+        wait_for_port(DOC_SERVER_PORT)
+        wait_for_port(PROXY_SERVER_PORT)
 
-def shutdown_servers(DOC_SERVER, PROXY_SERVER):
-    import time
-
-    DOC_SERVER.kill()
-    PROXY_SERVER.kill()
 
-    time.sleep(3)
+def shutdown_servers(DOC_SERVER, PROXY_SERVER):
+    for server in (DOC_SERVER, PROXY_SERVER):
+        server.kill()
+        server.wait()
 
 
 class TestSpider(Spider):
@@ -6,11 +6,12 @@ import sys
 try:    # py2
     import SocketServer as socketserver
     from SimpleHTTPServer import SimpleHTTPRequestHandler
-    from urllib import urlopen
+    from urllib2 import urlopen, HTTPError
 except ImportError:     # py3
     import socketserver
     from http.server import SimpleHTTPRequestHandler
     from urllib.request import urlopen
+    from urllib.error import HTTPError
 
     import shutil
     from io import BytesIO
@@ -19,10 +20,20 @@ except ImportError:     # py3
 class Proxy(SimpleHTTPRequestHandler):
 
     def do_GET(self):
+        try:
+            response = urlopen(self.path)
+        except HTTPError as e:
+            # relay the error status of the server
+            response = e
+        self.send_response(response.getcode())
+        self.send_header("Content-Type",
+                         response.info().get("Content-Type", "text/html"))
+        self.end_headers()
+
         if (2, 7) <= sys.version_info <= (3, 3):
-            self.copyfile(urlopen(self.path), self.wfile)
+            self.copyfile(response, self.wfile)
         else:
-            shutil.copyfileobj(urlopen(self.path), self.wfile)
+            shutil.copyfileobj(response, self.wfile)
 
 
 if __name__ == "__main__":
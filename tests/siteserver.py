@@ -0,0 +1,155 @@
+"""A small threaded http server serving a synthetic site for testing. Page
+/<n> links to pages /<n * fanout + 1> ... /<n * fanout + fanout>. Page
+/latin1 is a cp1252 page declaring its charset in a meta tag only. Every
+page has an ETag and conditional requests are answered with 304. Pages
+/busy/<n> are answered with 503 and a Retry-After of 1 second.
+/sitemap_index.xml lists /sitemap-a.xml, listing pages /100 and /101, and the
+gzip compressed /sitemap-b.xml.gz, listing pages /102 and /103.
+"""
+
+from __future__ import print_function
+
+import gzip
+import hashlib
+import io
+import threading
+
+try:    # py2
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+except ImportError:     # py3
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+
+
+SITEMAP_INDEX = b"""<?xml version="1.0" encoding="UTF-8"?>
+<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+<sitemap><loc>%s/sitemap-a.xml</loc></sitemap>
+<sitemap><loc>%s/sitemap-b.xml.gz</loc></sitemap>
+</sitemapindex>
+"""
+
+SITEMAP_A = b"""<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+<url>
+  <loc>%s/100</loc><lastmod>2020-01-01</lastmod><priority>0.9</priority>
+</url>
+<url><loc>%s/101</loc></url>
+</urlset>
+"""
+
+SITEMAP_B = b"""<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+<url><loc>%s/102</loc><changefreq>daily</changefreq></url>
+<url><loc>%s/103</loc><priority>0.1</priority></url>
+</urlset>
+"""
+
+
+class SiteHandler(BaseHTTPRequestHandler):
+
+    # keep-alive connections
+    protocol_version = "HTTP/1.1"
+
+    fanout = 3
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+
+        if self.path.startswith("/redirect/"):
+            self.send_response(302)
+            self.send_header("Location", self.path[len("/redirect"):])
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if self.path.startswith("/busy/"):
+            self.send_response(503)
+            self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        root = ("http://%s" % self.headers.get("Host")).encode("ascii")
+        if self.path == "/sitemap_index.xml":
+            body = SITEMAP_INDEX % (root, root)
+            content_type = "application/xml"
+        elif self.path == "/sitemap-a.xml":
+            body = SITEMAP_A % (root, root)
+            content_type = "application/xml"
+        elif self.path == "/sitemap-b.xml.gz":
+            buf = io.BytesIO()
+            with gzip.GzipFile(fileobj=buf, mode="wb") as f:
+                f.write(SITEMAP_B % (root, root))
+            body = buf.getvalue()
+            content_type = "application/octet-stream"
+        elif self.path == "/latin1":
+            body = (u'<html><head><meta charset="windows-1252"></head>'
+                    u'<body><a href="/caf\xe9">caf\xe9</a></body></html>'
+                    ).encode("cp1252")
+            content_type = "text/html"
+        elif self.path == "/robots.txt":
+            body = self.server.robots.encode("utf-8")
+            content_type = "text/plain"
+        else:
+            try:
+                n = int(self.path.strip("/") or 0)
+            except ValueError:
+                self.send_error(404)
+                return
+
+            links = "".join('<a href="/%s">page</a>' % (n * self.fanout + i)
+                            for i in range(1, self.fanout + 1))
+            body = ("<html><body>%s</body></html>" % links).encode("utf-8")
+            content_type = "text/html; charset=utf-8"
+
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("ETag", etag)
+        if (self.server.compress and
+                "gzip" in self.headers.get("Accept-Encoding", "")):
+            buf = io.BytesIO()
+            with gzip.GzipFile(fileobj=buf, mode="wb") as f:
+                f.write(body)
+            body = buf.getvalue()
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class SiteServer(ThreadingMixIn, HTTPServer):
+    """Serve the synthetic site from a daemon thread on a free port"""
+
+    daemon_threads = True
+
+    def __init__(self, robots="", compress=False):
+        HTTPServer.__init__(self, ("localhost", 0), SiteHandler)
+        self.robots = robots
+        self.compress = compress
+        self.requests = []
+
+    @property
+    def url(self):
+        return "http://localhost:%s" % self.server_address[1]
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
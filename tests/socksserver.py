@@ -0,0 +1,144 @@
+"""A small threaded SOCKS5 server standing in for the SOCKS ports of tor.
+It accepts connections without authentication or with any username and
+password, see RFC 1928 and RFC 1929, and relays CONNECT requests. The
+usernames of the connections are recorded, so that tests can tell which
+circuit a request used.
+
+A stand-in for the tor control port answers every command with 250 OK and
+records the commands.
+"""
+
+from __future__ import print_function
+
+import select
+import socket
+import struct
+import threading
+
+try:    # py2
+    import SocketServer as socketserver
+except ImportError:     # py3
+    import socketserver
+
+
+def recv_exact(sock, n):
+    data = b""
+    while len(data) < n:
+        chunk = sock.recv(n - len(data))
+        if not chunk:
+            raise EOFError("connection closed")
+        data += chunk
+    return data
+
+
+class SocksHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        sock = self.request
+        try:
+            username = self.negotiate(sock)
+            host, port = self.read_request(sock)
+            remote = socket.create_connection((host, port), 5)
+        except (EOFError, socket.error):
+            return
+
+        with self.server.lock:
+            self.server.usernames.append(username)
+
+        # reply succeeded, bound to 0.0.0.0:0
+        sock.sendall(b"\x05\x00\x00\x01" + b"\x00" * 6)
+        try:
+            self.relay(sock, remote)
+        finally:
+            remote.close()
+
+    def negotiate(self, sock):
+        version, nmethods = struct.unpack("BB", recv_exact(sock, 2))
+        methods = bytearray(recv_exact(sock, nmethods))
+        if 2 not in methods:
+            sock.sendall(b"\x05\x00")
+            return None
+
+        # username and password sub-negotiation
+        sock.sendall(b"\x05\x02")
+        _, ulen = struct.unpack("BB", recv_exact(sock, 2))
+        username = recv_exact(sock, ulen).decode("utf-8")
+        plen = struct.unpack("B", recv_exact(sock, 1))[0]
+        recv_exact(sock, plen)
+        sock.sendall(b"\x01\x00")
+        return username
+
+    def read_request(self, sock):
+        _, command, _, atyp = struct.unpack("BBBB", recv_exact(sock, 4))
+        if atyp == 1:
+            host = socket.inet_ntoa(recv_exact(sock, 4))
+        elif atyp == 3:
+            length = struct.unpack("B", recv_exact(sock, 1))[0]
+            host = recv_exact(sock, length).decode("ascii")
+        else:
+            raise EOFError("unsupported address type")
+        port = struct.unpack("!H", recv_exact(sock, 2))[0]
+        return host, port
+
+    def relay(self, a, b):
+        sockets = [a, b]
+        while True:
+            readable, _, _ = select.select(sockets, [], [], 5)
+            if not readable:
+                return
+            for sock in readable:
+                data = sock.recv(65536)
+                if not data:
+                    return
+                (b if sock is a else a).sendall(data)
+
+
+class SocksServer(socketserver.ThreadingTCPServer):
+    """Serve SOCKS5 from a daemon thread on a free port"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        socketserver.ThreadingTCPServer.__init__(self, ("localhost", 0),
+                                                 SocksHandler)
+        self.usernames = []
+        self.lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class ControlHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("ascii").strip()
+            self.server.commands.append(command)
+            if command == "QUIT":
+                self.wfile.write(b"250 closing connection\r\n")
+                return
+            self.wfile.write(b"250 OK\r\n")
+
+
+class ControlServer(SocksServer):
+    """Stand-in for the control port of tor"""
+
+    def __init__(self):
+        socketserver.ThreadingTCPServer.__init__(self, ("localhost", 0),
+                                                 ControlHandler)
+        self.commands = []
@@ -0,0 +1,116 @@
+from __future__ import print_function
+
+import sys
+import unittest
+
+try:
+    from urllib2 import HTTPError
+except ImportError:
+    from urllib.error import HTTPError
+
+from arackpy.backends.backend_default import Backend_Default
+from arackpy.spider import Spider
+from tests.siteserver import SiteServer
+
+
+class TestBackendDefault(unittest.TestCase):
+
+    def setUp(self):
+        self.server = SiteServer().start()
+        self.backend = Backend_Default(None)
+
+    def tearDown(self):
+        self.backend.pool.clear()
+        self.server.stop()
+
+    def test_urlread(self):
+        html = self.backend.urlread(self.server.url + "/1", timeout=5)
+        self.assertEqual(self.backend.urlparse(html), {"/4", "/5", "/6"})
+
+    def test_keep_alive(self):
+        for i in range(5):
+            self.backend.urlread(self.server.url + "/%s" % i, timeout=5)
+        self.assertEqual(self.backend.pool.created, 1)
+        self.assertEqual(self.backend.pool.reused, 4)
+
+    def test_redirect(self):
+        response = self.backend.fetch(self.server.url + "/redirect/2", 5)
+        self.assertEqual(response.url, self.server.url + "/2")
+        self.assertEqual(response.status, 200)
+
+    def test_stream(self):
+        backend = Backend_Default(None, link_extractor="regex", stream=True,
+                                  chunk_size=16, keep_html=False)
+        for _ in range(2):
+            html = backend.urlread(self.server.url + "/1", timeout=5)
+            self.assertEqual(html, "")
+            self.assertEqual(backend.urlparse(html), {"/4", "/5", "/6"})
+        self.assertEqual(backend.pool.reused, 1)
+        backend.pool.clear()
+
+    def test_gzip(self):
+        server = SiteServer(compress=True).start()
+        try:
+            response = self.backend.fetch(server.url + "/1", 5)
+            self.assertEqual(response.headers["Content-Encoding"], "gzip")
+            self.assertEqual(self.backend.urlparse(response.text),
+                             {"/4", "/5", "/6"})
+
+            backend = Backend_Default(None, link_extractor="regex",
+                                      chunk_size=16)
+            response = backend.fetch(server.url + "/1", 5)
+            self.assertEqual(response.text, self.backend.fetch(
+                server.url + "/1", 5).text)
+            backend.pool.clear()
+
+            backend = Backend_Default(None, link_extractor="regex",
+                                      stream=True, chunk_size=16)
+            html = backend.urlread(server.url + "/1", timeout=5)
+            self.assertTrue(html.startswith("<html>"))
+            backend.pool.clear()
+        finally:
+            server.stop()
+
+    @unittest.skipIf(sys.version_info < (3, 5), "asyncio unavailable")
+    def test_async_accept_encoding(self):
+        import asyncio
+        from arackpy.backends.asynchttp import urlopen
+
+        server = SiteServer(compress=True).start()
+        loop = asyncio.new_event_loop()
+        try:
+            for accept_encoding, expected in (("gzip", "gzip"), (None, None)):
+                status, headers, body = loop.run_until_complete(urlopen(
+                    server.url + "/1", 5, accept_encoding=accept_encoding))
+                self.assertEqual(headers.get("Content-Encoding"), expected)
+                self.assertTrue(body.startswith(b"<html>"))
+        finally:
+            loop.close()
+            server.stop()
+
+    def test_meta_charset(self):
+        html = self.backend.urlread(self.server.url + "/latin1", timeout=5)
+        self.assertIn(u"caf\xe9</a>", html)
+
+    def test_http_error(self):
+        self.assertRaises(HTTPError, self.backend.urlread,
+                          self.server.url + "/missing", 5)
+
+    def test_close(self):
+        class PageSpider(Spider):
+            start_urls = [self.server.url]
+            respect_server = False
+            max_levels = 1
+
+            def parse(self, url, html):
+                pass
+
+        spider = PageSpider()
+        spider.crawl(100)
+        # the keep-alive connections are closed with the crawl
+        self.assertEqual(spider.backend.pool.created, 1)
+        self.assertFalse(spider.backend.pool.idle)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+from __future__ import print_function
+
+import socket
+import unittest
+
+from arackpy.backends.torcontrol import TorController
+from arackpy.spider import Spider, BACKENDS
+from tests.siteserver import SiteServer
+from tests.socksserver import SocksServer, ControlServer
+
+
+class TestTorController(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ControlServer().start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_newnym(self):
+        controller = TorController(self.server.port, password='se"cret')
+        self.assertTrue(controller.newnym())
+        self.assertEqual(self.server.commands, ['AUTHENTICATE "se\\"cret"',
+                                                "SIGNAL NEWNYM", "QUIT"])
+
+        # tor ignores signals sent too often
+        self.assertFalse(controller.newnym())
+        self.assertEqual(len(self.server.commands), 3)
+
+
+@unittest.skipIf(BACKENDS["tor"] is None, "tor backend unavailable")
+class TestTorBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.site = SiteServer().start()
+        self.socks = [SocksServer().start(), SocksServer().start()]
+
+        class TorSpider(Spider):
+            start_urls = [self.site.url]
+            concurrency = 4
+
+        self.spider_class = TorSpider
+
+    def tearDown(self):
+        self.site.stop()
+        for server in self.socks:
+            server.stop()
+
+    def backend(self, **kwargs):
+        spider = self.spider_class("tor", **kwargs)
+        self.assertTrue(isinstance(spider.backend, BACKENDS["tor"]))
+        return spider.backend
+
+    def test_circuits(self):
+        backend = self.backend(ports=[s.port for s in self.socks],
+                               circuits=2)
+        self.assertEqual(len(backend.circuit_stats()), 4)
+
+        for n in range(20):
+            backend.urlread("%s/%s" % (self.site.url, n), 5)
+
+        # every port is used, with a username per circuit
+        for server in self.socks:
+            self.assertTrue(server.usernames)
+            self.assertTrue(set(server.usernames) <=
+                            {"arackpy-0-0", "arackpy-1-0"})
+        stats = backend.circuit_stats()
+        self.assertEqual(sum(s["successes"] for s in stats.values()), 20)
+
+    def test_renew_isolated(self):
+        backend = self.backend(ports=[self.socks[0].port], circuits=2,
+                               max_circuit_failures=1)
+        circuit = sorted(backend.circuit_stats())[0]
+        backend.pool.failure(circuit)
+        backend.check_circuit(circuit)
+
+        circuits = sorted(backend.circuit_stats())
+        self.assertNotIn(circuit, circuits)
+        self.assertEqual(len(circuits), 2)
+        self.assertEqual(
+            backend.metrics.snapshot()["tor_circuit_renewals_total"],
+            {"isolation": 1})
+
+        for n in range(10):
+            backend.urlread("%s/%s" % (self.site.url, n), 5)
+        self.assertTrue(set(self.socks[0].usernames) <=
+                        {"arackpy-0-1", "arackpy-1-0"})
+
+    def test_renew_newnym(self):
+        control = ControlServer().start()
+        try:
+            backend = self.backend(port=self.socks[0].port,
+                                   control_port=control.port)
+            circuit = list(backend.circuit_stats())[0]
+            backend.urlread(self.site.url, 5)
+            self.assertEqual(self.socks[0].usernames, [None])
+
+            backend.renew(circuit)
+            self.assertIn("SIGNAL NEWNYM", control.commands)
+            self.assertEqual(backend.circuit_stats()[circuit]["successes"], 0)
+        finally:
+            control.stop()
+
+    def test_circuit_errors(self):
+        """Only the errors of the circuits count against them"""
+        backend = self.backend(port=self.socks[0].port,
+                               max_circuit_failures=5)
+        circuit = list(backend.circuit_stats())[0]
+
+        # a server accepting the connection and never answering
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(("localhost", 0))
+        listener.listen(1)
+        try:
+            self.assertRaises(Exception, backend.urlread,
+                              "http://localhost:%s/" %
+                              listener.getsockname()[1], 0.5)
+            self.assertEqual(
+                backend.circuit_stats()[circuit]["consecutive_failures"], 0)
+        finally:
+            listener.close()
+
+        # nothing listens on the SOCKS port
+        backend = self.backend(port=1, max_circuit_failures=5)
+        circuit = list(backend.circuit_stats())[0]
+        self.assertRaises(Exception, backend.urlread, self.site.url, 5)
+        self.assertEqual(
+            backend.circuit_stats()[circuit]["consecutive_failures"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+from __future__ import print_function
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from arackpy.checkpoint import Checkpoint
+from arackpy.spider import Spider
+from arackpy.visited import ScalableBloomFilter
+from tests.siteserver import SiteServer
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_load(self):
+        checkpoint = Checkpoint(self.path, interval=3600)
+        self.assertFalse(checkpoint.load())
+
+        visited = ScalableBloomFilter()
+        checkpoint.start(visited, [("http://a.com", 0)])
+        visited.add("http://a.com")
+        checkpoint.visit("http://a.com", True)
+        checkpoint.queued("http://a.com/1", 1)
+        checkpoint.queued("http://a.com/2", 1)
+        checkpoint.next_level(1)
+        visited.add("http://a.com/1")
+        checkpoint.visit("http://a.com/1", False)
+        checkpoint.close()
+
+        # an interrupted write after the last snapshot
+        with io.open(os.path.join(self.path, "log"), "a") as f:
+            f.write(u"v\t1\thttp://a.com/2\nq\t2\thttp://a.")
+
+        checkpoint = Checkpoint(self.path)
+        self.assertTrue(checkpoint.load())
+        self.assertEqual(checkpoint.level, 1)
+        self.assertEqual(checkpoint.total_url_count, 2)
+        self.assertEqual(list(checkpoint.pending.values()), [])
+        self.assertIn("http://a.com/2", checkpoint.visited)
+
+
+class TestResume(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.server = SiteServer().start()
+
+        class ResumeSpider(Spider):
+            start_urls = [self.server.url]
+            respect_server = False
+            read_robots_file = False
+            concurrency = 4
+
+            def parse(self, url, html):
+                pass
+
+        self.spider_class = ResumeSpider
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.path)
+
+    def test_resume(self):
+        spider = self.spider_class()
+        spider.crawl(3, resume=self.path)
+        first = list(self.server.requests)
+        self.assertEqual(sorted(first), ["/", "/1", "/2", "/3"])
+
+        spider = self.spider_class()
+        spider.crawl(8, resume=self.path)
+        self.assertEqual(spider.level, 3)
+        self.assertGreater(spider.total_url_count, 8)
+
+        # nothing is read twice
+        second = self.server.requests[len(first):]
+        self.assertEqual(len(set(self.server.requests)),
+                         len(self.server.requests))
+        self.assertGreaterEqual(len(second), 5)
+
+    def test_dropped_not_pending(self):
+        """Urls never read are not pending once the crawl completes"""
+        self.server.robots = "User-agent: *\nDisallow: /3\n"
+        root = self.server.url
+
+        class DropSpider(self.spider_class):
+            read_robots_file = True
+
+            def parse(self, url, html):
+                if url.rstrip("/") != root:
+                    return False
+                return ["http://external.com/", root + "/1", root + "/3"]
+
+        DropSpider().crawl(100, resume=self.path)
+        self.assertEqual(sorted(self.server.requests),
+                         ["/", "/1", "/robots.txt"])
+
+        checkpoint = Checkpoint(self.path)
+        self.assertTrue(checkpoint.load())
+        self.assertEqual(list(checkpoint.pending.values()), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
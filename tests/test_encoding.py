@@ -0,0 +1,72 @@
+from __future__ import print_function
+
+import codecs
+import gzip
+import io
+import unittest
+import zlib
+
+from arackpy.backends.encoding import (Decompressor, HtmlDecoder,
+                                       decode_html, detect_charset)
+
+
+def gzip_compress(data):
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode="wb") as f:
+        f.write(data)
+    return buf.getvalue()
+
+
+def feed(decompressor, data, size=7):
+    chunks = [decompressor.decompress(data[i:i + size])
+              for i in range(0, len(data), size)]
+    return b"".join(chunks) + decompressor.flush()
+
+
+class TestEncoding(unittest.TestCase):
+
+    html = b"<html><body>" + b"<a href='/x'>x</a>" * 100 + b"</body></html>"
+
+    def test_gzip(self):
+        self.assertEqual(feed(Decompressor("gzip"), gzip_compress(self.html)),
+                         self.html)
+
+    def test_deflate(self):
+        data = zlib.compress(self.html)
+        self.assertEqual(feed(Decompressor("deflate"), data), self.html)
+
+        raw = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+        data = raw.compress(self.html) + raw.flush()
+        self.assertEqual(feed(Decompressor("deflate"), data), self.html)
+
+    def test_identity(self):
+        self.assertEqual(feed(Decompressor(None), self.html), self.html)
+
+    def test_detect_charset(self):
+        meta = b'<meta http-equiv="Content-Type" content="text/html; ' \
+               b'charset=ISO-8859-1">'
+        self.assertEqual(detect_charset("utf-8", meta), "utf-8")
+        self.assertEqual(detect_charset(None, meta), "iso8859-1")
+        self.assertEqual(detect_charset("bogus", b"<meta charset='koi8-r'>"),
+                         "koi8-r")
+        self.assertEqual(detect_charset(None, codecs.BOM_UTF8 + b"<html>"),
+                         "utf-8-sig")
+        self.assertEqual(detect_charset(None, b"<html>"), None)
+
+    def test_decode_fallback(self):
+        self.assertEqual(decode_html(u"caf\xe9".encode("utf-8")), u"caf\xe9")
+        self.assertEqual(decode_html(u"caf\xe9".encode("cp1252")), u"caf\xe9")
+
+    def test_html_decoder(self):
+        html = (u"<p>caf\xe9</p>" * 1000).encode("cp1252")
+        data = gzip_compress(html)
+        decoder = HtmlDecoder("gzip")
+
+        chunks = [decoder.decode(data[i:i + 100])
+                  for i in range(0, len(data), 100)]
+        chunks.append(decoder.decode(b"", final=True))
+        self.assertEqual(u"".join(chunks), html.decode("cp1252"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+from __future__ import print_function
+
+import unittest
+
+from arackpy.spider import Spider, ENGINES
+from tests.siteserver import SiteServer
+
+
+@unittest.skipIf(ENGINES["asyncio"] is None, "asyncio unavailable")
+class TestAsyncioEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.server = SiteServer().start()
+
+        class AsyncSpider(Spider):
+            start_urls = [self.server.url]
+            engine = "asyncio"
+            respect_server = False
+            urls = []
+
+            def parse(self, url, html):
+                self.urls.append(url)
+
+        self.spider_class = AsyncSpider
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_max_urls(self):
+        spider = self.spider_class()
+        spider.crawl(5)
+        self.assertEqual(len(spider.urls), 5)
+
+    def test_max_levels(self):
+        self.spider_class.max_levels = 2
+        spider = self.spider_class()
+        spider.crawl(100)
+        # 1 + 3 + 9 pages
+        self.assertEqual(len(spider.urls), 13)
+
+    def test_async_parse(self):
+        urls = []
+
+        class CoroutineSpider(self.spider_class):
+            max_levels = 1
+
+            async def parse(self, url, html):
+                urls.append(url)
+
+        CoroutineSpider().crawl(100)
+        self.assertEqual(len(urls), 4)
+
+    def test_queue_accepted(self):
+        """External and duplicate urls do not count against the depth"""
+        root = self.server.url
+
+        class LinkSpider(self.spider_class):
+            max_levels = 1
+            max_urls_per_level = 5
+
+            def parse(self, url, html):
+                self.urls.append(url)
+                if url.rstrip("/") != root:
+                    return False
+                return (["http://external%s.com/" % i for i in range(10)] +
+                        [root + "/1"] * 10 + [root + "/2", root + "/3"])
+
+        spider = LinkSpider()
+        spider.urls = []
+        spider.crawl(100)
+        self.assertEqual(sorted(url[len(root):].rstrip("/")
+                                for url in spider.urls),
+                         ["", "/1", "/2", "/3"])
+
+
+if __name__ == "__main__":
+    unittest.main()
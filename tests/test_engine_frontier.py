@@ -0,0 +1,242 @@
+from __future__ import print_function
+
+import threading
+import time
+import unittest
+
+from arackpy.frontier import (DepthSpillQueue, HostFrontier,
+                              PrioritySpillQueue, SpillQueue)
+from arackpy.spider import ENGINES, Spider
+from tests.siteserver import SiteServer
+
+
+class TestHostFrontier(unittest.TestCase):
+
+    def test_host_delay(self):
+        frontier = HostFrontier()
+        frontier.put("a", "http://a/1", 0)
+        frontier.put("a", "http://a/2", 0)
+        frontier.put("b", "http://b/1", 0)
+
+        key, url, depth = frontier.get()
+        self.assertEqual(url, "http://a/1")
+        frontier.done(key, delay=0.2)
+
+        # host b is ready while host a waits
+        self.assertEqual(frontier.get()[1], "http://b/1")
+        frontier.done("b")
+
+        start = time.time()
+        self.assertEqual(frontier.get()[1], "http://a/2")
+        self.assertGreaterEqual(time.time() - start, 0.15)
+        frontier.done("a")
+
+        self.assertIsNone(frontier.get())
+
+    def test_busy_key(self):
+        """A key is never handed out twice at the same time"""
+        frontier = HostFrontier()
+        frontier.put("a", "http://a/1", 0)
+        frontier.put("a", "http://a/2", 0)
+        frontier.get()
+
+        result = []
+        thread = threading.Thread(target=lambda: result.append(frontier.get()))
+        thread.start()
+        thread.join(0.2)
+        self.assertEqual(result, [])
+
+        frontier.done("a")
+        thread.join(1)
+        self.assertEqual(result[0][1], "http://a/2")
+
+    def test_priority(self):
+        frontier = HostFrontier()
+        frontier.put("a", "http://a/1", 0)
+        frontier.put("a", "http://a/2", 0, priority=1)
+        frontier.put("b", "http://b/1", 0, priority=2)
+
+        # the best url of the ready hosts, then by priority within a host
+        key, url, _ = frontier.get()
+        self.assertEqual(url, "http://b/1")
+        frontier.done(key)
+
+        key, url, _ = frontier.get()
+        self.assertEqual(url, "http://a/2")
+        frontier.done(key)
+
+        # a better url moves its ready host ahead
+        frontier.put("b", "http://b/2", 0)
+        frontier.put("b", "http://b/3", 0, priority=5)
+        self.assertEqual(frontier.get()[1], "http://b/3")
+
+
+class TestSpillQueue(unittest.TestCase):
+
+    def test_fifo(self):
+        queue = SpillQueue(3)
+        for i in range(10):
+            queue.put("http://a/%s" % i)
+        self.assertEqual(len(queue.hot), 3)
+        self.assertEqual(queue.qsize(), 10)
+
+        urls = [queue.get() for _ in range(5)]
+        for i in range(10, 12):
+            queue.put("http://a/%s" % i)
+        while not queue.empty():
+            urls.append(queue.get())
+
+        self.assertEqual(urls, ["http://a/%s" % i for i in range(12)])
+        self.assertEqual(queue.total_spilled, 9)
+        self.assertEqual(queue.offset, 0)
+        queue.close()
+
+    def test_depth(self):
+        queue = DepthSpillQueue(1)
+        queue.put("http://a/1 x", 2, 0.5)
+        queue.put("http://a/2", 3, 1)
+        self.assertEqual(queue.total_spilled, 1)
+        self.assertEqual(queue.get(), ("http://a/2", 3, 1))
+        self.assertEqual(queue.get(), ("http://a/1 x", 2, 0.5))
+        queue.close()
+
+    def test_engines(self):
+        """No url is dropped when a level exceeds max_urls_per_level"""
+        for engine in ("threads", "frontier", "asyncio", "processes"):
+            if engine != "threads" and ENGINES.get(engine) is None:
+                continue
+            # the pages read, parse runs in the child processes of the
+            # processes engine
+            self.assertEqual(sorted(set(self.crawl(engine))),
+                             sorted(["/"] + ["/%s" % i for i in range(1, 13)]),
+                             engine)
+
+    def crawl(self, engine):
+        server = SiteServer().start()
+
+        class LevelSpider(Spider):
+            start_urls = [server.url]
+            respect_server = False
+            read_robots_file = False
+            max_urls_per_level = 2
+            max_levels = 2
+            concurrency = 4
+
+            def parse(self, url, html):
+                pass
+
+        try:
+            LevelSpider().crawl(100, engine=engine)
+        finally:
+            server.stop()
+
+        return server.requests
+
+
+class TestPrioritySpillQueue(unittest.TestCase):
+
+    def test_priority(self):
+        queue = PrioritySpillQueue(2)
+        for i in range(6):
+            queue.put("http://a/%s" % i, i % 3)
+        self.assertEqual(queue.qsize(), 6)
+
+        # maxsize urls in memory across all the priorities
+        queue.put("http://a/6", 2)
+        self.assertEqual(queue.hot, 2)
+        self.assertEqual(queue.total_spilled, 5)
+
+        urls = []
+        while not queue.empty():
+            urls.append(queue.get())
+            self.assertLessEqual(queue.hot, 2)
+        self.assertEqual(urls, ["http://a/%s" % i for i in (2, 5, 6, 1, 4,
+                                                            0, 3)])
+        self.assertEqual(queue.buckets, {})
+        self.assertEqual(queue.total_spilled, 5)
+        queue.close()
+
+    def test_max_buckets(self):
+        queue = PrioritySpillQueue(10, max_buckets=3)
+        for i, priority in enumerate([0, 5, 10, 4.2, 9, -1]):
+            queue.put("http://a/%s" % i, priority)
+        self.assertEqual(sorted(queue.buckets), [0, 5, 10])
+
+        urls = []
+        while not queue.empty():
+            urls.append(queue.get())
+        # 4.2 shares the bucket of 5, 9 of 10 and -1 of 0
+        self.assertEqual(urls, ["http://a/%s" % i for i in (2, 4, 1, 3,
+                                                            0, 5)])
+        queue.close()
+
+    def test_focused_crawl(self):
+        """Urls of higher priority are read first within a level"""
+        server = SiteServer().start()
+
+        class FocusedSpider(Spider):
+            start_urls = [server.url]
+            respect_server = False
+            read_robots_file = False
+            concurrency = 1
+
+            def score(self, url, depth):
+                return url.endswith(("/2", "/8")) and 1 or 0
+
+            def parse(self, url, html):
+                self.urls.append(url.rsplit("/", 1)[-1])
+
+        try:
+            spider = FocusedSpider()
+            spider.urls = []
+            spider.crawl(4)
+            threads_urls = spider.urls
+
+            spider = FocusedSpider()
+            spider.urls = []
+            spider.crawl(3, engine="frontier")
+            frontier_urls = spider.urls
+        finally:
+            server.stop()
+
+        # /2 comes first on level 1, /8 is its child
+        self.assertEqual(threads_urls[:2], ["", "2"])
+        self.assertEqual(sorted(threads_urls[2:4]), ["1", "3"])
+        self.assertEqual(frontier_urls[:3], ["", "2", "8"])
+
+
+class TestFrontierEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.server = SiteServer().start()
+
+        class FrontierSpider(Spider):
+            start_urls = [self.server.url]
+            engine = "frontier"
+            respect_server = False
+            concurrency = 4
+
+            def parse(self, url, html):
+                self.urls.append(url)
+
+        self.spider_class = FrontierSpider
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_max_urls(self):
+        spider = self.spider_class()
+        spider.urls = []
+        spider.crawl(5)
+        self.assertEqual(len(spider.urls), 5)
+
+    def test_max_levels(self):
+        self.spider_class.max_levels = 2
+        spider = self.spider_class()
+        spider.urls = []
+        spider.crawl(100)
+        self.assertEqual(len(spider.urls), 13)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+from __future__ import print_function
+
+from collections import Counter
+import unittest
+
+from arackpy.engines.engine_processes import HashRing
+from arackpy.spider import Spider
+from tests.siteserver import SiteServer
+
+
+class TestHashRing(unittest.TestCase):
+
+    def test_consistent(self):
+        hosts = ["host%s.com" % i for i in range(1000)]
+        ring = HashRing(range(4))
+        owners = dict((host, ring.node(host)) for host in hosts)
+
+        counts = Counter(owners.values())
+        self.assertEqual(sorted(counts), [0, 1, 2, 3])
+        self.assertGreater(min(counts.values()), 150)
+
+        # a new node only takes keys from the others
+        ring = HashRing(range(5))
+        moved = [host for host in hosts if ring.node(host) != owners[host]]
+        self.assertTrue(all(ring.node(host) == 4 for host in moved))
+
+
+class TestProcessesEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.server = SiteServer().start()
+        url = self.server.url
+
+        class ShardSpider(Spider):
+            start_urls = [url, url.replace("localhost", "127.0.0.1")]
+            respect_server = False
+            read_robots_file = False
+            concurrency = 4
+            max_levels = 2
+
+            def parse(self, url, html):
+                pass
+
+        self.spider_class = ShardSpider
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_max_levels(self):
+        spider = self.spider_class()
+        spider.crawl(100, processes=2)
+        self.assertEqual(spider.total_url_count, 26)
+        self.assertEqual(len(self.server.requests), 26)
+
+    def test_max_urls(self):
+        spider = self.spider_class()
+        spider.crawl(5, processes=2)
+        self.assertLessEqual(spider.total_url_count, 5 + 2 * 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
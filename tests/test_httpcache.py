@@ -0,0 +1,74 @@
+from __future__ import print_function
+
+import shutil
+import tempfile
+import unittest
+
+from arackpy.backends.backend_cache import Backend_Cache
+from arackpy.backends.backend_default import Backend_Default
+from arackpy.httpcache import CacheEntry, HttpCache
+from tests.siteserver import SiteServer
+
+
+class TestHttpCache(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_put_get(self):
+        cache = HttpCache(self.path)
+        cache.put(CacheEntry("http://a.com/1", etag='"x"', html=u"caf\xe9"))
+
+        entry = HttpCache(self.path).get("http://a.com/1")
+        self.assertEqual(entry.html, u"caf\xe9")
+        self.assertEqual(entry.validators, {"If-None-Match": '"x"'})
+        self.assertEqual(cache.get("http://a.com/2"), None)
+
+    def test_evict(self):
+        cache = HttpCache(self.path, maxsize=1000)
+        for i in range(10):
+            cache.put(CacheEntry("http://a.com/%s" % i, html="x" * 200))
+            cache.get("http://a.com/0")
+
+        self.assertTrue(cache.size <= 1000)
+        self.assertNotEqual(cache.get("http://a.com/0"), None)
+        self.assertNotEqual(cache.get("http://a.com/9"), None)
+        self.assertEqual(cache.get("http://a.com/1"), None)
+
+        self.assertEqual(len(HttpCache(self.path, maxsize=1000)), len(cache))
+
+
+class TestBackendCache(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.server = SiteServer().start()
+        self.default = Backend_Default(None)
+        self.backend = Backend_Cache(None, self.default, self.path)
+
+    def tearDown(self):
+        self.default.pool.clear()
+        self.server.stop()
+        shutil.rmtree(self.path)
+
+    def test_not_modified(self):
+        url = self.server.url + "/1"
+        html = self.backend.urlread(url, 5)
+        self.assertFalse(self.backend.not_modified(url))
+
+        # recrawl with a new cache instance
+        backend = Backend_Cache(None, self.default, self.path)
+        self.assertEqual(backend.urlread(url, 5), html)
+        self.assertTrue(backend.not_modified(url))
+        self.assertFalse(backend.not_modified(url))
+        self.assertEqual(backend.urlparse(html), {"/4", "/5", "/6"})
+
+        self.assertEqual(self.server.requests, ["/1", "/1"])
+        self.assertEqual(backend.cache.stats()["hits"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
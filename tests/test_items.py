@@ -0,0 +1,192 @@
+from __future__ import print_function
+
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+
+from arackpy.items import ItemPipeline, is_url, open_writer
+from arackpy.spider import Spider
+from tests.siteserver import SiteServer
+
+
+class RecordingWriter(object):
+
+    def __init__(self):
+        self.batches = []
+        self.flushes = 0
+        self.closed = False
+        self.release = threading.Event()
+        self.release.set()
+
+    def write(self, items):
+        self.release.wait()
+        self.batches.append(list(items))
+
+    def flush(self):
+        self.flushes += 1
+
+    def close(self):
+        self.closed = True
+
+
+class TestItems(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="arackpy-items-")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+    def test_is_url(self):
+        self.assertTrue(is_url("http://a.com"))
+        self.assertTrue(is_url(("http://a.com", 2)))
+        self.assertFalse(is_url({"url": "http://a.com"}))
+        self.assertFalse(is_url(("a", "b")))
+
+    def test_jsonl_gzip(self):
+        writer = open_writer(self.path("items.jsonl.gz"))
+        writer.write([{"a": 1}, {"a": u"\xe9"}])
+        writer.close()
+
+        with gzip.open(self.path("items.jsonl.gz"), "rb") as f:
+            lines = f.read().decode("utf-8").splitlines()
+        self.assertEqual([json.loads(line) for line in lines],
+                         [{"a": 1}, {"a": u"\xe9"}])
+
+    def test_csv(self):
+        writer = open_writer(self.path("items.csv"), fields=["a", "b"])
+        writer.write([{"a": 1, "b": 2, "c": 3}])
+        writer.write([{"a": 4}])
+        writer.close()
+
+        with io.open(self.path("items.csv"), encoding="utf-8",
+                     newline="") as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows, [["a", "b"], ["1", "2"], ["4", ""]])
+
+    def test_sqlite(self):
+        writer = open_writer(self.path("items.db"), table="pages")
+        writer.write([{"url": "/1", "links": ["/2", "/3"]}, {"url": "/2"}])
+        writer.close()
+
+        conn = sqlite3.connect(self.path("items.db"))
+        rows = conn.execute("SELECT url, links FROM pages").fetchall()
+        conn.close()
+        self.assertEqual(rows, [("/1", '["/2", "/3"]'), ("/2", None)])
+
+        with self.assertRaises(ValueError):
+            open_writer(self.path("items.db.gz"))
+        with self.assertRaises(ValueError):
+            open_writer(self.path("items.txt"))
+
+    def test_batches(self):
+        writer = RecordingWriter()
+        writer.release.clear()
+        pipeline = ItemPipeline(writer, maxsize=3000, batch_size=1000,
+                                flush_interval=10).start()
+        for i in range(2500):
+            pipeline.put(i)
+        writer.release.set()
+        pipeline.close()
+
+        self.assertTrue(writer.closed)
+        self.assertEqual(sum(writer.batches, []), list(range(2500)))
+        self.assertTrue(all(len(b) <= 1000 for b in writer.batches))
+        self.assertEqual(pipeline.written, 2500)
+
+    def test_flush_interval(self):
+        writer = RecordingWriter()
+        pipeline = ItemPipeline(writer, flush_interval=0.05).start()
+        pipeline.put("a")
+        time.sleep(0.3)
+        self.assertEqual(writer.batches, [["a"]])
+        self.assertGreater(writer.flushes, 0)
+        pipeline.close()
+
+    def test_backpressure(self):
+        writer = RecordingWriter()
+        writer.release.clear()
+        pipeline = ItemPipeline(writer, maxsize=2, batch_size=1).start()
+
+        def produce():
+            for i in range(10):
+                pipeline.put(i)
+
+        producer = threading.Thread(target=produce)
+        producer.daemon = True
+        producer.start()
+        producer.join(0.3)
+        # the writer is stuck, the producer waits for room
+        self.assertTrue(producer.is_alive())
+
+        writer.release.set()
+        producer.join(5)
+        pipeline.close()
+        self.assertEqual(sum(writer.batches, []), list(range(10)))
+
+
+class TestExport(unittest.TestCase):
+
+    def setUp(self):
+        self.server = SiteServer().start()
+        self.dir = tempfile.mkdtemp(prefix="arackpy-items-")
+        url = self.server.url
+
+        class ItemSpider(Spider):
+            start_urls = [url]
+            respect_server = False
+            read_robots_file = False
+            concurrency = 4
+            max_levels = 2
+            export_path = os.path.join(self.dir, "items.jsonl")
+            export_flush_interval = 0.1
+
+            def parse(self, url, html):
+                yield {"url": url, "size": len(html)}
+                if url.endswith("/1"):
+                    # only follow the second link
+                    yield url.replace("/1", "/5")
+
+        self.spider_class = ItemSpider
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def crawl(self, **kwargs):
+        spider = self.spider_class()
+        spider.crawl(100, **kwargs)
+
+        with open(spider.export_path) as f:
+            items = [json.loads(line) for line in f]
+        # the start url is canonicalized by the engines other than threads
+        paths = sorted(item["url"][len(self.server.url):].rstrip("/")
+                       for item in items)
+        self.assertEqual(paths, sorted(["", "/1", "/2", "/3", "/5", "/7",
+                                        "/8", "/9", "/10", "/11", "/12"]))
+        self.assertEqual(spider.stats()["exported_items_total"], 11)
+
+    def test_threads(self):
+        self.crawl()
+
+    def test_parse_pool(self):
+        self.spider_class.parse_processes = 2
+        self.crawl(engine="frontier")
+
+    def test_processes(self):
+        self.crawl(processes=2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+from __future__ import print_function
+
+import threading
+import unittest
+
+try:
+    from urllib2 import urlopen
+except ImportError:
+    from urllib.request import urlopen
+
+from arackpy.metrics import Metrics, MetricsServer, quantile, BUCKETS
+from arackpy.spider import Spider
+from tests.siteserver import SiteServer
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_threads(self):
+        """Counters of all the threads are merged on read"""
+        metrics = Metrics()
+
+        def work():
+            for _ in range(1000):
+                metrics.count("responses_total", 1, "200")
+                metrics.observe("stage_seconds", 0.02, "fetch")
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = metrics.snapshot()
+        self.assertEqual(stats["responses_total"], {"200": 4000})
+        fetch = stats["stage_seconds"]["fetch"]
+        self.assertEqual(fetch["count"], 4000)
+        self.assertAlmostEqual(fetch["sum"], 80.0, places=6)
+        self.assertTrue(0.01 < fetch["p50"] <= 0.025)
+
+    def test_quantile(self):
+        buckets = [0] * (len(BUCKETS) + 1)
+        self.assertEqual(quantile(buckets, 0, 0.5), None)
+
+        # 0.5 and 1.0 bucket bounds
+        buckets[BUCKETS.index(0.5)] = 99
+        buckets[BUCKETS.index(1.0)] = 1
+        self.assertTrue(0.25 < quantile(buckets, 100, 0.5) <= 0.5)
+        self.assertEqual(quantile(buckets, 100, 0.99), 0.5)
+        self.assertEqual(quantile(buckets, 100, 1.0), 1.0)
+
+    def test_merge(self):
+        a, b = Metrics(), Metrics()
+        a.count("downloaded_bytes_total", 10)
+        b.count("downloaded_bytes_total", 5)
+        b.observe("stage_seconds", 0.1, "parse")
+        a.merge(b.export())
+
+        stats = a.snapshot()
+        self.assertEqual(stats["downloaded_bytes_total"], 15)
+        self.assertEqual(stats["stage_seconds"]["parse"]["count"], 1)
+
+    def test_server(self):
+        metrics = Metrics()
+        metrics.count("dropped_urls_total", 2, "robots")
+        metrics.observe("host_fetch_seconds", 0.3, "a.com")
+        metrics.gauge("visited_urls", lambda: 7)
+
+        server = MetricsServer(metrics, port=0)
+        server.start()
+        try:
+            text = urlopen("http://127.0.0.1:%s/metrics" %
+                           server.port).read().decode("utf-8")
+        finally:
+            server.close()
+
+        self.assertIn("# TYPE arackpy_dropped_urls_total counter", text)
+        self.assertIn('arackpy_dropped_urls_total{reason="robots"} 2', text)
+        self.assertIn('arackpy_host_fetch_seconds_bucket{host="a.com",'
+                      'le="0.5"} 1', text)
+        self.assertIn('arackpy_host_fetch_seconds_count{host="a.com"} 1',
+                      text)
+        self.assertIn("arackpy_visited_urls 7", text)
+
+
+class TestSpiderStats(unittest.TestCase):
+
+    def test_stats(self):
+        server = SiteServer(robots="User-agent: *\nDisallow: /3\n").start()
+
+        class StatsSpider(Spider):
+            start_urls = [server.url]
+            respect_server = False
+            max_levels = 2
+            concurrency = 4
+
+            def parse(self, url, html):
+                pass
+
+        try:
+            spider = StatsSpider()
+            spider.crawl(100)
+        finally:
+            server.stop()
+
+        # /3 and its children are not read
+        stats = spider.stats()
+        self.assertEqual(stats["read_urls"], 9)
+        self.assertEqual(stats["responses_total"], {"200": 9})
+        self.assertEqual(stats["dropped_urls_total"]["robots"], 1)
+        self.assertGreater(stats["downloaded_bytes_total"], 0)
+        self.assertEqual(stats["visited_urls"], 9)
+        for stage in ("dns", "robots", "fetch", "decode", "extract", "parse",
+                      "enqueue"):
+            self.assertIn(stage, stats["stage_seconds"])
+        self.assertEqual(len(stats["host_fetch_seconds"]), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+from __future__ import print_function
+
+import os
+import unittest
+
+from arackpy.parsepool import ParsePool
+from arackpy.spider import Spider
+from tests.siteserver import SiteServer
+
+
+class TestParsePool(unittest.TestCase):
+
+    def setUp(self):
+        self.server = SiteServer().start()
+
+        class ParseSpider(Spider):
+            start_urls = [self.server.url]
+            respect_server = False
+            read_robots_file = False
+            concurrency = 4
+            max_levels = 2
+            parse_processes = 2
+            parse_window = 2
+
+            def parse(self, url, html):
+                # runs in a worker process
+                assert os.getpid() != self.pid
+
+        self.spider_class = ParseSpider
+
+    def tearDown(self):
+        self.server.stop()
+
+    def crawl(self, engine):
+        spider = self.spider_class()
+        spider.pid = os.getpid()
+        spider.crawl(100, engine=engine)
+        self.assertEqual(sorted(self.server.requests),
+                         sorted("/%s" % i if i else "/" for i in range(13)))
+
+    def test_threads(self):
+        self.crawl("threads")
+
+    def test_frontier(self):
+        self.crawl("frontier")
+
+    def test_lock_held(self):
+        # the processes are forked before a thread takes the lock
+        spider = self.spider_class()
+        spider.pid = os.getpid()
+        spider.thread_safe_parse = True
+        pool = ParsePool(spider, 1)
+        try:
+            self.assertEqual(len(pool.executor._processes), 1)
+            with spider.lock:
+                future = pool.submit(self.server.url, "<html></html>")
+                self.assertEqual(future.result(10), ([], []))
+        finally:
+            pool.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+from __future__ import print_function
+
+import threading
+import time
+import unittest
+
+from arackpy.pool import WorkerPool
+
+
+class TestWorkerPool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = WorkerPool(4)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_join(self):
+        results = []
+        for i in range(20):
+            self.pool.submit(lambda i: (time.sleep(0.01), results.append(i)),
+                             i)
+        self.pool.join()
+        self.assertEqual(sorted(results), list(range(20)))
+
+    def test_threads_reused(self):
+        names = set()
+        for _ in range(3):
+            for _ in range(8):
+                self.pool.submit(
+                    lambda: names.add(threading.current_thread().name))
+            self.pool.join()
+        self.assertLessEqual(len(names), 4)
+        self.assertEqual(len(self.pool.threads), 4)
+
+    def test_unrelated_threads(self):
+        """Other threads in the process do not block join"""
+        event = threading.Event()
+        other = threading.Thread(target=event.wait)
+        other.start()
+        try:
+            self.pool.submit(lambda: None)
+            self.pool.join()
+        finally:
+            event.set()
+            other.join()
+
+    def test_exception(self):
+        self.pool.submit(lambda: 1 / 0)
+        self.pool.join()
+        self.assertEqual(self.pool.unfinished, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,170 @@
+from __future__ import print_function
+
+import threading
+import time
+import unittest
+
+try:
+    from urllib2 import ProxyHandler, build_opener, HTTPError
+except ImportError:
+    from urllib.request import ProxyHandler, build_opener
+    from urllib.error import HTTPError
+
+from arackpy.proxypool import ProxyPool
+from arackpy.spider import BACKENDS
+
+# relative import - unittest to start the proxy server
+from tests.basetest import setUpModule, PROXY_SERVER_PORT  # noqa: F401
+from tests.siteserver import SiteServer
+
+
+class TestProxyPool(unittest.TestCase):
+
+    def wait_for(self, condition, timeout=10):
+        deadline = time.time() + timeout
+        while not condition():
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.05)
+
+    def test_weighted_by_health(self):
+        pool = ProxyPool(["fast:1", "slow:2"], min_proxies=0)
+        pool.success("fast:1", 0.1)
+        pool.success("slow:2", 10.0)
+
+        picks = [pool.acquire() for _ in range(200)]
+        self.assertGreater(picks.count("fast:1"), 150)
+        self.assertEqual(pool.stats()["fast:1"]["successes"], 1)
+
+    def test_cooldown_and_eviction(self):
+        pool = ProxyPool(["a:1", "b:2"], min_proxies=0, max_failures=2,
+                         cooldown=60)
+        self.assertFalse(pool.failure("a:1"))
+        self.assertEqual(set(pool.acquire() for _ in range(20)), {"b:2"})
+
+        self.assertTrue(pool.failure("a:1"))
+        self.assertEqual(sorted(pool.stats()), ["b:2"])
+
+        # evicted proxies are not added back
+        pool.add(["a:1"], validate=False)
+        self.assertEqual(len(pool), 1)
+
+    def test_wait_for_cooldown(self):
+        pool = ProxyPool(["a:1"], min_proxies=0, cooldown=0.2)
+        pool.failure("a:1")
+        self.assertEqual(pool.acquire(timeout=0.05), None)
+        self.assertEqual(pool.acquire(timeout=2), "a:1")
+
+    def test_empty(self):
+        # no proxy and no source, never block
+        pool = ProxyPool()
+        self.assertEqual(pool.acquire(timeout=None), None)
+
+    def test_refill(self):
+        calls = []
+
+        def source():
+            calls.append(threading.current_thread().name)
+            return ["b:2", "c:3"]
+
+        pool = ProxyPool(["a:1"], source=source, min_proxies=2,
+                         max_failures=1)
+        try:
+            # the pool is low, acquire refills it in the background
+            self.assertTrue(pool.acquire() in ("a:1", "b:2", "c:3"))
+            self.wait_for(lambda: len(pool) == 3)
+            self.assertNotEqual(calls[0], threading.current_thread().name)
+
+            pool.failure("a:1")
+            pool.failure("b:2")
+            self.assertEqual(pool.acquire(), "c:3")
+        finally:
+            pool.close()
+
+    def test_refresh_given_proxies(self):
+        calls = []
+
+        def source():
+            calls.append(True)
+            return ["b:2"]
+
+        pool = ProxyPool(["a:1"], source=source, min_proxies=0,
+                         refresh_interval=0.1)
+        try:
+            pool.acquire()
+            self.assertEqual(calls, [])
+
+            time.sleep(0.2)
+            pool.acquire()
+            self.wait_for(lambda: len(pool) == 2)
+        finally:
+            pool.close()
+
+    def test_validate(self):
+        good = "localhost:%s" % PROXY_SERVER_PORT
+        bad = "localhost:1"     # nothing listens on port 1
+        server = SiteServer().start()
+
+        def validator(proxy):
+            """Read the local site using the proxy"""
+            opener = build_opener(ProxyHandler({"http": "http://%s" % proxy}))
+            opener.open(server.url + "/0", timeout=5).read()
+            return True
+
+        pool = ProxyPool(source=lambda: [good, bad], validator=validator,
+                         min_proxies=0)
+        try:
+            pool.refill()
+            self.assertEqual(pool.acquire(timeout=10), good)
+            self.wait_for(lambda: bad in pool.evicted)
+            self.assertEqual(sorted(pool.stats()), [good])
+            self.assertEqual(server.requests, ["/0"])
+        finally:
+            pool.close()
+            server.stop()
+
+
+@unittest.skipIf(BACKENDS["proxy"] is None, "proxy backend unavailable")
+class TestProxyBackend(unittest.TestCase):
+
+    def test_proxy_failures(self):
+        """Only the errors of the proxies count against them"""
+        good = "localhost:%s" % PROXY_SERVER_PORT
+        bad = "localhost:1"
+        server = SiteServer().start()
+        backend = BACKENDS["proxy"](None, proxies=[good, bad],
+                                    pool_options={"min_proxies": 0,
+                                                  "max_failures": 1})
+        try:
+            for n in range(5):
+                backend.urlread("%s/%s" % (server.url, n), 5)
+            self.assertEqual(sorted(backend.pool.stats()), [good])
+
+            self.assertRaises(HTTPError, backend.urlread,
+                              server.url + "/missing", 5)
+            health = backend.pool.health(good)
+            self.assertEqual(health["consecutive_failures"], 0)
+            self.assertEqual(health["successes"], 6)
+        finally:
+            backend.close()
+            server.stop()
+
+    def test_close(self):
+        good = "localhost:%s" % PROXY_SERVER_PORT
+        server = SiteServer().start()
+        backend = BACKENDS["proxy"](None, proxy_source=lambda: [good],
+                                    test_url=server.url + "/0")
+        try:
+            self.assertEqual(backend.pool.acquire(timeout=10), good)
+            threads = list(backend.pool.validators.threads)
+            self.assertTrue(threads)
+
+            backend.close()
+            for thread in threads:
+                thread.join(1)
+                self.assertFalse(thread.is_alive())
+        finally:
+            server.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
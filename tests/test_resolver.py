@@ -0,0 +1,51 @@
+from __future__ import print_function
+
+import socket
+import unittest
+
+from arackpy.resolver import Resolver
+
+
+class TestResolver(unittest.TestCase):
+
+    def setUp(self):
+        self.resolver = Resolver()
+
+    def test_cache(self):
+        ip = self.resolver.resolve("localhost")
+        self.assertEqual(self.resolver.resolve("localhost"), ip)
+        self.assertEqual(self.resolver.stats()["hits"], 1)
+        self.assertEqual(self.resolver.stats()["misses"], 1)
+
+    def test_negative_cache(self):
+        host = "arackpy.invalid"
+        self.assertRaises(socket.gaierror, self.resolver.resolve, host)
+        self.assertRaises(socket.gaierror, self.resolver.resolve, host)
+        self.assertEqual(self.resolver.stats()["hits"], 1)
+
+    def test_resolve_many(self):
+        ips = self.resolver.resolve_many(["localhost", "127.0.0.1",
+                                          "localhost", "arackpy.invalid"])
+        self.assertEqual(len(ips), 3)
+        self.assertEqual(ips["127.0.0.1"], "127.0.0.1")
+        self.assertIsNone(ips["arackpy.invalid"])
+        self.assertEqual(self.resolver.stats()["misses"], 3)
+
+    def test_close(self):
+        self.resolver.resolve_many(["localhost", "127.0.0.1"])
+        threads = list(self.resolver.pool.threads)
+        self.assertTrue(threads)
+
+        self.resolver.close()
+        for thread in threads:
+            thread.join(1)
+            self.assertFalse(thread.is_alive())
+
+    def test_lru(self):
+        resolver = Resolver(maxsize=1)
+        resolver.resolve_many(["localhost", "127.0.0.1"])
+        self.assertEqual(len(resolver), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from arackpy.robots import RobotsCache
+from tests.siteserver import SiteServer
+
+
+ROBOTS = """User-agent: *
+Disallow: /private
+Crawl-delay: 2
+"""
+
+
+class TestRobotsCache(unittest.TestCase):
+
+    def setUp(self):
+        self.server = SiteServer(robots=ROBOTS).start()
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def robots_requests(self):
+        return self.server.requests.count("/robots.txt")
+
+    def test_rules(self):
+        rp = RobotsCache().get(self.server.url)
+        self.assertFalse(rp.can_fetch("*", self.server.url + "/private"))
+        self.assertTrue(rp.can_fetch("*", self.server.url + "/1"))
+        self.assertEqual(rp.crawl_delay("*"), 2)
+
+    def test_read_once(self):
+        cache = RobotsCache()
+        threads = [threading.Thread(target=cache.get,
+                                    args=(self.server.url + "/%s" % i,))
+                   for i in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        cache.get(self.server.url)
+        self.assertEqual(self.robots_requests(), 1)
+
+    def test_ttl(self):
+        cache = RobotsCache(ttl=0)
+        cache.get(self.server.url)
+        cache.get(self.server.url)
+        self.assertEqual(self.robots_requests(), 2)
+
+    def test_lru(self):
+        cache = RobotsCache(maxsize=1)
+        cache.get(self.server.url)
+        cache.get("http://127.0.0.1:%s" % self.server.server_address[1])
+        self.assertEqual(len(cache), 1)
+        self.assertIsNone(cache.cached(self.server.url))
+
+    def test_persistence(self):
+        path = os.path.join(self.tmpdir, "robots.json")
+        cache = RobotsCache(path=path)
+        cache.get(self.server.url)
+        cache.save()
+
+        rp = RobotsCache(path=path).get(self.server.url)
+        self.assertFalse(rp.can_fetch("*", self.server.url + "/private"))
+        self.assertEqual(self.robots_requests(), 1)
+
+    def test_unreachable(self):
+        rp = RobotsCache(timeout=1).get("http://localhost:1")
+        self.assertFalse(rp.can_fetch("*", "http://localhost:1/"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+from __future__ import print_function
+
+import unittest
+
+try:
+    from arackpy.backends.sessionpool import SessionPool
+except ImportError:
+    # requests is not installed
+    SessionPool = None
+
+from arackpy.metrics import Metrics
+from tests.siteserver import SiteServer
+
+
+@unittest.skipIf(SessionPool is None, "requests unavailable")
+class TestSessionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.server = SiteServer().start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_reuse(self):
+        metrics = Metrics()
+        sessions = SessionPool(metrics=metrics)
+        for n in range(3):
+            with sessions.session(None) as session:
+                session.get("%s/%s" % (self.server.url, n), timeout=5).text
+
+        stats = metrics.snapshot()
+        self.assertEqual(stats["proxy_sessions_total"],
+                         {"new": 1, "reused": 2})
+        self.assertEqual(stats["proxy_connections_total"],
+                         {"new": 1, "reused": 2})
+        self.assertEqual(len(sessions), 1)
+        sessions.clear()
+        self.assertEqual(len(sessions), 0)
+
+    def test_idle_timeout(self):
+        sessions = SessionPool(idle_timeout=0)
+        for _ in range(2):
+            with sessions.session(None) as session:
+                session.get(self.server.url, timeout=5).text
+        self.assertEqual((sessions.created, sessions.reused), (2, 0))
+
+    def test_concurrent(self):
+        # a session is never shared by two requests at the same time
+        sessions = SessionPool(maxsize=1)
+        first, _ = sessions.get(None)
+        second, _ = sessions.get(None)
+        self.assertIsNot(first, second)
+
+        sessions.put(None, first)
+        sessions.put(None, second)    # more than maxsize, closed
+        self.assertEqual(len(sessions), 1)
+        self.assertIs(sessions.get(None)[0], first)
+
+    def test_failure(self):
+        sessions = SessionPool()
+        with self.assertRaises(Exception):
+            with sessions.session("localhost:1") as session:
+                session.get(self.server.url, timeout=5)
+        self.assertEqual(len(sessions), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+from __future__ import print_function
+
+import io
+import unittest
+
+from arackpy.robots import CachedRobotFileParser
+from arackpy.sitemap import SitemapFeed, iter_sitemap, parse_sitemap
+from arackpy.spider import Spider
+from tests.siteserver import SiteServer
+
+
+class TestSitemap(unittest.TestCase):
+
+    def setUp(self):
+        self.server = SiteServer().start()
+        self.server.robots = ("User-agent: *\nDisallow: /101\n"
+                              "Sitemap: %s/sitemap_index.xml\n" %
+                              self.server.url)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_parse(self):
+        xml = (b'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+               b'<url><loc> http://a.com/1 </loc><priority>x</priority></url>'
+               b'<url><lastmod>2020-01-01</lastmod></url>'
+               b'</urlset>')
+        entries = list(parse_sitemap(io.BytesIO(xml)))
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0].url, "http://a.com/1")
+        self.assertEqual(entries[0].priority, None)
+
+    def test_robots(self):
+        rp = CachedRobotFileParser(lines=self.server.robots.splitlines())
+        self.assertEqual(rp.site_maps(),
+                         [self.server.url + "/sitemap_index.xml"])
+
+    def test_index(self):
+        """Indexes and gzip compressed sitemaps are followed"""
+        entries = list(iter_sitemap(self.server.url + "/sitemap_index.xml"))
+        self.assertEqual([entry.url.rsplit("/", 1)[-1] for entry in entries],
+                         ["100", "101", "102", "103"])
+        self.assertEqual(entries[0].lastmod, "2020-01-01")
+        self.assertEqual(entries[0].priority, 0.9)
+        self.assertEqual(entries[2].changefreq, "daily")
+
+        feed = SitemapFeed([self.server.url + "/sitemap-a.xml"])
+        self.assertEqual(len(feed.take(1)), 1)
+        self.assertFalse(feed.exhausted)
+        self.assertEqual(len(feed.take(5)), 1)
+        self.assertTrue(feed.exhausted)
+        self.assertEqual(feed.take(5), [])
+
+    def test_crawl(self):
+        """Sitemap urls are read on the first level, by priority"""
+        server = self.server
+
+        class SitemapSpider(Spider):
+            start_urls = [server.url]
+            read_sitemaps = True
+            respect_server = False
+            max_levels = 0
+            concurrency = 1
+
+            def parse(self, url, html):
+                self.urls.append(url.rsplit("/", 1)[-1])
+
+        for engine in ("threads", "frontier", "asyncio"):
+            spider = SitemapSpider()
+            spider.urls = []
+            spider.crawl(100, engine=engine)
+
+            # /101 is disallowed by robots.txt
+            self.assertEqual(sorted(spider.urls), ["", "100", "102", "103"])
+            self.assertEqual(spider.stats()["sitemap_urls_total"], 4)
+            if engine != "asyncio":
+                self.assertEqual([url for url in spider.urls if url],
+                                 ["100", "102", "103"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+from __future__ import print_function
+
+from email.utils import formatdate
+import time
+import unittest
+
+from arackpy.spider import ENGINES, Spider
+from arackpy.throttle import AutoThrottle, parse_retry_after
+from tests.siteserver import SiteServer
+
+
+class TestAutoThrottle(unittest.TestCase):
+
+    def test_latency(self):
+        throttle = AutoThrottle(start_delay=1.0, target_concurrency=2.0)
+        self.assertEqual(throttle.delay("a.com"), 1.0)
+
+        # fast responses lower the delay towards latency / concurrency
+        for _ in range(20):
+            throttle.observe("a.com", 0.2)
+        self.assertAlmostEqual(throttle.delay("a.com"), 0.1, places=3)
+
+        # the robots.txt crawl delay is a floor
+        self.assertEqual(throttle.delay("a.com", floor=2), 2)
+        self.assertEqual(throttle.delays(), {"a.com": throttle.delay("a.com")})
+
+    def test_target_latency(self):
+        throttle = AutoThrottle(start_delay=1.0, target_latency=0.5)
+        throttle.observe("a.com", 1.0)
+        self.assertGreater(throttle.delay("a.com"), 1.0)
+        throttle.observe("b.com", 0.1)
+        self.assertLess(throttle.delay("b.com"), 1.0)
+
+    def test_backoff(self):
+        throttle = AutoThrottle(start_delay=1.0, max_delay=10)
+        throttle.observe("a.com", 0.1, 503)
+        self.assertEqual(throttle.delay("a.com"), 2.0)
+        throttle.observe("a.com", 0.1, 429, "30")
+        self.assertEqual(throttle.delay("a.com"), 30)
+
+        # errors never lower the delay
+        throttle.observe("a.com", 0.1, 404)
+        self.assertEqual(throttle.delay("a.com"), 30)
+
+    def test_retry_after(self):
+        self.assertEqual(parse_retry_after("120"), 120)
+        self.assertEqual(parse_retry_after("soon"), None)
+        seconds = parse_retry_after(formatdate(time.time() + 60))
+        self.assertTrue(55 < seconds <= 60)
+
+
+class TestEngineBackoff(unittest.TestCase):
+    """Every engine waits for the Retry-After of a 503 response"""
+
+    def crawl(self, engine):
+        server = SiteServer().start()
+
+        class BusySpider(Spider):
+            start_urls = [server.url + "/busy/1", server.url + "/busy/2"]
+            read_robots_file = False
+            auto_throttle = True
+            throttle_start_delay = 0.1
+            throttle_max_delay = 1.0
+            concurrency = 2
+
+            def parse(self, url, html):
+                pass
+
+        start = time.time()
+        try:
+            BusySpider().crawl(10, engine=engine)
+        finally:
+            server.stop()
+
+        self.assertEqual(len(server.requests), 2)
+        self.assertGreaterEqual(time.time() - start, 0.9)
+
+    def test_threads(self):
+        self.crawl("threads")
+
+    def test_frontier(self):
+        self.crawl("frontier")
+
+    @unittest.skipIf(ENGINES.get("asyncio") is None,
+                     "asyncio engine unavailable")
+    def test_asyncio(self):
+        self.crawl("asyncio")
+
+    @unittest.skipIf(ENGINES.get("processes") is None,
+                     "processes engine unavailable")
+    def test_processes(self):
+        self.crawl("processes")
+
+
+if __name__ == "__main__":
+    unittest.main()
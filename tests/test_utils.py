@@ -0,0 +1,90 @@
+from __future__ import print_function
+
+import threading
+import unittest
+
+from arackpy.utils import (LINK_EXTRACTORS, canonicalize, get_link_extractor,
+                           fingerprint)
+
+
+HTML = """<html><head>
+<base href="http://example.com/dir/">
+<link rel="Next stylesheet" href="page2">
+<link rel="icon" href="favicon.ico">
+</head><body>
+<a href='a?x=1&amp;y=2'>A</a>
+<AREA href="b">
+<a name="anchor">no href</a>
+<a href="http://other.com/c">C</a>
+</body></html>
+"""
+
+LINKS = {"http://example.com/dir/a?x=1&y=2", "http://example.com/dir/b",
+         "http://example.com/dir/page2", "http://other.com/c"}
+
+
+class TestLinkExtractors(unittest.TestCase):
+
+    def test_extractors(self):
+        for name, extractor in LINK_EXTRACTORS.items():
+            if extractor is not None:
+                self.assertEqual(extractor(HTML), LINKS, name)
+
+    def test_no_base(self):
+        for name, extractor in LINK_EXTRACTORS.items():
+            if extractor is not None:
+                self.assertEqual(extractor('<a href="/x">x</a>'), {"/x"},
+                                 name)
+
+    def test_threadsafe(self):
+        extract = get_link_extractor("html")
+        pages = ['<a href="/%s">%s</a>' % (i, i) * 50 for i in range(50)]
+        results = [None] * len(pages)
+
+        def run(i):
+            results[i] = extract(pages[i])
+
+        threads = [threading.Thread(target=run, args=(i,))
+                   for i in range(len(pages))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [{"/%s" % i} for i in range(len(pages))])
+
+    def test_unknown(self):
+        self.assertRaises(ValueError, get_link_extractor, "unknown")
+
+
+class TestFingerprint(unittest.TestCase):
+
+    def test_bits(self):
+        self.assertLess(fingerprint("http://example.com"), 2 ** 64)
+        self.assertGreaterEqual(fingerprint("http://example.com", 128),
+                                2 ** 64)
+        self.assertEqual(fingerprint("http://example.com"),
+                         fingerprint("http://example.com"))
+
+
+class TestCanonicalize(unittest.TestCase):
+
+    def test_equivalent(self):
+        urls = ["http://Example.com:80/a/./b/../c?y=2&x=1#frag",
+                "HTTP://example.com/a/c?x=1&y=2",
+                "http://example.com/a/c?utm_source=feed&x=1&y=2&gclid=1",
+                "http://example.com/a/b/../../a/c?y=2&x=1"]
+        self.assertEqual(set(canonicalize(url) for url in urls),
+                         {"http://example.com/a/c?x=1&y=2"})
+
+    def test_unchanged(self):
+        self.assertEqual(canonicalize("https://a.com:8443/x/?q=a%20b"),
+                         "https://a.com:8443/x/?q=a%20b")
+        self.assertEqual(canonicalize("http://a.com"), "http://a.com/")
+        self.assertEqual(canonicalize("mailto:a@b.com"), "mailto:a@b.com")
+        self.assertEqual(canonicalize("http://a.com/?ref=1", ["ref"]),
+                         "http://a.com/")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+from __future__ import print_function
+
+import unittest
+
+from arackpy.visited import (BloomFilter, ScalableBloomFilter, FingerprintSet,
+                             VISITED_CACHES)
+
+
+class TestBloomFilter(unittest.TestCase):
+
+    def test_membership(self):
+        bf = BloomFilter(100, 0.01)
+        self.assertTrue(bf.add("http://localhost/a"))
+        self.assertFalse(bf.add("http://localhost/a"))
+        self.assertIn("http://localhost/a", bf)
+        self.assertNotIn("http://localhost/b", bf)
+        self.assertEqual(len(bf), 1)
+
+
+class TestScalableBloomFilter(unittest.TestCase):
+
+    def test_grows_without_forgetting(self):
+        sbf = ScalableBloomFilter(capacity=100, error_rate=0.001)
+        urls = ["http://localhost/%s" % i for i in range(1000)]
+        for url in urls:
+            sbf.add(url)
+
+        self.assertGreater(len(sbf.filters), 1)
+        self.assertTrue(all(url in sbf for url in urls))
+
+    def test_error_rate(self):
+        sbf = ScalableBloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(5000):
+            sbf.add("http://localhost/%s" % i)
+
+        false_positives = sum("http://example.com/%s" % i in sbf
+                              for i in range(5000))
+        self.assertLess(false_positives / 5000.0, 0.02)
+
+
+class TestFingerprintSet(unittest.TestCase):
+
+    def test_membership(self):
+        fs = FingerprintSet()
+        self.assertTrue(fs.add("http://localhost/a"))
+        self.assertFalse(fs.add("http://localhost/a"))
+        self.assertIn("http://localhost/a", fs)
+        self.assertNotIn("http://localhost/b", fs)
+
+    def test_registered(self):
+        self.assertIs(VISITED_CACHES["fingerprint"], FingerprintSet)
+
+
+if __name__ == "__main__":
+    unittest.main()